@@ -1,6 +1,7 @@
 # lol_app_LTA_2/app.py
 # lol_app_LTA/app.py
 from dotenv import load_dotenv
+import multiprocessing
 import os
 import sys
 
@@ -8,7 +9,7 @@ _basedir = os.path.abspath(os.path.dirname(__file__))
 dotenv_path = os.path.join(_basedir, '.env')
 
 try:
-    from scrims_logic import log_message
+    from log_utils import log_message
 except ImportError:
     import logging
     log_message = logging.info
@@ -20,7 +21,7 @@ if os.path.exists(dotenv_path):
 else:
     log_message(f"WARNING: .env file not found at expected path: {dotenv_path}. API keys might not be loaded.")
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response
 from datetime import datetime, date
 from database import get_db_connection, init_db
 import json
@@ -41,26 +42,52 @@ from tournament_logic import (
     TEAM_TAG_TO_FULL_NAME,
     ICON_SIZE_DRAFTS,
     get_all_wards_data,
-    get_proximity_data
+    get_proximity_data,
+    backfill_draft_actions,
+    backfill_full_jungle_paths,
+    rebuild_tournament_aggregates
 )
 from soloq_logic import (
-    TEAM_ROSTERS,
-    aggregate_soloq_data_from_db,
-    fetch_and_store_soloq_data,
-    get_soloq_activity_data
+    DEFAULT_TEAM,
+    RIOT_REGIONS,
+    get_team_rosters,
+    get_soloq_players,
+    save_soloq_player,
+    delete_soloq_player,
+    parse_riot_accounts,
+    seed_soloq_rosters,
+    start_soloq_refresh_scheduler,
+    aggregate_soloq_data_for_players,
+    fetch_and_store_soloq_data_for_players,
+    get_soloq_activity_data,
+    invalidate_puuid_cache,
+    rebuild_soloq_daily
 )
 from start_positions_logic import get_start_positions_data
-from jng_clear_logic import get_jng_clear_data
+from jng_clear_logic import get_jng_clear_data, MAX_CLEAR_NUMBER
 from objects_logic import get_objects_data
 # <<< НОВЫЙ ИМПОРТ ДЛЯ SWAP
 from swap_logic import get_swap_data
+from perf_tracing import install_request_tracing, get_perf_report, PERF_DEBUG_ENDPOINT
 
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "a_default_secret_key_change_me")
 app.jinja_env.globals.update(min=min, max=max)
+install_request_tracing(app)  # SQL / span'ы / рендеринг по запросам, см. /debug/perf
 
-with app.app_context(): init_db()
+def init_app_data():
+    """Подготовка БД при запуске: схема, бэкфиллы драфтов, агрегаты и rollup'ы, начальные составы SoloQ."""
+    with app.app_context():
+        init_db()
+        backfill_draft_actions()
+        rebuild_tournament_aggregates()
+        rebuild_soloq_daily()
+        seed_soloq_rosters()
+
+# Дочерние процессы пула разбора реплеев (spawn) заново импортируют app.py как __mp_main__ - БД в них не трогаем
+if multiprocessing.parent_process() is None:
+    init_app_data()
 
 @app.context_processor
 def inject_now():
@@ -106,6 +133,45 @@ def get_match_replay(game_id):
         print(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
+@app.route('/get_match_replay/<game_id>/binary')
+def get_match_replay_binary(game_id):
+    """
+    Бинарный таймлайн для плеера (см. replay_encoding). Поддерживает ETag (If-None-Match -> 304),
+    HTTP Range, окно по времени ?from_ms=&to_ms= и разрешение ?resolution=<шаг в мс> (1000 / 5000 / 30000).
+    """
+    try:
+        from scrims_logic import get_replay_etag, get_game_replay_binary
+        from replay_encoding import REPLAY_TICK_MS, REPLAY_LOD_TICKS_MS
+
+        from_ms = request.args.get('from_ms', type=int)
+        to_ms = request.args.get('to_ms', type=int)
+        resolution_ms = request.args.get('resolution', REPLAY_TICK_MS, type=int)
+        if resolution_ms not in REPLAY_LOD_TICKS_MS:
+            return jsonify({"error": f"Unsupported resolution, use one of {list(REPLAY_LOD_TICKS_MS)}"}), 400
+        etag = get_replay_etag(game_id, from_ms, to_ms, resolution_ms)
+        if not etag:
+            return jsonify({"error": "Replay not found"}), 404
+
+        # Проверяем ETag до чтения позиций, чтобы 304 ничего не стоил
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        payload = get_game_replay_binary(game_id, from_ms, to_ms, resolution_ms)
+        if payload is None:
+            return jsonify({"error": "Failed to build replay"}), 500
+        response = Response(payload, mimetype='application/octet-stream')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(payload))
+    except Exception as e:
+        log_message(f"!!! Error in /get_match_replay/{game_id}/binary: {e}")
+        import traceback
+        log_message(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
 # НОВЫЙ ROUTE ДЛЯ SCRIMS
 @app.route('/scrims')
 def scrims():
@@ -201,12 +267,15 @@ def update_hll_route():
 def jng_clear():
     selected_team = request.args.get('team')
     selected_champion = request.args.get('champion', 'All')
+    selected_clear = request.args.get('clear', 1, type=int)
+    if selected_clear not in range(1, MAX_CLEAR_NUMBER + 1): selected_clear = 1
 
     all_teams, stats, available_champions = [], {}, []
     try:
         all_teams, stats, available_champions = get_jng_clear_data(
             selected_team_full_name=selected_team,
-            selected_champion=selected_champion
+            selected_champion=selected_champion,
+            clear_number=selected_clear
         )
     except Exception as e:
         log_message(f"Error in /jng_clear data aggregation: {e}")
@@ -221,9 +290,25 @@ def jng_clear():
         selected_team=selected_team,
         available_champions=available_champions,
         selected_champion=selected_champion,
+        selected_clear=selected_clear,
+        max_clear_number=MAX_CLEAR_NUMBER,
         stats=stats
     )
 
+@app.route('/backfill_jungle_paths', methods=['POST'])
+def backfill_jungle_paths_route():
+    log_message("Backfilling full jungle paths...")
+    try:
+        processed_games = backfill_full_jungle_paths()
+    except Exception as e:
+        log_message(f"Error during full jungle path backfill: {e}")
+        flash(f"Error backfilling jungle paths: {e}", "error")
+        processed_games = -1
+
+    if processed_games > 0: flash(f"Collected full jungle paths for {processed_games} game(s).", "success")
+    elif processed_games == 0: flash("No games without full jungle paths found.", "info")
+    return redirect(request.referrer or url_for('jng_clear'))
+
 @app.route('/objects')
 def objects():
     selected_team = request.args.get('team')
@@ -364,21 +449,22 @@ def soloq():
     time_filters_soloq = ["All Time", "1 week", "2 weeks", "3 weeks", "4 weeks"]
     player_stats_all = {}
     players = []
-    target_team_roster_key = 'Gamespace'
+    team_rosters = get_team_rosters()
+    target_team_roster_key = request.args.get('team', DEFAULT_TEAM)
 
-    if target_team_roster_key not in TEAM_ROSTERS:
+    if target_team_roster_key not in team_rosters:
         flash(f"Team '{target_team_roster_key}' not found in SoloQ rosters configuration.", "error")
     else:
-        players = list(TEAM_ROSTERS[target_team_roster_key].keys())
-        for player in players:
-            try:
-                player_stats_all[player] = aggregate_soloq_data_from_db(
-                    player, selected_time_filter, date_from_str, date_to_str
-                )
-            except Exception as e:
-                log_message(f"Error aggregating SoloQ data for {player}: {e}")
-                flash(f"Could not load SoloQ stats for {player}: {e}", "warning")
-                player_stats_all[player] = []
+        players = list(team_rosters[target_team_roster_key].keys())
+        try:
+            # Один запрос на весь состав
+            player_stats_all = aggregate_soloq_data_for_players(
+                players, selected_time_filter, date_from_str, date_to_str
+            )
+        except Exception as e:
+            log_message(f"Error aggregating SoloQ data for {target_team_roster_key}: {e}")
+            flash(f"Could not load SoloQ stats: {e}", "warning")
+            player_stats_all = {}
 
     selected_player_viz = request.args.get('viz_player', players[0] if players else None)
     selected_agg_type = request.args.get('agg_type', 'Day')
@@ -392,6 +478,8 @@ def soloq():
 
     return render_template(
         'soloq.html',
+        teams=list(team_rosters.keys()),
+        selected_team=target_team_roster_key,
         players=players,
         player_stats_all=player_stats_all,
         time_filters=time_filters_soloq,
@@ -411,25 +499,22 @@ def update_soloq_route():
         flash("Error: Riot API Key is not configured.", "error")
         return redirect(url_for('soloq'))
 
-    target_team_roster_key = 'Gamespace'
-    if target_team_roster_key not in TEAM_ROSTERS:
+    team_rosters = get_team_rosters()
+    target_team_roster_key = request.form.get('team', DEFAULT_TEAM)
+    if target_team_roster_key not in team_rosters:
         flash(f"Team '{target_team_roster_key}' not found in SoloQ rosters.", "error")
         return redirect(url_for('soloq'))
 
-    players = list(TEAM_ROSTERS[target_team_roster_key].keys())
+    players = list(team_rosters[target_team_roster_key].keys())
     total_added_count = 0
     update_errors = 0
-    for player in players:
-        try:
-            added_count = fetch_and_store_soloq_data(player)
-            if added_count == -1: update_errors += 1
-            elif added_count > 0: total_added_count += added_count
-        except Exception as e:
+    backfill = request.form.get('backfill') == '1'
+    # Аккаунты разных регионов обновляются параллельно, темп внутри региона держит лимитер Riot API
+    for player, added_count in fetch_and_store_soloq_data_for_players(players, backfill=backfill).items():
+        if added_count == -1:
             update_errors += 1
-            log_message(f"Error during SoloQ update for player {player}: {e}")
-            import traceback
-            log_message(traceback.format_exc())
-            flash(f"Failed to update SoloQ data for {player}: {e}", "error")
+            flash(f"Failed to update SoloQ data for {player}.", "error")
+        elif added_count > 0: total_added_count += added_count
 
     if update_errors == 0:
         if total_added_count > 0: flash(f"Successfully added {total_added_count} new SoloQ game(s)!", "success")
@@ -439,6 +524,68 @@ def update_soloq_route():
 
     return redirect(request.referrer or url_for('soloq'))
 
+@app.route('/reset_soloq_accounts', methods=['POST'])
+def reset_soloq_accounts_route():
+    """Сбрасывает кэш PUUID (например, после смены Riot ID игроком)."""
+    removed_count = invalidate_puuid_cache()
+    flash(f"Cleared {removed_count} cached Riot account(s). PUUIDs will be re-fetched on next update.", "info")
+    return redirect(request.referrer or url_for('soloq'))
+
+@app.route('/soloq_rosters')
+def soloq_rosters():
+    """Составы для отслеживания SoloQ: свои и соперников (для скаутинга)."""
+    players = get_soloq_players()
+    players_by_team = {}
+    for player_name, player in players.items():
+        players_by_team.setdefault(player["team"], []).append({"name": player_name, **player})
+
+    # ?player=... - форма заполняется текущими данными игрока для редактирования
+    edit_name = request.args.get('player')
+    edit_player = None
+    if edit_name in players:
+        player = players[edit_name]
+        edit_player = {
+            "name": edit_name, "team": player["team"], "role": player["role"],
+            "accounts_text": "\n".join(f"{game_name}#{tag_line} {region}" for game_name, tag_line, region in player["accounts"]),
+        }
+    return render_template(
+        'soloq_rosters.html',
+        players_by_team=players_by_team,
+        roles=["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"],
+        regions=RIOT_REGIONS,
+        edit_player=edit_player
+    )
+
+@app.route('/soloq_rosters/save', methods=['POST'])
+def save_soloq_player_route():
+    team_name = request.form.get('team_name', '').strip()
+    player_name = request.form.get('player_name', '').strip()
+    role = request.form.get('role') or None
+    if not team_name or not player_name:
+        flash("Team and player name are required.", "error")
+        return redirect(url_for('soloq_rosters'))
+    try:
+        accounts = parse_riot_accounts(request.form.get('accounts', ''))
+    except ValueError as e:
+        flash(str(e), "error")
+        return redirect(url_for('soloq_rosters', player=player_name))
+    if not accounts:
+        flash(f"Add at least one Riot account for {player_name}.", "error")
+        return redirect(url_for('soloq_rosters', player=player_name))
+
+    if save_soloq_player(team_name, player_name, role, accounts):
+        flash(f"Saved {player_name} ({team_name}) with {len(accounts)} account(s). Use Update SoloQ Data to load their games.", "success")
+    else:
+        flash(f"Could not save {player_name}. Check logs for details.", "error")
+    return redirect(url_for('soloq_rosters'))
+
+@app.route('/soloq_rosters/delete', methods=['POST'])
+def delete_soloq_player_route():
+    player_name = request.form.get('player_name', '')
+    if delete_soloq_player(player_name): flash(f"Stopped tracking {player_name}. Stored games are kept.", "info")
+    else: flash(f"Could not remove {player_name}. Check logs for details.", "error")
+    return redirect(url_for('soloq_rosters'))
+
 # <<< НОВЫЙ МАРШРУТ ДЛЯ SWAP ---
 @app.route('/swap')
 def swap():
@@ -473,5 +620,18 @@ def swap():
     )
 # --- КОНЕЦ НОВОГО МАРШРУТА ---
 
+def debug_perf():
+    """Сводка времени по endpoint'ам и последние медленные запросы с разбивкой (SQL, span'ы, рендеринг)."""
+    return jsonify(get_perf_report())
+
+# Отчет раскрывает текст SQL и пути запросов - маршрут есть только при PERF_DEBUG_ENDPOINT=true
+if PERF_DEBUG_ENDPOINT:
+    app.add_url_rule('/debug/perf', view_func=debug_perf)
+
 if __name__ == '__main__':
+    # debug=True включает reloader: app.py импортируется и в следящем процессе, и в дочернем, который
+    # обслуживает запросы (WERKZEUG_RUN_MAIN=true). Планировщик SoloQ - только в дочернем, иначе два цикла
+    # делят один ключ Riot API. WSGI-серверы импортируют app, не запуская этот блок (см. soloq_scheduler.py).
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_soloq_refresh_scheduler()
     app.run(host='0.0.0.0', port=5002, debug=True)
\ No newline at end of file
@@ -0,0 +1,229 @@
+# benchmarks/bench_dashboard.py
+# Замеры read-путей страниц дашборда на синтетической БД (benchmarks/fixture_db.py):
+# каждая функция вызывается для типичных комбинаций фильтров, печатаются p50/p95 (мс) и число SQL-запросов.
+#
+#   python benchmarks/bench_dashboard.py --games 1000                    # БД строится во временный файл
+#   python benchmarks/bench_dashboard.py --db /tmp/fixture_10k.db --runs 5 --only get_proximity_data
+#   python benchmarks/bench_dashboard.py --db /tmp/fixture_1000.db --json before.json
+#   python benchmarks/bench_dashboard.py --db /tmp/fixture_1000.db --baseline before.json --tolerance 0.25
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database  # noqa: E402
+import jng_clear_logic  # noqa: E402
+import objects_logic  # noqa: E402
+import scrims_logic  # noqa: E402
+import start_positions_logic  # noqa: E402
+import swap_logic  # noqa: E402
+import tournament_logic  # noqa: E402
+from fixture_db import build_fixture_db, fixture_champion_data  # noqa: E402
+
+READ_PATH_MODULES = (database, jng_clear_logic, objects_logic, scrims_logic, start_positions_logic, swap_logic, tournament_logic)
+
+
+class QueryCounter:
+    """Считает SQL-запросы всех соединений, открытых через get_db_connection (trace callback sqlite3)."""
+
+    def __init__(self):
+        self.queries = 0
+        self.connections = 0
+        self._original = database.get_db_connection
+        self._patched = []
+
+    def _connect(self):
+        conn = self._original()
+        if conn is not None:
+            self.connections += 1
+            conn.set_trace_callback(self._trace)
+        return conn
+
+    def _trace(self, _statement):
+        self.queries += 1
+
+    def reset(self):
+        self.queries = 0
+        self.connections = 0
+
+    def install(self):
+        # Модули импортируют get_db_connection по имени, поэтому подменяем ссылку в каждом из них
+        for module in READ_PATH_MODULES:
+            if getattr(module, "get_db_connection", None) is self._original:
+                module.get_db_connection = self._connect
+                self._patched.append(module)
+
+    def uninstall(self):
+        for module in self._patched:
+            module.get_db_connection = self._original
+        self._patched = []
+
+
+def use_offline_reference_data():
+    """Справочник чемпионов и патч без Data Dragon: иначе первый вызов страницы мерил бы сеть."""
+    scrims_logic._fetch_champion_data = fixture_champion_data
+    scrims_logic._fetch_latest_patch_version = lambda: scrims_logic.FALLBACK_PATCH_VERSION
+
+
+def pick_filter_values(db_path):
+    """Самая частая команда и ее самые частые лесник/саппорт - чтобы фильтры по чемпиону что-то отбирали."""
+    conn = database.get_db_connection()
+    try:
+        teams = Counter()
+        junglers, supports = Counter(), Counter()
+        rows = conn.execute("SELECT Blue_Team_Name, Red_Team_Name, Blue_JGL_Champ, Red_JGL_Champ, Blue_SUP_Champ, Red_SUP_Champ FROM tournament_games").fetchall()
+        for row in rows:
+            teams[row["Blue_Team_Name"]] += 1
+            teams[row["Red_Team_Name"]] += 1
+        if not teams: raise SystemExit(f"{db_path} has no tournament games")
+        team = teams.most_common(1)[0][0]
+        for row in rows:
+            if row["Blue_Team_Name"] == team: junglers[row["Blue_JGL_Champ"]] += 1; supports[row["Blue_SUP_Champ"]] += 1
+            if row["Red_Team_Name"] == team: junglers[row["Red_JGL_Champ"]] += 1; supports[row["Red_SUP_Champ"]] += 1
+        return tournament_logic.TEAM_TAG_TO_FULL_NAME.get(team, team), junglers.most_common(1)[0][0], supports.most_common(1)[0][0]
+    finally:
+        conn.close()
+
+
+def benchmark_cases(team, jungler, support):
+    """(функция, метка фильтров, вызываемое, kwargs) - комбинации фильтров, которые реально выбирают на страницах."""
+    return [
+        ("aggregate_tournament_data", "overall", tournament_logic.aggregate_tournament_data, {"selected_team_full_name": None, "side_filter": "all"}),
+        ("aggregate_tournament_data", "team", tournament_logic.aggregate_tournament_data, {"selected_team_full_name": team, "side_filter": "all"}),
+        ("aggregate_tournament_data", "team blue", tournament_logic.aggregate_tournament_data, {"selected_team_full_name": team, "side_filter": "blue"}),
+        ("get_proximity_data", "JUNGLE 20", tournament_logic.get_proximity_data, {"selected_team_full_name": team, "selected_role": "JUNGLE", "games_filter": "20"}),
+        ("get_proximity_data", "SUPPORT All", tournament_logic.get_proximity_data, {"selected_team_full_name": team, "selected_role": "SUPPORT", "games_filter": "All"}),
+        ("get_all_wards_data", "All 20", tournament_logic.get_all_wards_data, {"selected_team_full_name": team, "selected_role": "All", "games_filter": "20", "selected_champion": "All"}),
+        ("get_all_wards_data", "JGL All", tournament_logic.get_all_wards_data, {"selected_team_full_name": team, "selected_role": "JGL", "games_filter": "All", "selected_champion": "All"}),
+        ("get_all_wards_data", f"SUP 50 {support}", tournament_logic.get_all_wards_data, {"selected_team_full_name": team, "selected_role": "SUP", "games_filter": "50", "selected_champion": support}),
+        ("get_swap_data", "10", swap_logic.get_swap_data, {"selected_team_full_name": team, "selected_champion": "All", "games_filter": "10"}),
+        ("get_swap_data", "All", swap_logic.get_swap_data, {"selected_team_full_name": team, "selected_champion": "All", "games_filter": "All"}),
+        ("get_start_positions_data", "10", start_positions_logic.get_start_positions_data, {"selected_team_full_name": team, "selected_champion": "All", "games_filter": "10"}),
+        ("get_start_positions_data", f"All {jungler}", start_positions_logic.get_start_positions_data, {"selected_team_full_name": team, "selected_champion": jungler, "games_filter": "All"}),
+        ("get_jng_clear_data", "clear 1", jng_clear_logic.get_jng_clear_data, {"selected_team_full_name": team, "selected_champion": "All", "clear_number": 1}),
+        ("get_jng_clear_data", "clear 2", jng_clear_logic.get_jng_clear_data, {"selected_team_full_name": team, "selected_champion": "All", "clear_number": 2}),
+        ("get_jng_clear_data", f"{jungler} clear 1", jng_clear_logic.get_jng_clear_data, {"selected_team_full_name": team, "selected_champion": jungler, "clear_number": 1}),
+        ("get_objects_data", "no team", objects_logic.get_objects_data, {"selected_team_full_name": None}),
+        ("get_objects_data", "team", objects_logic.get_objects_data, {"selected_team_full_name": team}),
+        ("aggregate_scrim_data", "All Time all", scrims_logic.aggregate_scrim_data, {"time_filter": "All Time", "side_filter": "all"}),
+        ("aggregate_scrim_data", "2 Weeks blue", scrims_logic.aggregate_scrim_data, {"time_filter": "2 Weeks", "side_filter": "blue"}),
+    ]
+
+
+def percentile(samples, pct):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def run_case(counter, func, kwargs, runs, warmup):
+    for _ in range(warmup):
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(**kwargs)
+    samples = []
+    for _ in range(runs):
+        counter.reset()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(**kwargs)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"runs": runs, "p50_ms": percentile(samples, 50), "p95_ms": percentile(samples, 95), "max_ms": max(samples),
+            "queries": counter.queries, "connections": counter.connections}
+
+
+def run_suite(db_path, runs, warmup, only=None):
+    original_path = database.DATABASE_PATH
+    database.DATABASE_PATH = db_path
+    use_offline_reference_data()
+    counter = QueryCounter()
+    try:
+        team, jungler, support = pick_filter_values(db_path)
+        counter.install()
+        results = {}
+        for func_name, label, func, kwargs in benchmark_cases(team, jungler, support):
+            if only and func_name not in only: continue
+            results[f"{func_name} [{label}]"] = run_case(counter, func, kwargs, runs, warmup)
+        conn = database.get_db_connection()
+        games = conn.execute("SELECT COUNT(*) FROM tournament_games").fetchone()[0]
+        scrims = conn.execute("SELECT COUNT(*) FROM scrims").fetchone()[0]
+        conn.close()
+        return {"params": {"db": db_path, "tournament_games": games, "scrims": scrims, "team": team, "runs": runs},
+                "results": results}
+    finally:
+        counter.uninstall()
+        database.DATABASE_PATH = original_path
+
+
+def print_report(report):
+    params = report["params"]
+    print(f"DB: {params['db']} ({params['tournament_games']} tournament games, {params['scrims']} scrims), "
+          f"team {params['team']}, {params['runs']} runs per case")
+    print(f"{'case':<58}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'conns':>7}")
+    for name, r in report["results"].items():
+        print(f"{name:<58}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['queries']:>9}{r['connections']:>7}")
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """Случаи, у которых p50 вырос больше чем на tolerance относительно baseline."""
+    regressions = []
+    for name, r in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base: continue
+        ratio = r["p50_ms"] / base["p50_ms"] if base["p50_ms"] else 1.0
+        marker = "REGRESSION" if ratio > 1 + tolerance else "ok"
+        print(f"{name:<58} x{ratio:.2f} p50, queries {base['queries']} -> {r['queries']}  {marker}")
+        if ratio > 1 + tolerance: regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard read-path benchmark on a synthetic fixture database.")
+    parser.add_argument("--db", help="fixture database (built with --games if the file does not exist)")
+    parser.add_argument("--games", type=int, default=100, help="tournament games when building a fixture (100 / 1000 / 10000)")
+    parser.add_argument("--position-games", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--only", help="comma-separated function names")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare with results saved by --json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    db_path, temporary = args.db, False
+    if not db_path:
+        db_path, temporary = tempfile.mktemp(prefix="bench_dashboard_", suffix=".db"), True
+    if not os.path.exists(db_path):
+        print(f"Building fixture database {db_path} ({args.games} games)...", file=sys.stderr)
+        build_fixture_db(db_path, games=args.games, position_games=args.position_games)
+
+    try:
+        only = set(args.only.split(",")) if args.only else None
+        report = run_suite(db_path, args.runs, args.warmup, only)
+    finally:
+        if temporary:
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                if os.path.exists(db_path + suffix): os.remove(db_path + suffix)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_with_baseline(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# benchmarks/bench_ingest.py
+# Набор бенчмарков горячих путей загрузки livestats на синтетических данных (benchmarks/livestats_generator.py):
+# пропускная способность каждого экстрактора (строк/с, МБ/с, записей/с), пиковая память (tracemalloc)
+# и скорость записи в БД (строк/с) на временной SQLite с полной схемой init_db.
+#
+#   python benchmarks/bench_ingest.py [--minutes 35] [--ticks-per-second 4] [--repeat 3] [--only positions,wards]
+#   python benchmarks/bench_ingest.py --json baseline.json                 # сохранить результаты
+#   python benchmarks/bench_ingest.py --baseline baseline.json --tolerance 0.25
+#       # код выхода 1, если какой-то бенчмарк стал медленнее baseline больше чем на 25%
+# Перед замерами проверяется, что полный путь лесника переживает encode/decode без потерь (иначе код выхода 1).
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database  # noqa: E402
+import scrims_logic  # noqa: E402
+import tournament_logic  # noqa: E402
+from livestats_generator import generate_livestats  # noqa: E402
+
+GAME_ID = "bench-game"
+
+
+def _quiet(func, *args):
+    """Экстракторы и save-функции пишут в лог через print - во время замеров вывод глушится."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+def _count(result):
+    """Число записей результата экстрактора (для записей/с)."""
+    if isinstance(result, tuple):  # parse_replay_timeline: (колонки, участники, снапшоты, события)
+        return len(result[0]) + len(result[3])
+    if isinstance(result, dict):
+        return sum(len(v) for v in result.values())
+    return len(result)
+
+
+def extractor_cases(content, summary):
+    participants = summary["participants"]
+    pid_to_info = scrims_logic.replay_participant_info(summary)
+    return [
+        ("positions", tournament_logic.extract_player_positions_timeline, (content, GAME_ID)),
+        ("objectives", tournament_logic.extract_objective_events, (content, GAME_ID, participants)),
+        ("wards", tournament_logic.extract_all_ward_data, (content, GAME_ID, participants)),
+        ("jungle_paths", lambda *a: tournament_logic.extract_jungle_paths(*a, full_game=True)[1], (content, GAME_ID, participants)),
+        ("replay_parse", scrims_logic.parse_replay_timeline, (GAME_ID, content, pid_to_info)),
+    ]
+
+
+def check_jungle_path_roundtrip(content, summary):
+    """
+    Полные пути лесников после encode_jungle_path/decode_jungle_path должны совпадать с исходными
+    (время - с точностью до секунды), а эпики не должны превращаться в "Other".
+    Возвращает список ошибок (пустой - проверка пройдена).
+    """
+    errors = []
+    _, full_paths = _quiet(tournament_logic.extract_jungle_paths, content, GAME_ID, summary["participants"], True)
+    if not full_paths: return ["no full jungle paths extracted"]
+    for puuid, path in full_paths.items():
+        decoded = tournament_logic.decode_jungle_path(tournament_logic.encode_jungle_path(path))
+        for original, restored in zip(path, decoded):
+            if restored["action"] != original["action"] or restored["time"] != round(original["time"]):
+                errors.append(f"{puuid[:8]}: {original} -> {restored}")
+        if len(decoded) != len(path): errors.append(f"{puuid[:8]}: {len(path)} actions -> {len(decoded)}")
+        if any(a["action"] == "Other" for a in decoded): errors.append(f"{puuid[:8]}: path contains 'Other'")
+    objectives = {a["action"] for path in full_paths.values() for a in path} & {"Rift Herald", "Baron Nashor", "Atakhan", "VoidGrub"}
+    if len(objectives) < 4: errors.append(f"objectives missing from full paths: {sorted(objectives)}")
+    return errors
+
+
+def db_cases(content, summary):
+    """(имя, функция записи, число строк) - данные извлекаются заранее, замеряется только запись."""
+    participants = summary["participants"]
+    positions = _quiet(tournament_logic.extract_player_positions_timeline, content, GAME_ID)
+    objectives = _quiet(tournament_logic.extract_objective_events, content, GAME_ID, participants)
+    wards = _quiet(tournament_logic.extract_all_ward_data, content, GAME_ID, participants)
+    parsed = _quiet(scrims_logic.parse_replay_timeline, GAME_ID, content, scrims_logic.replay_participant_info(summary))
+
+    def with_conn(save_func, rows):
+        def run():
+            conn = database.get_db_connection()
+            try:
+                save_func(conn, GAME_ID, rows)
+                conn.commit()
+            finally:
+                conn.close()
+        return run
+
+    return [
+        ("db_positions_timeline", with_conn(tournament_logic.save_player_positions_timeline, positions), len(positions)),
+        ("db_objectives", with_conn(tournament_logic.save_objective_events, objectives), len(objectives)),
+        ("db_wards", with_conn(tournament_logic.save_all_ward_data, wards), len(wards)),
+        ("db_replay", lambda: scrims_logic.save_parsed_replay(GAME_ID, parsed), len(parsed[0]) + len(parsed[3])),
+    ]
+
+
+def best_of(repeat, func, *args):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = _quiet(func, *args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def peak_memory(func, *args):
+    """Пиковая память Python-аллокаций за один вызов (байты). Отдельный прогон: tracemalloc замедляет код."""
+    tracemalloc.start()
+    try:
+        _quiet(func, *args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_suite(minutes, ticks_per_second, repeat, seed=1, only=None):
+    content, summary = generate_livestats(minutes, ticks_per_second, seed)
+    lines = content.count("\n") + 1
+    size_mb = len(content.encode("utf-8")) / 1e6
+    results = {}
+
+    for name, func, args in extractor_cases(content, summary):
+        if only and name not in only: continue
+        elapsed, result = best_of(repeat, func, *args)
+        records = _count(result)
+        results[name] = {
+            "seconds": elapsed, "lines_per_s": lines / elapsed, "mb_per_s": size_mb / elapsed,
+            "records": records, "records_per_s": records / elapsed, "peak_mb": peak_memory(func, *args) / 1e6,
+        }
+
+    db_path = tempfile.mktemp(prefix="bench_ingest_", suffix=".db")
+    original_path = database.DATABASE_PATH
+    database.DATABASE_PATH = db_path
+    try:
+        _quiet(database.init_db)
+        for name, func, rows in db_cases(content, summary):
+            if only and name not in only: continue
+            elapsed, _ = best_of(repeat, func)
+            results[name] = {"seconds": elapsed, "records": rows, "records_per_s": rows / elapsed}
+    finally:
+        database.DATABASE_PATH = original_path
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(db_path + suffix): os.remove(db_path + suffix)
+
+    return {
+        "params": {"minutes": minutes, "ticks_per_second": ticks_per_second, "seed": seed, "repeat": repeat,
+                   "lines": lines, "size_mb": round(size_mb, 2)},
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+def print_report(report):
+    params = report["params"]
+    print(f"Livestats: {params['minutes']} min, {params['ticks_per_second']} ticks/s, "
+          f"{params['lines']} lines, {params['size_mb']} MB (best of {params['repeat']})")
+    print(f"{'benchmark':<24}{'seconds':>9}{'lines/s':>12}{'MB/s':>8}{'records':>10}{'records/s':>12}{'peak MB':>9}")
+    for name, r in report["results"].items():
+        lines_per_s = f"{r['lines_per_s']:,.0f}" if "lines_per_s" in r else "-"
+        mb_per_s = f"{r['mb_per_s']:.1f}" if "mb_per_s" in r else "-"
+        peak = f"{r['peak_mb']:.1f}" if "peak_mb" in r else "-"
+        print(f"{name:<24}{r['seconds']:>9.3f}{lines_per_s:>12}{mb_per_s:>8}{r['records']:>10}{r['records_per_s']:>12,.0f}{peak:>9}")
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """Список регрессий: бенчмарки, время которых выросло больше чем на tolerance относительно baseline."""
+    regressions = []
+    if baseline.get("params", {}).get("minutes") != report["params"]["minutes"] or \
+       baseline.get("params", {}).get("ticks_per_second") != report["params"]["ticks_per_second"]:
+        print("WARNING: baseline was recorded with different --minutes/--ticks-per-second, comparison is approximate.")
+    for name, r in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base: continue
+        ratio = r["seconds"] / base["seconds"]
+        marker = "REGRESSION" if ratio > 1 + tolerance else "ok"
+        print(f"{name:<24} x{ratio:.2f} vs baseline  {marker}")
+        if ratio > 1 + tolerance: regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Livestats ingest benchmark suite on synthetic data.")
+    parser.add_argument("--minutes", type=int, default=35)
+    parser.add_argument("--ticks-per-second", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", help="comma-separated benchmark names")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare with results saved by --json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    only = set(args.only.split(",")) if args.only else None
+    content, summary = generate_livestats(args.minutes, args.ticks_per_second, args.seed)
+    roundtrip_errors = check_jungle_path_roundtrip(content, summary)
+    if roundtrip_errors:
+        print("Jungle path encode/decode round-trip FAILED:")
+        for error in roundtrip_errors[:20]: print(f"  {error}")
+        sys.exit(1)
+    print("Jungle path encode/decode round-trip: ok")
+    del content, summary
+
+    report = run_suite(args.minutes, args.ticks_per_second, args.repeat, args.seed, only)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_with_baseline(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
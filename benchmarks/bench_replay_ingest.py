@@ -0,0 +1,88 @@
+# benchmarks/bench_replay_ingest.py
+# Микро-бенчмарк разбора livestats скрима: прежний построчный цикл (кортеж + datetime.now() + словарь
+# на каждую запись) против колоночного parse_replay_timeline. Печатает записи позиций в секунду.
+#
+#   python benchmarks/bench_replay_ingest.py [--minutes 35] [--ticks-per-second 4] [--repeat 3]
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from livestats_generator import generate_livestats  # noqa: E402
+from scrims_logic import parse_replay_timeline  # noqa: E402
+
+
+def legacy_parse(game_id, timeline_data, pid_to_info):
+    """Прежний цикл process_replay_to_db: кортеж с datetime.now() и словарь на каждую запись."""
+    timeline_records = []
+    snapshot_map = {}
+    for line in timeline_data.strip().split('\n'):
+        if not line.strip(): continue
+        try: snapshot = json.loads(line)
+        except ValueError: continue
+        schema = snapshot.get("rfc461Schema")
+        game_time_ms = snapshot.get("gameTime") or snapshot.get("timestamp")
+        if schema == "stats_update" and game_time_ms is not None:
+            t_sec = int(game_time_ms / 1000)
+            snapshot_positions = []
+            for p_data in snapshot.get("participants", []):
+                p_id = p_data.get("participantID")
+                pos = p_data.get("position")
+                if p_id is not None and pos and 'x' in pos and 'z' in pos:
+                    info = pid_to_info.get(p_id, {})
+                    puuid = p_data.get("puuid") or info.get("puuid")
+                    timeline_records.append((
+                        str(game_id), int(game_time_ms), int(p_id),
+                        str(puuid) if puuid else f"unknown_{p_id}",
+                        int(pos['x']), int(pos['z']),
+                        datetime.now(timezone.utc).isoformat()
+                    ))
+                    snapshot_positions.append({
+                        "participantID": p_id, "championName": info.get("champion", "Unknown"),
+                        "teamId": info.get("teamId", 0), "x": float(pos['x']), "z": float(pos['z'])
+                    })
+            if snapshot_positions and t_sec not in snapshot_map:
+                snapshot_map[t_sec] = snapshot_positions
+    return timeline_records, snapshot_map
+
+
+def best_of(repeat, func, *args):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay ingest micro-benchmark (legacy vs columnar parsing).")
+    parser.add_argument("--minutes", type=int, default=35)
+    parser.add_argument("--ticks-per-second", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    timeline_data, summary = generate_livestats(args.minutes, args.ticks_per_second)
+    pid_to_info = {p["participantId"]: {"puuid": p["puuid"], "champion": p["championName"], "teamId": p["teamId"]}
+                   for p in summary["participants"]}
+    game_id = "bench-game"
+
+    legacy_time, (legacy_records, legacy_snapshots) = best_of(args.repeat, legacy_parse, game_id, timeline_data, pid_to_info)
+    columnar_time, (columns, _, snapshots, _) = best_of(args.repeat, parse_replay_timeline, game_id, timeline_data, pid_to_info)
+
+    assert len(columns) == len(legacy_records) and snapshots.keys() == legacy_snapshots.keys()
+    records = len(columns)
+    print(f"Livestats: {args.minutes} min, {args.ticks_per_second} ticks/s, {records} position records")
+    print(f"legacy   : {legacy_time:.3f}s  {records / legacy_time:,.0f} records/s")
+    print(f"columnar : {columnar_time:.3f}s  {records / columnar_time:,.0f} records/s  (x{legacy_time / columnar_time:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+# benchmarks/fixture_db.py
+# Построитель синтетической БД для нагрузочных замеров страниц дашборда (shipped scrims_data.db пустая).
+# Заполняет все таблицы, которые читают страницы: tournament_games (+ draft_actions и tournament_agg_* через
+# parse_and_store_tournament_game), objective_events, jungle_pathing(_full), player_positions_snapshots,
+# first_wards_data, all_wards_data, позиции (player_positions_timeline или компактное хранилище) и scrims.
+# Запись идет через те же save-функции, что и при загрузке из GRID.
+#
+#   python benchmarks/fixture_db.py --games 1000 --out /tmp/fixture_1000.db
+#   python benchmarks/fixture_db.py --games 10000 --position-games 300 --position-store compact --out /tmp/fixture_10k.db
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database  # noqa: E402
+import scrims_logic  # noqa: E402
+import tournament_logic  # noqa: E402
+from livestats_generator import LANE_ANCHORS, MAP_SIZE  # noqa: E402
+from replay_encoding import PositionColumns  # noqa: E402
+
+ROLES = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+ROLE_ABBR = {"TOP": "TOP", "JUNGLE": "JGL", "MIDDLE": "MID", "BOTTOM": "BOT", "UTILITY": "SUP"}
+TEAM_TAGS = ["ALP", "BRV", "CRN", "DSK", "EVO", "FRG", "GLX", "HVK", "ION", "JLT", "KRX", "LUM", "MNT", "NVA", "ORB", "PYR"]
+
+# (championName как в Riot summary, ID чемпиона)
+CHAMPIONS_BY_ROLE = {
+    "TOP": [("Aatrox", 266), ("Gnar", 150), ("Renekton", 58), ("KSante", 897), ("Jax", 24), ("Rumble", 68), ("Ornn", 516), ("Camille", 164)],
+    "JUNGLE": [("LeeSin", 64), ("Viego", 234), ("Sejuani", 113), ("Maokai", 57), ("XinZhao", 5), ("Vi", 254), ("JarvanIV", 59), ("Wukong", 62)],
+    "MIDDLE": [("Ahri", 103), ("Orianna", 61), ("Azir", 268), ("Sylas", 517), ("Taliyah", 163), ("Syndra", 134), ("Corki", 42), ("Yone", 777)],
+    "BOTTOM": [("Jinx", 222), ("Kaisa", 145), ("Varus", 110), ("Ezreal", 81), ("Xayah", 498), ("Aphelios", 523), ("Zeri", 221), ("Kalista", 429)],
+    "UTILITY": [("Nautilus", 111), ("Rakan", 497), ("Rell", 526), ("Alistar", 12), ("Braum", 201), ("Renata", 888), ("Leona", 89), ("Thresh", 412)],
+}
+ALL_CHAMPIONS = [champ for champs in CHAMPIONS_BY_ROLE.values() for champ in champs]
+
+CAMP_ACTIONS = ["Blue Buff", "Gromp", "Wolves", "Raptors", "Red Buff", "Krugs", "Scuttle"]
+DRAGON_SUBTYPES = ["INFERNAL", "OCEAN", "MOUNTAIN", "CLOUD", "HEXTECH", "CHEMTECH"]
+WARD_TYPES = ["Stealth Ward", "Stealth Ward", "Stealth Ward", "Control Ward", "Farsight Ward"]
+TOWER_LANES = ["TOP_LANE", "MID_LANE", "BOT_LANE"]
+# Последовательность драфта: баны 1-6 и 13-16, пики 7-12 и 17-20
+BAN_SEQS = set(range(1, 7)) | set(range(13, 17))
+
+
+def fixture_champion_data():
+    """Справочник чемпионов в формате get_champion_data() - чтобы замеры шли без Data Dragon."""
+    return {"id_map": {str(champ_id): name for name, champ_id in ALL_CHAMPIONS},
+            "name_map": {name: name for name, _ in ALL_CHAMPIONS}}
+
+
+def _team_roster(tag):
+    return [{"role": role, "puuid": f"fixture-{tag}-{ROLE_ABBR[role]}", "name": f"{tag} {ROLE_ABBR[role].title()}"} for role in ROLES]
+
+
+def _pick_side(rng, taken):
+    picks = []
+    for role in ROLES:
+        name, champ_id = rng.choice([c for c in CHAMPIONS_BY_ROLE[role] if c[0] not in taken])
+        taken.add(name)
+        picks.append((role, name, champ_id))
+    return picks
+
+
+def _draft_actions(blue_picks, red_picks, blue_bans, red_bans, blue_team_id, red_team_id):
+    """Драфт в формате GRID (sequenceNumber, type, drafter, draftable) в порядке BLUE_DRAFT_SEQS/RED_DRAFT_SEQS."""
+    actions = []
+    queues = {("Blue", "ban"): list(blue_bans), ("Red", "ban"): list(red_bans),
+              ("Blue", "pick"): [(name, champ_id) for _, name, champ_id in blue_picks],
+              ("Red", "pick"): [(name, champ_id) for _, name, champ_id in red_picks]}
+    for seq in range(1, 21):
+        side = "Blue" if seq in tournament_logic.BLUE_DRAFT_SEQS else "Red"
+        action_type = "ban" if seq in BAN_SEQS else "pick"
+        if not queues[(side, action_type)]: continue
+        name, champ_id = queues[(side, action_type)].pop(0)
+        actions.append({"id": f"action-{seq}", "sequenceNumber": seq, "type": action_type,
+                        "drafter": {"id": blue_team_id if side == "Blue" else red_team_id},
+                        "draftable": {"id": str(champ_id), "name": name}})
+    return actions
+
+
+def _summary(game_id, rng, blue_tag, red_tag, blue_picks, red_picks, blue_bans, red_bans, created_ms, duration_sec, blue_win):
+    participants = []
+    for side_index, (tag, picks) in enumerate(((blue_tag, blue_picks), (red_tag, red_picks))):
+        team_id = 100 if side_index == 0 else 200
+        for role_index, (player, (_, champ, _)) in enumerate(zip(_team_roster(tag), picks)):
+            participants.append({
+                "participantId": side_index * 5 + role_index + 1, "puuid": player["puuid"], "teamId": team_id,
+                "riotIdGameName": player["name"], "championName": champ, "teamPosition": player["role"],
+                "kills": rng.randint(0, 10), "deaths": rng.randint(0, 8), "assists": rng.randint(0, 15),
+                "totalDamageDealtToChampions": rng.randint(4000, 40000), "totalMinionsKilled": rng.randint(20, 320),
+                "neutralMinionsKilled": rng.randint(0, 200), "goldEarned": rng.randint(6000, 18000),
+                "item0": 3078, "item1": 3047, "item2": 6610,
+                "perks": {"styles": [{"selections": [{"perk": 8010}, {"perk": 9111}, {"perk": 9104}, {"perk": 8299}]}],
+                          "statPerks": {"offense": 5005, "flex": 5008, "defense": 5001}},
+            })
+    teams = [
+        {"teamId": 100, "win": blue_win, "bans": [{"championId": champ_id, "pickTurn": i + 1} for i, (_, champ_id) in enumerate(blue_bans)]},
+        {"teamId": 200, "win": not blue_win, "bans": [{"championId": champ_id, "pickTurn": i + 6} for i, (_, champ_id) in enumerate(red_bans)]},
+    ]
+    return {"esportsGameId": game_id, "gameCreation": created_ms, "gameDuration": duration_sec, "gameVersion": "15.12.689.1234",
+            "participants": participants, "teams": teams}
+
+
+def _objective_events(rng, game_id, duration_ms):
+    events = []
+    def add(ts, obj_type, subtype, team_id, lane=None):
+        events.append({"game_id": game_id, "timestamp_ms": ts, "objective_type": obj_type, "objective_subtype": subtype,
+                       "team_id": team_id, "killer_participant_id": rng.choice((2, 7)), "lane": lane})
+    for ts in range(300000, duration_ms, 330000):
+        add(ts + rng.randint(0, 60000), "DRAGON", rng.choice(DRAGON_SUBTYPES), rng.choice((100, 200)))
+    for wave in (360000, 570000):
+        team_id = rng.choice((100, 200))
+        for _ in range(3): add(wave + rng.randint(0, 20000), "VOIDGRUB", "VOIDGRUB", team_id)
+    if duration_ms > 900000: add(900000 + rng.randint(0, 120000), "HERALD", "HERALD", rng.choice((100, 200)))
+    if duration_ms > 1200000: add(1200000 + rng.randint(0, 120000), "ATAKHAN", "ATAKHAN", rng.choice((100, 200)))
+    for ts in range(1500000, duration_ms, 420000):
+        add(ts + rng.randint(0, 60000), "BARON", "BARON", rng.choice((100, 200)))
+    tower_ts = 780000
+    for tier in ("OUTER", "OUTER", "OUTER", "INNER", "INNER", "OUTER", "INNER", "INHIBITOR", "INNER", "OUTER"):
+        tower_ts += rng.randint(60000, 150000)
+        if tower_ts >= duration_ms: break
+        add(tower_ts, "TOWER", tier, rng.choice((100, 200)), rng.choice(TOWER_LANES))
+    events.sort(key=lambda e: e["timestamp_ms"])
+    return events
+
+
+def _jungle_paths(rng, duration_sec):
+    """(путь первой зачистки до первого Recall, путь за всю игру) в формате extract_jungle_paths."""
+    full_path, first_clear_len, t = [], None, 90.0
+    while t < duration_sec:
+        camps = rng.sample(CAMP_ACTIONS, rng.randint(3, 6))
+        for camp in camps:
+            t += rng.uniform(14, 35)
+            full_path.append({"action": camp, "time": round(t, 1)})
+        if rng.random() < 0.3:
+            full_path.append({"action": rng.choice(["Gank/Save Top", "Gank/Save Mid", "Gank/Save Bot"]), "time": round(t + 5, 1)})
+        t += rng.uniform(20, 60)
+        full_path.append({"action": "Recall", "time": round(t, 1)})
+        if first_clear_len is None: first_clear_len = len(full_path)
+        t += rng.uniform(40, 90)
+    return full_path[:first_clear_len], full_path
+
+
+def _wards(rng, game_id, participants, duration_sec):
+    wards = []
+    for p in participants:
+        next_ward = rng.uniform(60, 120)
+        while next_ward < duration_sec:
+            wards.append({"game_id": game_id, "player_puuid": p["puuid"], "participant_id": p["participantId"],
+                          "player_name": p["riotIdGameName"], "champion_name": p["championName"],
+                          "ward_type": rng.choice(WARD_TYPES), "timestamp_seconds": round(next_ward, 1),
+                          "pos_x": rng.randint(1000, MAP_SIZE - 1000), "pos_z": rng.randint(1000, MAP_SIZE - 1000)})
+            next_ward += rng.uniform(60, 150)
+    first_wards = []
+    seen = set()
+    for ward in sorted(wards, key=lambda w: w["timestamp_seconds"]):
+        if ward["player_puuid"] in seen: continue
+        seen.add(ward["player_puuid"])
+        first_wards.append(ward)
+    return wards, first_wards
+
+
+def _position_track(rng, participants, duration_ms, tick_ms):
+    """Позиции всех участников с шагом tick_ms: движение к цели, цель меняется раз в 30 c (лесник - по всей карте)."""
+    columns = PositionColumns()
+    anchors = {}
+    for p in participants:
+        role = p["teamPosition"]
+        x, z = LANE_ANCHORS[role]
+        anchors[p["participantId"]] = (x, z) if p["teamId"] == 100 else (x + 400, z + 400)
+    positions = {pid: [560, 580] if pid <= 5 else [14200, 14250] for pid in anchors}
+    targets = dict(anchors)
+    for ts in range(0, duration_ms, tick_ms):
+        if ts % 30000 == 0 and ts >= 90000:
+            for p in participants:
+                pid = p["participantId"]
+                roam = p["teamPosition"] in ("JUNGLE", "UTILITY") and rng.random() < 0.5
+                targets[pid] = rng.choice(list(LANE_ANCHORS.values())) if roam else anchors[pid]
+        for pid, pos in positions.items():
+            tx, tz = targets[pid]
+            pos[0] = max(0, min(MAP_SIZE, pos[0] + (tx - pos[0]) // 8 + rng.randint(-150, 150)))
+            pos[1] = max(0, min(MAP_SIZE, pos[1] + (tz - pos[1]) // 8 + rng.randint(-150, 150)))
+            columns.append(ts, pid, pos[0], pos[1])
+    return columns
+
+
+def _save_positions(conn, game_id, participants, columns, position_store):
+    if position_store == "compact":
+        cursor = conn.cursor()
+        scrims_logic.save_canonical_positions(
+            cursor, game_id, {p["participantId"]: (p["puuid"], p["championName"], p["teamId"]) for p in participants},
+            columns, datetime.now(timezone.utc).isoformat())
+        cursor.close()
+        return
+    puuid_by_pid = {p["participantId"]: p["puuid"] for p in participants}
+    tournament_logic.save_player_positions_timeline(conn, game_id, [
+        {"game_id": game_id, "timestamp_ms": ts, "participant_id": pid, "player_puuid": puuid_by_pid[pid], "pos_x": x, "pos_z": z}
+        for ts, pid, x, z in zip(columns.timestamps, columns.participant_ids, columns.xs, columns.zs)
+    ])
+
+
+def _snapshot_positions(columns, participants, timestamp_sec):
+    """Снапшот в формате extract_player_positions для player_positions_snapshots."""
+    by_pid = {p["participantId"]: p for p in participants}
+    target_ms = timestamp_sec * 1000
+    snapshot = []
+    for ts, pid, x, z in zip(columns.timestamps, columns.participant_ids, columns.xs, columns.zs):
+        if ts > target_ms: break
+        if ts == target_ms:
+            p = by_pid[pid]
+            snapshot.append({"participantID": pid, "championName": p["championName"], "teamId": p["teamId"], "x": float(x), "z": float(z)})
+    return snapshot
+
+
+def _scrim_row(rng, game_id, sql_column_names, summary, our_side, date_str, duration_sec):
+    """Строка таблицы scrims так же, как ее собирает fetch_and_store_scrims (наша команда - TEAM_NAME)."""
+    participants = summary["participants"]
+    roster_names = list(scrims_logic.ROSTER_RIOT_NAME_TO_GRID_ID)
+    our_team_id = 100 if our_side == "blue" else 200
+    row = {col: "N/A" for col in sql_column_names}
+    row["Game_ID"] = game_id
+    row["Date"] = date_str
+    row["Patch"] = "15.12"
+    row["Blue_Team_Name"] = scrims_logic.TEAM_NAME if our_side == "blue" else participants[0]["riotIdGameName"].split(" ", 1)[0]
+    row["Red_Team_Name"] = scrims_logic.TEAM_NAME if our_side == "red" else participants[5]["riotIdGameName"].split(" ", 1)[0]
+    row["Duration"] = f"{duration_sec // 60}:{duration_sec % 60:02d}"
+    our_win = next(t["win"] for t in summary["teams"] if t["teamId"] == our_team_id)
+    row["Result"] = "Win" if our_win else "Loss"
+    for team in summary["teams"]:
+        prefix = "Blue" if team["teamId"] == 100 else "Red"
+        for i, ban in enumerate(team["bans"]): row[f"{prefix}_Ban_{i + 1}_ID"] = str(ban["championId"])
+    for idx, p in enumerate(participants):
+        prefix = f"{'Blue' if idx < 5 else 'Red'}_{ROLE_ABBR[ROLES[idx % 5]]}"
+        is_ours = (idx < 5) == (our_side == "blue")
+        row[f"{prefix}_Player"] = scrims_logic.normalize_player_name(roster_names[idx % 5] if is_ours else p["riotIdGameName"])
+        row[f"{prefix}_Champ"] = p["championName"]
+        row[f"{prefix}_K"], row[f"{prefix}_D"], row[f"{prefix}_A"] = p["kills"], p["deaths"], p["assists"]
+        row[f"{prefix}_Dmg"] = p["totalDamageDealtToChampions"]
+        row[f"{prefix}_CS"] = p["totalMinionsKilled"] + p["neutralMinionsKilled"]
+        row[f"{prefix}_Items"] = "3078,3047,6610"
+        row[f"{prefix}_Runes"] = "8010,9111,9104,8299,5005,5008,5001"
+        row[f"{prefix}_Gold"] = p["goldEarned"]
+    return tuple(row[col] for col in sql_column_names)
+
+
+def build_fixture_db(path, games=100, scrims=None, seed=1, position_games=100, position_tick_ms=1000,
+                     position_store="timeline", teams=len(TEAM_TAGS), progress=True):
+    """
+    Создает БД path (файл перезаписывается) с games турнирными играми и scrims скримами (по умолчанию столько же).
+    Полные треки позиций пишутся только для position_games самых свежих турнирных игр (1 Гц - ~18 тыс. строк на игру).
+    Возвращает словарь с числом строк по таблицам.
+    """
+    scrims = games if scrims is None else scrims
+    team_tags = TEAM_TAGS[:max(2, min(teams, len(TEAM_TAGS)))]
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix): os.remove(path + suffix)
+
+    original_path = database.DATABASE_PATH
+    database.DATABASE_PATH = path
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    # Даты привязаны к текущему дню, чтобы фильтры "3 Days"/"2 Weeks" страницы скримов что-то отбирали
+    anchor = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.init_db()
+        conn = database.get_db_connection()
+        cursor = conn.cursor()
+        team_ids = {tag: str(9000 + i) for i, tag in enumerate(team_tags)}
+        scrim_columns = [hdr.replace(" ", "_").replace(".", "").replace("-", "_") for hdr in database.SCRIMS_HEADER]
+        quoted_scrim_columns = ', '.join(f'"{col}"' for col in scrim_columns)
+        scrim_insert = f"INSERT OR REPLACE INTO scrims ({quoted_scrim_columns}) VALUES ({', '.join(['?'] * len(scrim_columns))})"
+
+        total = games + scrims
+        for index in range(total):
+            is_scrim = index >= games
+            game_index = index - games if is_scrim else index
+            count = scrims if is_scrim else games
+            game_id = f"fx-{'s' if is_scrim else 't'}-{game_index:06d}"
+            # Игры равномерно распределены по последним 60 дням, последняя - самая свежая
+            created = anchor - timedelta(days=60) + timedelta(seconds=int((game_index + 1) * 60 * 86400 / max(count, 1)))
+            duration_sec = rng.randint(1500, 2400)
+            duration_ms = duration_sec * 1000
+            blue_tag, red_tag = rng.sample(team_tags, 2)
+            taken = set()
+            blue_picks, red_picks = _pick_side(rng, taken), _pick_side(rng, taken)
+            bans = rng.sample([c for c in ALL_CHAMPIONS if c[0] not in taken], 10)
+            blue_win = rng.random() < 0.52
+            summary = _summary(game_id, rng, blue_tag, red_tag, blue_picks, red_picks, bans[:5], bans[5:],
+                               int(created.timestamp() * 1000), duration_sec, blue_win)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                if is_scrim:
+                    cursor.execute(scrim_insert, _scrim_row(rng, game_id, scrim_columns, summary, rng.choice(("blue", "red")),
+                                                            created.strftime("%Y-%m-%d %H:%M:%S"), duration_sec))
+                    tournament_logic.save_objective_events(conn, game_id, _objective_events(rng, game_id, duration_ms))
+                else:
+                    series_info = {"id": f"fx-series-{game_index // 3}", "sequenceNumber": game_index % 3 + 1, "stage": {"name": "Regular Season"}}
+                    draft = _draft_actions(blue_picks, red_picks, bans[:5], bans[5:], team_ids[blue_tag], team_ids[red_tag])
+                    tournament_logic.parse_and_store_tournament_game(cursor, summary, series_info, draft, tournament_logic.TARGET_TOURNAMENT_NAME_FOR_DB)
+                    tournament_logic.save_objective_events(conn, game_id, _objective_events(rng, game_id, duration_ms))
+
+                    participants = summary["participants"]
+                    for jungler in (participants[1], participants[6]):
+                        first_clear, full_path = _jungle_paths(rng, duration_sec)
+                        tournament_logic.save_jungle_path(conn, game_id, jungler["puuid"], first_clear)
+                        tournament_logic.save_full_jungle_path(conn, game_id, jungler["puuid"], full_path)
+
+                    all_wards, first_wards = _wards(rng, game_id, participants, duration_sec)
+                    tournament_logic.save_all_ward_data(conn, game_id, all_wards)
+                    tournament_logic.save_first_ward_data(conn, game_id, first_wards)
+
+                    # Снапшоты 40/60/80 c есть у всех игр, полный трек - только у свежих
+                    with_track = game_index >= games - position_games
+                    track_ms = duration_ms if with_track else (max(tournament_logic.TARGET_POSITION_TIMESTAMPS_SEC) + 1) * 1000
+                    columns = _position_track(rng, participants, track_ms, position_tick_ms)
+                    for ts_sec in tournament_logic.TARGET_POSITION_TIMESTAMPS_SEC:
+                        snapshot = _snapshot_positions(columns, participants, ts_sec)
+                        if snapshot: tournament_logic.save_position_snapshot(conn, game_id, ts_sec, snapshot)
+                    if with_track: _save_positions(conn, game_id, participants, columns, position_store)
+
+            if (index + 1) % 200 == 0 or index + 1 == total:
+                conn.commit()
+                if progress:
+                    print(f"  {index + 1}/{total} games written ({time.perf_counter() - started:.1f}s)", file=sys.stderr)
+
+        counts = {}
+        for (table_name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name").fetchall():
+            rows = conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+            if rows: counts[table_name] = rows
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.close()
+        return counts
+    finally:
+        database.DATABASE_PATH = original_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a synthetic SQLite database for dashboard query benchmarks.")
+    parser.add_argument("--games", type=int, default=100, help="tournament games (100 / 1000 / 10000)")
+    parser.add_argument("--scrims", type=int, help="scrim games (default: same as --games)")
+    parser.add_argument("--teams", type=int, default=len(TEAM_TAGS))
+    parser.add_argument("--position-games", type=int, default=100, help="most recent tournament games that get full position tracks")
+    parser.add_argument("--position-tick-ms", type=int, default=1000)
+    parser.add_argument("--position-store", choices=("timeline", "compact"), default="timeline",
+                        help="player_positions_timeline (tournament ingest) or the compact position_* tables")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = build_fixture_db(args.out, args.games, args.scrims, args.seed, args.position_games,
+                              args.position_tick_ms, args.position_store, args.teams)
+    print(f"Built {args.out} in {time.perf_counter() - started:.1f}s ({os.path.getsize(args.out) / 1e6:.1f} MB)")
+    for table_name, rows in counts.items():
+        print(f"  {table_name:<28}{rows:>12,}")
+
+
+if __name__ == "__main__":
+    main()
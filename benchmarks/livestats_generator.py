@@ -0,0 +1,182 @@
+# benchmarks/livestats_generator.py
+# Детерминированный генератор синтетических livestats (NDJSON, rfc461) для бенчмарков без ключа GRID.
+# Частоты и поля повторяют реальные файлы: stats_update с заданной частотой тиков, ward_placed,
+# epic_monster_kill (лагерь леса и эпики), building_destroyed, channeling_started (recall) и шум прочих схем.
+#
+#   python benchmarks/livestats_generator.py --minutes 35 --ticks-per-second 4 --out /tmp/game.ndjson
+#   (рядом пишется /tmp/game.summary.json - summary участников в формате Riot summary)
+
+import argparse
+import json
+import os
+import random
+
+MAP_SIZE = 14800
+CHAMPIONS = ["Aatrox", "LeeSin", "Ahri", "Jinx", "Nautilus", "Gnar", "Viego", "Orianna", "Kaisa", "Rakan"]
+ROLES = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+
+# Примерные точки старта и линий (x, z) - участники "гуляют" вокруг них, а не прыгают по всей карте
+BLUE_BASE, RED_BASE = (560, 580), (14200, 14250)
+LANE_ANCHORS = {"TOP": (1800, 12800), "JUNGLE": (3800, 7800), "MIDDLE": (7400, 7400), "BOTTOM": (12800, 1800), "UTILITY": (12300, 2300)}
+RED_JUNGLE_ANCHOR = (11000, 7000)
+
+JUNGLE_CAMPS = ["blueCamp", "gromp", "wolf", "raptor", "redCamp", "krug", "ScuttleCrab"]
+DRAGON_TYPES = ["fire", "water", "earth", "air", "hextech", "chemtech"]
+WARD_TYPES = ["yellowTrinket", "control", "sight", "blueTrinket"]
+TOWERS = [(lane, tier) for lane in ("top", "mid", "bot") for tier in ("outer", "inner", "inhibitor")] + [("mid", "nexus"), ("mid", "nexus")]
+NOISE_SCHEMAS = ["skill_level_up", "item_purchased", "champion_kill", "minion_spawn"]
+
+
+def _summary(seed):
+    participants = []
+    for pid in range(1, 11):
+        team_id = 100 if pid <= 5 else 200
+        participants.append({
+            "participantId": pid, "puuid": f"synthetic-{seed}-{pid}", "teamId": team_id,
+            "championName": CHAMPIONS[pid - 1], "teamPosition": ROLES[(pid - 1) % 5],
+            "riotIdGameName": f"{'BLU' if team_id == 100 else 'RED'} Player{pid}",
+        })
+    return {"participants": participants, "teams": [{"teamId": 100, "win": True}, {"teamId": 200, "win": False}]}
+
+
+def _anchor(pid, game_time_ms):
+    role = ROLES[(pid - 1) % 5]
+    if game_time_ms < 60000: return BLUE_BASE if pid <= 5 else RED_BASE
+    if role == "JUNGLE" and pid > 5: return RED_JUNGLE_ANCHOR
+    x, z = LANE_ANCHORS[role]
+    return (x, z) if pid <= 5 else (x + 400, z + 400)
+
+
+def _clamp(value):
+    return max(0, min(MAP_SIZE, value))
+
+
+def iter_livestats_events(minutes, ticks_per_second=4, seed=1):
+    """
+    Генерирует события livestats (словари) по возрастанию gameTime.
+    Одинаковые (minutes, ticks_per_second, seed) всегда дают одинаковую последовательность.
+    """
+    rng = random.Random(seed)
+    summary = _summary(seed)
+    puuids = {p["participantId"]: p["puuid"] for p in summary["participants"]}
+    step_ms = max(1, 1000 // ticks_per_second)
+    duration_ms = minutes * 60 * 1000
+
+    positions = {pid: list(_anchor(pid, 0)) for pid in range(1, 11)}
+    gold = {pid: 500 for pid in range(1, 11)}
+    next_ward = {pid: rng.randint(60000, 120000) for pid in range(1, 11)}
+    next_recall = {pid: rng.randint(180000, 300000) for pid in range(1, 11)}
+    next_camp = {2: 90000, 7: 90000}
+    camp_index = {2: 0, 7: 0}
+    next_dragon, next_grubs, next_baron = 300000, 360000, 1200000
+    next_herald, next_atakhan = 900000, 1260000  # по одному разу за игру
+    towers_left = list(TOWERS)
+    next_tower = 840000
+
+    for game_time in range(0, duration_ms, step_ms):
+        for pid in range(1, 11):
+            ax, az = _anchor(pid, game_time)
+            pos = positions[pid]
+            pos[0] = _clamp(pos[0] + (ax - pos[0]) // 20 + rng.randint(-60, 60))
+            pos[1] = _clamp(pos[1] + (az - pos[1]) // 20 + rng.randint(-60, 60))
+            gold[pid] += rng.randint(0, 6)
+
+        yield {
+            "rfc461Schema": "stats_update", "gameTime": game_time, "gameID": seed, "sequenceIndex": game_time // step_ms,
+            "participants": [
+                {
+                    "participantID": pid, "puuid": puuids[pid], "teamID": 100 if pid <= 5 else 200,
+                    "championName": CHAMPIONS[pid - 1], "level": min(18, 1 + game_time // 90000),
+                    "alive": True, "health": 1000, "healthMax": 1000, "currentGold": gold[pid] % 3000,
+                    "totalGold": gold[pid], "XP": game_time // 100,
+                    "position": {"x": positions[pid][0], "z": positions[pid][1]},
+                    "stats": [{"name": "MINIONS_KILLED", "value": game_time // 6000}, {"name": "VISION_SCORE", "value": game_time // 60000}],
+                }
+                for pid in range(1, 11)
+            ],
+        }
+
+        for pid in range(1, 11):
+            if game_time >= next_ward[pid]:
+                next_ward[pid] = game_time + rng.randint(45000, 120000)
+                yield {"rfc461Schema": "ward_placed", "gameTime": game_time, "placer": pid, "wardType": rng.choice(WARD_TYPES),
+                       "position": {"x": _clamp(positions[pid][0] + rng.randint(-500, 500)), "z": _clamp(positions[pid][1] + rng.randint(-500, 500))}}
+            if game_time >= next_recall[pid]:
+                next_recall[pid] = game_time + rng.randint(150000, 300000)
+                yield {"rfc461Schema": "channeling_started", "gameTime": game_time, "participantID": pid, "channelingType": "recall"}
+
+        for pid in (2, 7):
+            if game_time >= next_camp[pid]:
+                next_camp[pid] = game_time + rng.randint(20000, 45000)
+                camp = JUNGLE_CAMPS[camp_index[pid] % len(JUNGLE_CAMPS)]
+                camp_index[pid] += 1
+                yield {"rfc461Schema": "epic_monster_kill", "gameTime": game_time, "killer": pid, "killerTeamID": 100 if pid <= 5 else 200,
+                       "monsterType": camp, "position": {"x": positions[pid][0], "z": positions[pid][1]}}
+
+        if game_time >= next_dragon:
+            next_dragon = game_time + 300000
+            killer = rng.choice((2, 7))
+            yield {"rfc461Schema": "epic_monster_kill", "gameTime": game_time, "killer": killer, "killerTeamId": 100 if killer <= 5 else 200,
+                   "monsterType": "dragon", "dragonType": rng.choice(DRAGON_TYPES), "position": {"x": 9866, "z": 4414}}
+        if game_time >= next_grubs and game_time < 840000:
+            next_grubs = game_time + 240000
+            killer = rng.choice((2, 7))
+            for _ in range(3):
+                yield {"rfc461Schema": "epic_monster_kill", "gameTime": game_time, "killer": killer, "killerTeamId": 100 if killer <= 5 else 200,
+                       "monsterType": "VoidGrub", "position": {"x": 4950, "z": 10400}}
+        if game_time >= next_herald:
+            next_herald = duration_ms
+            killer = rng.choice((2, 7))
+            yield {"rfc461Schema": "epic_monster_kill", "gameTime": game_time, "killer": killer, "killerTeamId": 100 if killer <= 5 else 200,
+                   "monsterType": "riftHerald", "position": {"x": 5007, "z": 10471}}
+        if game_time >= next_atakhan:
+            next_atakhan = duration_ms
+            killer = rng.choice((2, 7))
+            yield {"rfc461Schema": "epic_monster_kill", "gameTime": game_time, "killer": killer, "killerTeamId": 100 if killer <= 5 else 200,
+                   "monsterType": "atakhan", "position": {"x": 5600, "z": 9300}}
+        if game_time >= next_baron:
+            next_baron = game_time + 360000
+            killer = rng.choice((2, 7))
+            yield {"rfc461Schema": "epic_monster_kill", "gameTime": game_time, "killer": killer, "killerTeamId": 100 if killer <= 5 else 200,
+                   "monsterType": "baron", "position": {"x": 5007, "z": 10471}}
+        if game_time >= next_tower and towers_left:
+            next_tower = game_time + rng.randint(60000, 150000)
+            lane, tier = towers_left.pop(0)
+            yield {"rfc461Schema": "building_destroyed", "gameTime": game_time, "buildingType": "turret", "lane": lane,
+                   "turretTier": tier, "teamID": rng.choice((100, 200)), "lastHitter": rng.randint(1, 10)}
+
+        if game_time % 2000 == 0:
+            yield {"rfc461Schema": rng.choice(NOISE_SCHEMAS), "gameTime": game_time, "participant": rng.randint(1, 10)}
+
+
+def generate_livestats(minutes, ticks_per_second=4, seed=1):
+    """Возвращает (NDJSON-строка livestats, summary с participants) для синтетической игры длиной minutes."""
+    content = "\n".join(json.dumps(event, separators=(",", ":")) for event in iter_livestats_events(minutes, ticks_per_second, seed))
+    return content, _summary(seed)
+
+
+def write_livestats(path, minutes, ticks_per_second=4, seed=1):
+    """Пишет NDJSON в path и summary в <path без расширения>.summary.json. Возвращает путь к summary."""
+    with open(path, "w", encoding="utf-8") as f:
+        for event in iter_livestats_events(minutes, ticks_per_second, seed):
+            f.write(json.dumps(event, separators=(",", ":")))
+            f.write("\n")
+    summary_path = os.path.splitext(path)[0] + ".summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(_summary(seed), f)
+    return summary_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic livestats NDJSON file.")
+    parser.add_argument("--minutes", type=int, default=35)
+    parser.add_argument("--ticks-per-second", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    summary_path = write_livestats(args.out, args.minutes, args.ticks_per_second, args.seed)
+    print(f"Wrote {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB) and {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ import os
 import sys
 from datetime import datetime, timezone
 
+from perf_tracing import connection_factory
+
 _basedir = os.path.abspath(os.path.dirname(__file__))
 DATABASE_PATH = os.path.join(_basedir, 'scrims_data.db')
 
@@ -66,31 +68,40 @@ MANUAL_DRAFTS_HEADER = [
 ] + manual_draft_action_headers + ["last_updated"]
 
 def get_db_connection():
-    """Создает и возвращает соединение с базой данных SQLite."""
+    """Создает и возвращает соединение с базой данных SQLite (внутри HTTP-запроса - с учетом SQL в perf_tracing)."""
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_PATH, timeout=10.0)
+        conn = sqlite3.connect(DATABASE_PATH, timeout=10.0, factory=connection_factory())
         conn.row_factory = sqlite3.Row
     except sqlite3.Error as e:
         print(f"Ошибка подключения к SQLite: {e}")
     return conn
 
 def create_table_from_header(cursor, table_name, header_list, primary_key_column="Game ID"):
-    """Вспомогательная функция для создания таблицы по списку заголовков."""
+    """
+    Вспомогательная функция для создания таблицы по списку заголовков.
+    primary_key_column может быть кортежем колонок - тогда создается составной ключ PRIMARY KEY (...).
+    """
     columns_sql = []
     header_copy = list(header_list)
-    pk_col_name_sql = primary_key_column.replace(" ", "_").replace(".", "").replace("-", "_")
+    composite_pk_sql = None
+
+    if isinstance(primary_key_column, tuple):
+        pk_cols_sql = [col.replace(" ", "_").replace(".", "").replace("-", "_") for col in primary_key_column]
+        composite_pk_sql = "PRIMARY KEY (" + ", ".join(f'"{col}"' for col in pk_cols_sql) + ")"
+    else:
+        pk_col_name_sql = primary_key_column.replace(" ", "_").replace(".", "").replace("-", "_")
 
-    pk_col_type = "INTEGER" if primary_key_column == "id" else "TEXT"
-    pk_sql = f'"{pk_col_name_sql}" {pk_col_type} PRIMARY KEY'
-    if pk_col_type == "INTEGER":
-        pk_sql += " AUTOINCREMENT"
-    columns_sql.append(pk_sql)
+        pk_col_type = "INTEGER" if primary_key_column == "id" else "TEXT"
+        pk_sql = f'"{pk_col_name_sql}" {pk_col_type} PRIMARY KEY'
+        if pk_col_type == "INTEGER":
+            pk_sql += " AUTOINCREMENT"
+        columns_sql.append(pk_sql)
 
-    try: header_copy.remove(primary_key_column)
-    except ValueError:
-         try: header_copy.remove(pk_col_name_sql)
-         except ValueError: print(f"Warning: Primary key '{primary_key_column}' or '{pk_col_name_sql}' not found in header for table '{table_name}'.")
+        try: header_copy.remove(primary_key_column)
+        except ValueError:
+             try: header_copy.remove(pk_col_name_sql)
+             except ValueError: print(f"Warning: Primary key '{primary_key_column}' or '{pk_col_name_sql}' not found in header for table '{table_name}'.")
 
     for header_name in header_copy:
         col_name_sql = header_name.replace(" ", "_").replace(".", "").replace("-", "_")
@@ -115,6 +126,8 @@ def create_table_from_header(cursor, table_name, header_list, primary_key_column
 
         columns_sql.append(f'"{col_name_sql}" {col_type}')
 
+    if composite_pk_sql:
+        columns_sql.append(composite_pk_sql)
     create_table_sql = f'CREATE TABLE IF NOT EXISTS "{table_name}" ({", ".join(columns_sql)});'
     try:
         cursor.execute(create_table_sql)
@@ -124,6 +137,39 @@ def create_table_from_header(cursor, table_name, header_list, primary_key_column
         print(f"Ошибка при создании таблицы '{table_name}': {e}")
         return False
 
+def migrate_soloq_games_primary_key(cursor):
+    """
+    Переводит старую soloq_games (ключ только Match_ID) на ключ (Match_ID, Player_Name).
+    Со старым ключом игра второго отслеживаемого игрока из того же матча молча отбрасывалась,
+    поэтому после переноса soloq_daily очищается (его пересобирает rebuild_soloq_daily при запуске),
+    а high-water mark аккаунтов сбрасывается, чтобы следующее обновление догрузило пропущенные игры.
+    """
+    cursor.execute("PRAGMA table_info(soloq_games)")
+    pk_columns = [row[1] for row in cursor.fetchall() if row[5]]
+    if pk_columns != ["Match_ID"]: return False
+
+    columns_string = ", ".join(f'"{hdr.replace(" ", "_").replace(".", "").replace("-", "_")}"' for hdr in SOLOQ_GAMES_HEADER)
+    # DDL вне транзакции sqlite3 выполняет сразу, поэтому перенос целиком идет в savepoint
+    cursor.execute("SAVEPOINT soloq_games_pk")
+    try:
+        cursor.execute("ALTER TABLE soloq_games RENAME TO soloq_games_old")
+        cursor.execute("DROP INDEX IF EXISTS idx_soloq_games_player_ts")
+        create_table_from_header(cursor, "soloq_games", SOLOQ_GAMES_HEADER, primary_key_column=("Match_ID", "Player_Name"))
+        cursor.execute(f"INSERT OR IGNORE INTO soloq_games ({columns_string}) SELECT {columns_string} FROM soloq_games_old")
+        cursor.execute("DROP TABLE soloq_games_old")
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('soloq_daily', 'soloq_account_sync')")
+        existing_tables = {row[0] for row in cursor.fetchall()}
+        if "soloq_daily" in existing_tables: cursor.execute("DELETE FROM soloq_daily")
+        if "soloq_account_sync" in existing_tables: cursor.execute("UPDATE soloq_account_sync SET last_seen_ts = NULL")
+        cursor.execute("RELEASE soloq_games_pk")
+        print("Таблица 'soloq_games' перенесена на ключ (Match_ID, Player_Name).")
+        return True
+    except sqlite3.Error as e:
+        cursor.execute("ROLLBACK TO soloq_games_pk")
+        cursor.execute("RELEASE soloq_games_pk")
+        print(f"Ошибка при переносе 'soloq_games' на составной ключ: {e}")
+        return False
+
 def init_db():
     """Инициализирует базу данных: создает таблицы, если они не существуют."""
     conn = get_db_connection()
@@ -141,7 +187,152 @@ def init_db():
         create_table_from_header(cursor, "tournament_games", TOURNAMENT_GAMES_HEADER, primary_key_column="Game ID")
         
         print("Проверка/создание таблицы soloq_games...")
-        create_table_from_header(cursor, "soloq_games", SOLOQ_GAMES_HEADER, primary_key_column="Match_ID")
+        # Ключ (Match_ID, Player_Name): в одной игре могут оказаться несколько отслеживаемых игроков
+        if create_table_from_header(cursor, "soloq_games", SOLOQ_GAMES_HEADER, primary_key_column=("Match_ID", "Player_Name")):
+            migrate_soloq_games_primary_key(cursor)
+            try:
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_soloq_games_player_ts ON soloq_games (Player_Name, Timestamp);')
+                print("Индекс для 'soloq_games' (Player_Name, Timestamp) успешно проверен/создан.")
+            except sqlite3.Error as e:
+                print(f"Ошибка при создании индекса для 'soloq_games': {e}")
+
+        # Составы для отслеживания SoloQ (несколько команд, аккаунты в разных регионах)
+        print("Проверка/создание таблиц soloq_players и soloq_accounts...")
+        create_soloq_players_sql = """
+        CREATE TABLE IF NOT EXISTS soloq_players (
+            player_name TEXT PRIMARY KEY,     -- совпадает с soloq_games.Player_Name
+            team_name TEXT NOT NULL,
+            role TEXT                         -- основная роль (TOP/JUNGLE/MIDDLE/BOTTOM/UTILITY)
+        );
+        """
+        create_soloq_accounts_sql = """
+        CREATE TABLE IF NOT EXISTS soloq_accounts (
+            game_name TEXT NOT NULL COLLATE NOCASE,
+            tag_line TEXT NOT NULL COLLATE NOCASE,
+            player_name TEXT NOT NULL,
+            region TEXT NOT NULL DEFAULT 'europe', -- regional routing value: americas/asia/europe/sea
+            last_refresh_ts INTEGER,          -- Unix timestamp последнего обновления (для round-robin)
+            PRIMARY KEY (game_name, tag_line)
+        );
+        """
+        try:
+            cursor.execute(create_soloq_players_sql)
+            cursor.execute(create_soloq_accounts_sql)
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_soloq_accounts_player ON soloq_accounts (player_name);')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_soloq_accounts_region_refresh ON soloq_accounts (region, last_refresh_ts);')
+            print("Таблицы 'soloq_players' и 'soloq_accounts' успешно проверены/созданы.")
+        except sqlite3.Error as e:
+            print(f"Ошибка при создании таблиц составов SoloQ: {e}")
+
+        # Курсоры инкрементальной загрузки серий GRID (high-water mark по startTimeScheduled)
+        print("Проверка/создание таблиц ingest_cursors, ingested_series и series_ingest_failures...")
+        create_ingest_cursors_sql = """
+        CREATE TABLE IF NOT EXISTS ingest_cursors (
+            source TEXT PRIMARY KEY,          -- 'scrims', ...
+            last_start_time TEXT,             -- ISO 8601 UTC, самая новая полностью обработанная серия
+            updated_at INTEGER
+        );
+        """
+        create_ingested_series_sql = """
+        CREATE TABLE IF NOT EXISTS ingested_series (
+            source TEXT NOT NULL,
+            series_id TEXT NOT NULL,
+            start_time TEXT,
+            ingested_at INTEGER,
+            PRIMARY KEY (source, series_id)
+        );
+        """
+        # Неудачные попытки по сериям (игр нет или загрузка падает): после лимита серия перестает держать курсор
+        create_series_ingest_failures_sql = """
+        CREATE TABLE IF NOT EXISTS series_ingest_failures (
+            source TEXT NOT NULL,
+            series_id TEXT NOT NULL,
+            start_time TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_attempt_at INTEGER,
+            PRIMARY KEY (source, series_id)
+        );
+        """
+        try:
+            cursor.execute(create_ingest_cursors_sql)
+            cursor.execute(create_ingested_series_sql)
+            cursor.execute(create_series_ingest_failures_sql)
+            print("Таблицы 'ingest_cursors', 'ingested_series' и 'series_ingest_failures' успешно проверены/созданы.")
+        except sqlite3.Error as e:
+            print(f"Ошибка при создании таблиц курсоров загрузки: {e}")
+
+        # Условные HTTP-запросы к GRID API: валидаторы и тело последнего ответа
+        print("Проверка/создание таблицы http_cache...")
+        create_http_cache_sql = """
+        CREATE TABLE IF NOT EXISTS http_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body BLOB,
+            fetched_at INTEGER
+        );
+        """
+        try:
+            cursor.execute(create_http_cache_sql)
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_http_cache_fetched_at ON http_cache (fetched_at);')
+            print("Таблица 'http_cache' успешно проверена/создана.")
+        except sqlite3.Error as e:
+            print(f"Ошибка при создании таблицы 'http_cache': {e}")
+
+        # Кэш Riot ID -> PUUID (PUUID аккаунта не меняется, Riot ID может смениться - поэтому TTL)
+        print("Проверка/создание таблицы riot_accounts...")
+        create_riot_accounts_sql = """
+        CREATE TABLE IF NOT EXISTS riot_accounts (
+            game_name TEXT NOT NULL COLLATE NOCASE,
+            tag_line TEXT NOT NULL COLLATE NOCASE,
+            puuid TEXT NOT NULL,
+            fetched_at INTEGER NOT NULL,      -- Unix timestamp (секунды) получения PUUID
+            PRIMARY KEY (game_name, tag_line)
+        );
+        """
+        try:
+            cursor.execute(create_riot_accounts_sql)
+            print("Таблица 'riot_accounts' успешно проверена/создана.")
+        except sqlite3.Error as e:
+            print(f"Ошибка при создании таблицы 'riot_accounts': {e}")
+
+        # Состояние загрузки SoloQ истории по аккаунтам (high-water mark по времени создания игры)
+        print("Проверка/создание таблицы soloq_account_sync...")
+        create_soloq_sync_sql = """
+        CREATE TABLE IF NOT EXISTS soloq_account_sync (
+            puuid TEXT PRIMARY KEY,
+            player_name TEXT,
+            last_seen_ts INTEGER,             -- история загружена без пропусков до этого момента (Unix, секунды)
+            last_refresh_ts INTEGER
+        );
+        """
+        try:
+            cursor.execute(create_soloq_sync_sql)
+            print("Таблица 'soloq_account_sync' успешно проверена/создана.")
+        except sqlite3.Error as e:
+            print(f"Ошибка при создании таблицы 'soloq_account_sync': {e}")
+
+        # Дневной rollup SoloQ (ведется при вставке в soloq_games): графики и статистика без полного скана
+        print("Проверка/создание таблицы soloq_daily...")
+        create_soloq_daily_sql = """
+        CREATE TABLE IF NOT EXISTS soloq_daily (
+            player TEXT NOT NULL,
+            day TEXT NOT NULL,                -- 'YYYY-MM-DD' (UTC)
+            champion TEXT NOT NULL,
+            role TEXT NOT NULL,
+            games INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            kills INTEGER NOT NULL DEFAULT 0,
+            deaths INTEGER NOT NULL DEFAULT 0,
+            assists INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (player, day, champion, role)
+        );
+        """
+        try:
+            cursor.execute(create_soloq_daily_sql)
+            print("Таблица 'soloq_daily' успешно проверена/создана.")
+        except sqlite3.Error as e:
+            print(f"Ошибка при создании таблицы 'soloq_daily': {e}")
 
         print("Проверка/создание таблицы manual_drafts...")
         if create_table_from_header(cursor, "manual_drafts", MANUAL_DRAFTS_HEADER, primary_key_column="id"):
@@ -180,6 +371,25 @@ def init_db():
         except sqlite3.Error as e:
              print(f"Ошибка при создании таблицы/индексов 'jungle_pathing': {e}")
 
+        # Полный путь лесника за игру в компактной кодировке (см. encode_jungle_path в tournament_logic)
+        print("Проверка/создание таблицы jungle_pathing_full...")
+        create_pathing_full_sql = """
+        CREATE TABLE IF NOT EXISTS jungle_pathing_full (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            game_id TEXT NOT NULL,
+            player_puuid TEXT NOT NULL,
+            path_blob BLOB NOT NULL,          -- записи по 3 байта: код действия (uint8) + секунды (uint16)
+            last_updated TEXT NOT NULL
+        );
+        """
+        create_pathing_full_unique_sql = "CREATE UNIQUE INDEX IF NOT EXISTS idx_jungle_pathing_full_game_player ON jungle_pathing_full (game_id, player_puuid);"
+        try:
+            cursor.execute(create_pathing_full_sql)
+            cursor.execute(create_pathing_full_unique_sql)
+            print("Таблица 'jungle_pathing_full' и индексы успешно проверены/созданы.")
+        except sqlite3.Error as e:
+             print(f"Ошибка при создании таблицы/индексов 'jungle_pathing_full': {e}")
+
         print("Проверка/создание таблицы player_positions_snapshots...")
         create_positions_sql = """
         CREATE TABLE IF NOT EXISTS player_positions_snapshots (
@@ -199,6 +409,24 @@ def init_db():
         except sqlite3.Error as e:
             print(f"Ошибка при создании таблицы/индексов 'player_positions_snapshots': {e}")
 
+        # Предрассчитанные треки реплея разного разрешения (1 c / 5 c / 30 c), бинарный формат replay_encoding
+        print("Проверка/создание таблицы replay_lod_tracks...")
+        create_replay_lod_sql = """
+        CREATE TABLE IF NOT EXISTS replay_lod_tracks (
+            game_id TEXT NOT NULL,
+            tick_ms INTEGER NOT NULL,
+            start_ms INTEGER NOT NULL,
+            frame_count INTEGER NOT NULL,
+            payload BLOB NOT NULL,
+            last_updated TEXT NOT NULL,
+            PRIMARY KEY (game_id, tick_ms)
+        );"""
+        try:
+            cursor.execute(create_replay_lod_sql)
+            print("Таблица 'replay_lod_tracks' успешно проверена/создана.")
+        except sqlite3.Error as e:
+            print(f"Ошибка при создании таблицы 'replay_lod_tracks': {e}")
+
         print("Проверка/создание таблицы first_wards_data...")
         create_first_wards_sql = """
         CREATE TABLE IF NOT EXISTS first_wards_data (
@@ -276,6 +504,52 @@ def init_db():
             print("Таблица 'player_positions_timeline' и индексы успешно проверены/созданы.")
         except sqlite3.Error as e:
             print(f"Ошибка при создании таблицы/индексов 'player_positions_timeline': {e}")
+
+        # Каноническое компактное хранилище позиций скримов: метаданные игры и участников один раз,
+        # тики - только целые числа. Заменяет запись в player_positions_timeline + player_positions_snapshots.
+        print("Проверка/создание таблиц position_games, position_participants, position_ticks...")
+        create_position_games_sql = """
+        CREATE TABLE IF NOT EXISTS position_games (
+            game_key INTEGER PRIMARY KEY,
+            game_id TEXT NOT NULL UNIQUE,
+            last_updated TEXT NOT NULL
+        );"""
+        create_position_participants_sql = """
+        CREATE TABLE IF NOT EXISTS position_participants (
+            game_key INTEGER NOT NULL,
+            participant_id INTEGER NOT NULL,
+            player_puuid TEXT,
+            champion_name TEXT,
+            team_id INTEGER,
+            PRIMARY KEY (game_key, participant_id)
+        ) WITHOUT ROWID;"""
+        create_position_ticks_sql = """
+        CREATE TABLE IF NOT EXISTS position_ticks (
+            game_key INTEGER NOT NULL,
+            timestamp_ms INTEGER NOT NULL,
+            participant_id INTEGER NOT NULL,
+            pos_x INTEGER NOT NULL,
+            pos_z INTEGER NOT NULL,
+            PRIMARY KEY (game_key, timestamp_ms, participant_id)
+        ) WITHOUT ROWID;"""
+        # Единое представление для proximity / swap / start positions: старая таблица + компактное хранилище
+        create_positions_all_view_sql = """
+        CREATE VIEW IF NOT EXISTS player_positions_all AS
+            SELECT game_id, timestamp_ms, participant_id, player_puuid, pos_x, pos_z
+            FROM player_positions_timeline
+            UNION ALL
+            SELECT g.game_id, t.timestamp_ms, t.participant_id, p.player_puuid, t.pos_x, t.pos_z
+            FROM position_ticks t
+            JOIN position_games g ON g.game_key = t.game_key
+            LEFT JOIN position_participants p ON p.game_key = t.game_key AND p.participant_id = t.participant_id;"""
+        try:
+            cursor.execute(create_position_games_sql)
+            cursor.execute(create_position_participants_sql)
+            cursor.execute(create_position_ticks_sql)
+            cursor.execute(create_positions_all_view_sql)
+            print("Таблицы 'position_games', 'position_participants', 'position_ticks' и представление 'player_positions_all' успешно проверены/созданы.")
+        except sqlite3.Error as e:
+            print(f"Ошибка при создании компактного хранилища позиций: {e}")
             
 # <<< ОБНОВЛЕННАЯ ТАБЛИЦА ДЛЯ МИНИ-ПЛЕЕРА (СОБЫТИЯ И ОБЪЕКТЫ) >>>
         print("Проверка/создание таблицы objective_events...")
@@ -307,6 +581,79 @@ def init_db():
         except sqlite3.Error as e:
             print(f"Ошибка при создании objective_events: {e}")
 
+        # Драфт турнирной игры, разложенный по действиям (заполняется при загрузке игры)
+        print("Проверка/создание таблицы draft_actions...")
+        create_draft_actions_sql = """
+        CREATE TABLE IF NOT EXISTS draft_actions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            game_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,             -- 1..20, порядок действия в драфте
+            side TEXT NOT NULL,               -- 'Blue' / 'Red' (по номеру действия)
+            type TEXT NOT NULL,               -- 'ban' / 'pick'
+            team_id TEXT,                     -- ID команды-драфтера из GRID
+            champion_id TEXT,
+            champion_name TEXT,
+            phase TEXT,                       -- 'Ban1', 'Ban2', 'B1', 'B2-3', 'R1-2', ...
+            role TEXT                         -- роль пика ('TOP', 'JUNGLE', ...), для банов NULL
+        );
+        """
+        create_draft_actions_unique_sql = "CREATE UNIQUE INDEX IF NOT EXISTS idx_draft_actions_game_seq ON draft_actions (game_id, seq);"
+        create_draft_actions_side_index_sql = "CREATE INDEX IF NOT EXISTS idx_draft_actions_side_type_phase ON draft_actions (side, type, phase);"
+        try:
+            cursor.execute(create_draft_actions_sql)
+            cursor.execute(create_draft_actions_unique_sql)
+            cursor.execute(create_draft_actions_side_index_sql)
+            print("Таблица 'draft_actions' и индексы успешно проверены/созданы.")
+        except sqlite3.Error as e:
+            print(f"Ошибка при создании таблицы/индексов 'draft_actions': {e}")
+
+        # Накопительные агрегаты для общего обзора турнира (обновляются при сохранении каждой игры)
+        print("Проверка/создание таблиц агрегатов турнира...")
+        create_agg_champion_sql = """
+        CREATE TABLE IF NOT EXISTS tournament_agg_champions (
+            champion TEXT NOT NULL,
+            role TEXT NOT NULL,
+            side TEXT NOT NULL,
+            picks INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (champion, role, side)
+        );
+        """
+        create_agg_bans_sql = """
+        CREATE TABLE IF NOT EXISTS tournament_agg_bans (
+            champion_id TEXT NOT NULL,
+            side TEXT NOT NULL,
+            bans INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (champion_id, side)
+        );
+        """
+        create_agg_duos_sql = """
+        CREATE TABLE IF NOT EXISTS tournament_agg_duos (
+            duo_title TEXT NOT NULL,          -- 'TOP-JUNGLE', 'JUNGLE-MID', 'ADC-SUPPORT'
+            side TEXT NOT NULL,
+            champ1 TEXT NOT NULL,             -- чемпион первой роли пары
+            champ2 TEXT NOT NULL,             -- чемпион второй роли пары
+            games INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (duo_title, side, champ1, champ2)
+        );
+        """
+        create_agg_sides_sql = """
+        CREATE TABLE IF NOT EXISTS tournament_agg_sides (
+            side TEXT PRIMARY KEY,
+            games INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0
+        );
+        """
+        try:
+            cursor.execute(create_agg_champion_sql)
+            cursor.execute(create_agg_bans_sql)
+            cursor.execute(create_agg_duos_sql)
+            cursor.execute(create_agg_sides_sql)
+            print("Таблицы агрегатов турнира успешно проверены/созданы.")
+        except sqlite3.Error as e:
+            print(f"Ошибка при создании таблиц агрегатов турнира: {e}")
+
         conn.commit()
     except sqlite3.Error as e:
         print(f"Ошибка при инициализации БД: {e}")
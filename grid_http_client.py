@@ -0,0 +1,151 @@
+# grid_http_client.py
+# Общий HTTP-клиент для GRID API: keep-alive пул соединений, сжатие ответов,
+# условные запросы (ETag / Last-Modified) и таймауты по типу endpoint
+
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from database import get_db_connection
+from log_utils import log_message
+from retry_policy import cap_timeout_to_deadline
+
+# urllib3 распаковывает br только при установленном brotli/brotlicffi - иначе br не запрашиваем
+try:
+    import brotli  # noqa: F401
+    BROTLI_AVAILABLE = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        BROTLI_AVAILABLE = True
+    except ImportError:
+        BROTLI_AVAILABLE = False
+
+ACCEPT_ENCODING = "gzip, deflate, br" if BROTLI_AVAILABLE else "gzip, deflate"
+
+DEFAULT_TIMEOUT = (5, 15)  # (connect, read) секунд
+# (префикс endpoint, таймаут (connect, read), условные запросы с сохранением тела в http_cache)
+ENDPOINT_SETTINGS = [
+    ("file-download/events/", (5, 60), False),  # LiveStats .jsonl - большие файлы, тело не храним
+    ("file-download/end-state/", (5, 20), True),
+    ("central-data/graphql", (5, 20), False),
+    ("live-data-feed/series-state/graphql", (5, 20), False),
+]
+HTTP_CACHE_MAX_BODY_BYTES = 5 * 1024 * 1024
+# End-state скачивается только для новых игр, повторные запросы редки - кэш держим небольшим
+HTTP_CACHE_MAX_AGE_SECONDS = 7 * 24 * 3600
+HTTP_CACHE_MAX_TOTAL_BYTES = 100 * 1024 * 1024
+HTTP_POOL_MAXSIZE = 16
+
+
+def get_endpoint_settings(endpoint):
+    """(timeout, conditional) для endpoint по первому подходящему префиксу."""
+    for prefix, timeout, conditional in ENDPOINT_SETTINGS:
+        if endpoint.startswith(prefix):
+            return timeout, conditional
+    return DEFAULT_TIMEOUT, False
+
+
+# --- Хранилище валидаторов (таблица http_cache) ---
+def load_cached_response(url):
+    conn = get_db_connection()
+    if not conn: return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT etag, last_modified, body FROM http_cache WHERE url = ?", (url,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    except sqlite3.Error as e:
+        log_message(f"[HTTP] Error reading http_cache for {url}: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def save_cached_response(url, etag, last_modified, body):
+    conn = get_db_connection()
+    if not conn: return
+    try:
+        conn.execute("INSERT OR REPLACE INTO http_cache (url, etag, last_modified, body, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                     (url, etag, last_modified, sqlite3.Binary(body), int(time.time())))
+        prune_http_cache(conn)
+        conn.commit()
+    except sqlite3.Error as e:
+        log_message(f"[HTTP] Error saving http_cache for {url}: {e}")
+    finally:
+        conn.close()
+
+
+def prune_http_cache(conn, max_age_seconds=HTTP_CACHE_MAX_AGE_SECONDS, max_total_bytes=HTTP_CACHE_MAX_TOTAL_BYTES):
+    """Удаляет записи старше max_age_seconds, затем самые старые, пока тела не уложатся в max_total_bytes."""
+    conn.execute("DELETE FROM http_cache WHERE fetched_at < ?", (int(time.time()) - max_age_seconds,))
+    conn.execute("""
+        DELETE FROM http_cache WHERE url IN (
+            SELECT url FROM (
+                SELECT url, SUM(COALESCE(length(body), 0)) OVER (ORDER BY fetched_at DESC, url) AS total_bytes
+                FROM http_cache
+            ) WHERE total_bytes > ?
+        )
+    """, (max_total_bytes,))
+
+
+class GridHttpClient:
+    """
+    HTTP-клиент с отдельной requests.Session на поток (Session не потокобезопасна),
+    поэтому соединения с api.grid.gg переиспользуются, а не открываются на каждый запрос.
+    """
+
+    def __init__(self, pool_maxsize=HTTP_POOL_MAXSIZE):
+        self.pool_maxsize = pool_maxsize
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+            self._local.session = session
+        return session
+
+    def get(self, url, endpoint="", headers=None, use_validators=True):
+        """
+        GET с таймаутом по endpoint. Для условных endpoint отправляет If-None-Match/If-Modified-Since;
+        на 304 возвращает ответ с сохраненным телом (status_code 200, response.from_cache = True).
+        """
+        timeout, conditional = get_endpoint_settings(endpoint)
+        timeout = cap_timeout_to_deadline(timeout)
+        request_headers = dict(headers or {})
+        cached = load_cached_response(url) if conditional and use_validators else None
+        if cached:
+            if cached['etag']: request_headers["If-None-Match"] = cached['etag']
+            if cached['last_modified']: request_headers["If-Modified-Since"] = cached['last_modified']
+
+        response = self.session.get(url, headers=request_headers, timeout=timeout)
+        response.from_cache = False
+        if response.status_code == 304:
+            if cached and cached['body'] is not None:
+                response.status_code = 200
+                response._content = bytes(cached['body'])
+                response.from_cache = True
+                return response
+            # Валидатор без тела - повторяем без условий
+            return self.get(url, endpoint, headers, use_validators=False) if cached else response
+
+        if conditional and response.status_code == 200:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if (etag or last_modified) and len(response.content) <= HTTP_CACHE_MAX_BODY_BYTES:
+                save_cached_response(url, etag, last_modified, response.content)
+        return response
+
+    def post(self, url, endpoint="", headers=None, data=None):
+        timeout, _ = get_endpoint_settings(endpoint)
+        timeout = cap_timeout_to_deadline(timeout)
+        return self.session.post(url, headers=headers, data=data, timeout=timeout)
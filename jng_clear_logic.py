@@ -7,13 +7,40 @@ import math
 
 # Импорты из существующих модулей вашего проекта
 from database import get_db_connection
-from scrims_logic import log_message, get_champion_icon_html, get_champion_data
-from tournament_logic import TEAM_TAG_TO_FULL_NAME, UNKNOWN_BLUE_TAG, UNKNOWN_RED_TAG
-
-def get_jng_clear_data(selected_team_full_name, selected_champion):
+from perf_tracing import traced
+from log_utils import log_message
+from scrims_logic import get_champion_icon_html, get_champion_data
+from tournament_logic import TEAM_TAG_TO_FULL_NAME, UNKNOWN_BLUE_TAG, UNKNOWN_RED_TAG, JUNGLE_CAMP_ACTIONS, decode_jungle_path
+
+MAX_CLEAR_NUMBER = 3
+
+def is_camp_action(action_obj):
+    """Только лесные кэмпы: ганки, возвраты и объекты (драконы, Барон, личинки и т.д.) не считаются."""
+    return isinstance(action_obj, dict) and 'time' in action_obj and action_obj.get('action') in JUNGLE_CAMP_ACTIONS
+
+def clear_slot_label(slot_index):
+    """Порядковый номер кэмпа в зачистке: 0 -> '1st', 1 -> '2nd', 10 -> '11th'."""
+    number = slot_index + 1
+    suffix = "th" if 10 <= number % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(number % 10, "th")
+    return f"{number}{suffix}"
+
+def get_nth_clear(path_sequence, clear_number):
+    """Кэмпы n-й зачистки полного пути: зачистки разделяются возвратами на базу (Recall)."""
+    clears, current_clear = [], []
+    for action_obj in path_sequence:
+        if is_camp_action(action_obj):
+            current_clear.append(action_obj)
+        elif action_obj.get('action') == 'Recall' and current_clear:
+            clears.append(current_clear); current_clear = []
+    if current_clear: clears.append(current_clear)
+    return clears[clear_number - 1] if len(clears) >= clear_number else []
+
+@traced()
+def get_jng_clear_data(selected_team_full_name, selected_champion, clear_number=1):
     """
     Извлекает и агрегирует данные о зачистке леса для страницы JNG Clear.
     Версия 2.3: Финальное исправление ошибки инициализации.
+    clear_number > 1 берет 2-ю/3-ю зачистку из полного пути (jungle_pathing_full).
     """
     conn = get_db_connection()
     if not conn:
@@ -27,16 +54,12 @@ def get_jng_clear_data(selected_team_full_name, selected_champion):
         "blue_side": {
             "total_games": 0,
             "champions": defaultdict(lambda: {'games': 0, 'wins': 0}),
-            "clears": [defaultdict(list) for _ in range(7)],
-            "deltas": [[] for _ in range(6)],
-            "overall_camp_times": [[] for _ in range(7)]
+            "clears": [], "deltas": [], "overall_camp_times": []  # слоты добавляются по самой длинной зачистке
         },
         "red_side": {
             "total_games": 0,
             "champions": defaultdict(lambda: {'games': 0, 'wins': 0}),
-            "clears": [defaultdict(list) for _ in range(7)],
-            "deltas": [[] for _ in range(6)],
-            "overall_camp_times": [[] for _ in range(7)]
+            "clears": [], "deltas": [], "overall_camp_times": []  # слоты добавляются по самой длинной зачистке
         }
     }
     available_champions = ["All"]
@@ -84,9 +107,18 @@ def get_jng_clear_data(selected_team_full_name, selected_champion):
             stats["message"] = "No games found for the selected team."; return all_teams_display, stats, available_champions
 
         game_ids = [game["Game_ID"] for game in game_rows]
-        paths_query = f"SELECT game_id, player_puuid, path_sequence FROM jungle_pathing WHERE game_id IN ({','.join(['?']*len(game_ids))})"
-        cursor.execute(paths_query, game_ids)
-        paths_data = {(row['game_id'], row['player_puuid']): json.loads(row['path_sequence']) for row in cursor.fetchall()}
+        if clear_number > 1:
+            paths_query = f"SELECT game_id, player_puuid, path_blob FROM jungle_pathing_full WHERE game_id IN ({','.join(['?']*len(game_ids))})"
+            cursor.execute(paths_query, game_ids)
+            paths_data = {(row['game_id'], row['player_puuid']): decode_jungle_path(row['path_blob']) for row in cursor.fetchall()}
+            if not paths_data:
+                stats["message"] = ("Full-game jungle paths have not been collected for this team's games yet, "
+                                    "so only the first clear is available. Use \"Backfill Full Paths\" to download them.")
+                return all_teams_display, stats, available_champions
+        else:
+            paths_query = f"SELECT game_id, player_puuid, path_sequence FROM jungle_pathing WHERE game_id IN ({','.join(['?']*len(game_ids))})"
+            cursor.execute(paths_query, game_ids)
+            paths_data = {(row['game_id'], row['player_puuid']): json.loads(row['path_sequence']) for row in cursor.fetchall()}
 
         # 5. Обрабатываем каждую игру
         for game in game_rows:
@@ -106,16 +138,23 @@ def get_jng_clear_data(selected_team_full_name, selected_champion):
             
             path_sequence = paths_data.get((game['Game_ID'], jungler_puuid))
             if path_sequence:
-                camp_clears = [a for a in path_sequence if isinstance(a, dict) and 'action' in a and 'time' in a and not a['action'].startswith('Gank') and a['action'] != 'Recall']
+                if clear_number > 1: camp_clears = get_nth_clear(path_sequence, clear_number)
+                else: camp_clears = [a for a in path_sequence if is_camp_action(a)]
                 
-                for i in range(min(7, len(camp_clears))):
-                    camp_name, clear_time = camp_clears[i]['action'], camp_clears[i]['time']
-                    stats[side_key]["clears"][i][camp_name].append(clear_time)
-                    stats[side_key]["overall_camp_times"][i].append(clear_time)
+                side_stats = stats[side_key]
+                while len(side_stats["clears"]) < len(camp_clears):
+                    side_stats["clears"].append(defaultdict(list)); side_stats["overall_camp_times"].append([])
+                while len(side_stats["deltas"]) < len(camp_clears) - 1:
+                    side_stats["deltas"].append([])
+
+                for i, camp_action in enumerate(camp_clears):
+                    camp_name, clear_time = camp_action['action'], camp_action['time']
+                    side_stats["clears"][i][camp_name].append(clear_time)
+                    side_stats["overall_camp_times"][i].append(clear_time)
                 
-                for i in range(min(6, len(camp_clears) - 1)):
+                for i in range(len(camp_clears) - 1):
                     delta = camp_clears[i+1]['time'] - camp_clears[i]['time']
-                    if delta > 0: stats[side_key]["deltas"][i].append(delta)
+                    if delta > 0: side_stats["deltas"][i].append(delta)
 
     except Exception as e:
         import traceback
@@ -149,8 +188,7 @@ def get_jng_clear_data(selected_team_full_name, selected_champion):
         clear_details = []
         all_camp_names = sorted(list(set(camp for slot in side_data["clears"] for camp in slot.keys())))
         
-        for i in range(7):
-            camp_slot_data = side_data["clears"][i]
+        for camp_slot_data in side_data["clears"]:
             total_in_slot = sum(len(times) for times in camp_slot_data.values())
             slot_stats = {}
             if total_in_slot > 0:
@@ -169,7 +207,8 @@ def get_jng_clear_data(selected_team_full_name, selected_champion):
 
         return {
             "champions": formatted_champions, "overall_timers": overall_timers, "overall_deltas": overall_deltas,
-            "clear_details": clear_details, "all_camp_names": all_camp_names
+            "clear_details": clear_details, "all_camp_names": all_camp_names,
+            "slot_labels": [clear_slot_label(i) for i in range(len(clear_details))]
         }
 
     stats["blue_side"] = format_side_stats(stats["blue_side"])
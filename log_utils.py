@@ -0,0 +1,10 @@
+# log_utils.py
+# Общий log_message без зависимостей от остальных модулей: его импортируют и логика, и вспомогательные модули
+# (кэш, HTTP-клиент, ретраи, пайплайн, трассировка), не создавая циклических импортов со scrims_logic.
+
+from datetime import datetime, timezone
+
+
+def log_message(message):
+    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+    print(f"{timestamp} :: {message}")
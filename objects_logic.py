@@ -6,65 +6,42 @@ import statistics
 import traceback
 
 from database import get_db_connection
-from scrims_logic import log_message
+from perf_tracing import traced
+from log_utils import log_message
 from tournament_logic import TEAM_TAG_TO_FULL_NAME, UNKNOWN_BLUE_TAG, UNKNOWN_RED_TAG
 
+@traced()
 def get_objects_data(selected_team_full_name):
     """
     Извлекает и агрегирует данные по всем игровым объектам для выбранной команды.
-    Версия 2.1: Исправлена логика для Atakhan.
+    Версия 3.0: все объекты и все три среза (overall / blue / red) считаются за один проход по играм.
     """
     conn = get_db_connection()
     if not conn:
         return [], {"error": "Database connection failed"}
 
     all_teams_display = []
-    stats = {
-        "error": None, "message": None,
-        "selected_team_name": selected_team_full_name,
-        "overall": {}, "blue_side": {}, "red_side": {}
-    }
+    stats = _empty_team_stats(selected_team_full_name)
 
     try:
         cursor = conn.cursor()
-
-        cursor.execute(f"""
-            SELECT DISTINCT Blue_Team_Name as team_tag FROM tournament_games
-            WHERE Blue_Team_Name NOT IN ('{UNKNOWN_BLUE_TAG}', 'Blue Team')
-            UNION
-            SELECT DISTINCT Red_Team_Name as team_tag FROM tournament_games
-            WHERE Red_Team_Name NOT IN ('{UNKNOWN_RED_TAG}', 'Red Team')
-        """)
-        all_teams_tags = {row['team_tag'] for row in cursor.fetchall() if row['team_tag']}
+        all_teams_tags = _get_all_team_tags(cursor)
         all_teams_display = sorted(list(set([TEAM_TAG_TO_FULL_NAME.get(tag, tag) for tag in all_teams_tags])))
 
         if not selected_team_full_name:
             stats["message"] = "Please select a team to view object statistics."
             return all_teams_display, stats
 
-        selected_team_tag = None
-        for tag, full_name in TEAM_TAG_TO_FULL_NAME.items():
-            if full_name == selected_team_full_name: selected_team_tag = tag; break
-        if not selected_team_tag and selected_team_full_name in all_teams_tags:
-            selected_team_tag = selected_team_full_name
+        selected_team_tag = _resolve_team_tag(selected_team_full_name, all_teams_tags)
         if not selected_team_tag:
             stats["error"] = f"Team tag not found for '{selected_team_full_name}'."; return all_teams_display, stats
 
-        cursor.execute("SELECT * FROM tournament_games WHERE Blue_Team_Name = ? OR Red_Team_Name = ?", (selected_team_tag, selected_team_tag))
-        games = [dict(row) for row in cursor.fetchall()]
-        
+        games, events_index = _load_games_and_events(cursor, [selected_team_tag])
         if not games:
             stats["message"] = "No games found for the selected team."
             return all_teams_display, stats
-            
-        game_ids = [game["Game_ID"] for game in games]
-        placeholders = ','.join(['?'] * len(game_ids))
-        cursor.execute(f"SELECT * FROM objective_events WHERE game_id IN ({placeholders}) ORDER BY timestamp_ms ASC", game_ids)
-        events = [dict(row) for row in cursor.fetchall()]
 
-        _process_side_data(games, events, selected_team_tag, "overall", stats["overall"])
-        _process_side_data(games, events, selected_team_tag, "blue", stats["blue_side"])
-        _process_side_data(games, events, selected_team_tag, "red", stats["red_side"])
+        stats.update(compute_objects_stats(games, events_index, [selected_team_tag])[selected_team_tag])
 
     except Exception as e:
         log_message(f"CRITICAL Error in get_objects_data: {e}\n{traceback.format_exc()}")
@@ -74,296 +51,363 @@ def get_objects_data(selected_team_full_name):
 
     return all_teams_display, stats
 
-def _process_side_data(all_games, all_events, team_tag, side_filter, output_stats):
-    games_on_side = []
-    if side_filter == "overall": games_on_side = all_games
-    elif side_filter == "blue": games_on_side = [g for g in all_games if g['Blue_Team_Name'] == team_tag]
-    elif side_filter == "red": games_on_side = [g for g in all_games if g['Red_Team_Name'] == team_tag]
-    
-    total_games = len(games_on_side)
-    if total_games == 0:
-        output_stats['message'] = f"No games played on {side_filter} side."
-        return
-        
-    game_ids_on_side = {g['Game_ID'] for g in games_on_side}
-    events_on_side = [e for e in all_events if e['game_id'] in game_ids_on_side]
-
-    output_stats['total_games'] = total_games
-    output_stats['drakes'] = _calculate_drake_stats(games_on_side, events_on_side, team_tag)
-    output_stats['voidgrubs'] = _calculate_voidgrub_stats(games_on_side, events_on_side, team_tag)
-    # --- ИЗМЕНЕНИЕ: Считаем статистику по objective_type 'ATAKHAN' ---
-    output_stats['atakhan'] = _calculate_generic_objective_stats(games_on_side, events_on_side, team_tag, 'ATAKHAN')
-    output_stats['heralds'] = _calculate_generic_objective_stats(games_on_side, events_on_side, team_tag, 'HERALD')
-    output_stats['barons'] = _calculate_generic_objective_stats(games_on_side, events_on_side, team_tag, 'BARON')
-    output_stats['first_tower'] = _calculate_ft_stats(games_on_side, events_on_side, team_tag)
+@traced()
+def get_objects_data_for_teams(team_full_names):
+    """
+    Статистика по объектам сразу для нескольких команд (для сравнения).
+    Игры и события читаются одним запросом, каждая игра обрабатывается один раз.
+    Возвращает {полное имя команды: stats} в том же формате, что и get_objects_data.
+    """
+    results = {name: _empty_team_stats(name) for name in team_full_names}
+    conn = get_db_connection()
+    if not conn:
+        for team_stats in results.values(): team_stats["error"] = "Database connection failed"
+        return results
 
-def _ms_to_min_sec(ms):
-    if not isinstance(ms, (int, float)) or ms <= 0: return "N/A"
-    seconds = int(ms / 1000)
-    minutes = seconds // 60
-    seconds %= 60
-    return f"{minutes}:{seconds:02d}"
+    try:
+        cursor = conn.cursor()
+        all_teams_tags = _get_all_team_tags(cursor)
+        tag_by_name = {}
+        for name in team_full_names:
+            team_tag = _resolve_team_tag(name, all_teams_tags)
+            if team_tag: tag_by_name[name] = team_tag
+            else: results[name]["error"] = f"Team tag not found for '{name}'."
+
+        team_tags = sorted(set(tag_by_name.values()))
+        games, events_index = _load_games_and_events(cursor, team_tags)
+        stats_by_tag = compute_objects_stats(games, events_index, team_tags)
+        for name, team_tag in tag_by_name.items():
+            if team_tag in stats_by_tag: results[name].update(stats_by_tag[team_tag])
+            else: results[name]["message"] = "No games found for the selected team."
 
-def _calculate_drake_stats(games, events, team_tag):
-    total_games = len(games)
-    if total_games == 0: return {}
+    except Exception as e:
+        log_message(f"CRITICAL Error in get_objects_data_for_teams: {e}\n{traceback.format_exc()}")
+        for team_stats in results.values(): team_stats["error"] = "A critical error occurred."
+    finally:
+        if conn: conn.close()
 
-    drake_spawn_takes = defaultdict(lambda: {'us': 0, 'them': 0})
-    games_with_soul = 0
-    games_with_soul_and_win = 0
-    first_drake_by_us_times = []
-    drakes_by_us_before_7 = 0
-    drakes_by_us_before_15 = 0
-    total_drakes_by_us = 0
+    return results
 
-    for game in games:
-        game_id = game['Game_ID']
-        is_blue = game['Blue_Team_Name'] == team_tag
-        our_team_id = 100 if is_blue else 200
-        
-        # --- ИЗМЕНЕНИЕ: Исключаем ELDER и ATAKHAN из подсчета обычных драконов ---
-        drakes_in_game = sorted([
-            e for e in events 
-            if e['game_id'] == game_id 
-            and e['objective_type'] == 'DRAGON' 
-            and e['objective_subtype'] not in ['ELDER', 'ATAKHAN']
-        ], key=lambda x: x['timestamp_ms'])
-        
-        our_drake_count = 0
-        their_drake_count = 0
-        soul_achieved = False
-
-        for i, drake in enumerate(drakes_in_game):
-            spawn_num = i + 1
-            if drake['team_id'] == our_team_id:
-                drake_spawn_takes[spawn_num]['us'] += 1
-                our_drake_count += 1
-                total_drakes_by_us += 1
-                if spawn_num == 1:
-                    first_drake_by_us_times.append(drake['timestamp_ms'])
-            else:
-                drake_spawn_takes[spawn_num]['them'] += 1
-                their_drake_count += 1
-            
-            if not soul_achieved and (our_drake_count >= 4 or their_drake_count >= 4):
-                if our_drake_count >= 4:
-                    games_with_soul += 1
-                    is_win = game['Winner_Side'] == ('Blue' if is_blue else 'Red')
-                    if is_win:
-                        games_with_soul_and_win += 1
-                soul_achieved = True
-        
-        drakes_by_us_in_game = [d for d in drakes_in_game if d['team_id'] == our_team_id]
-        drakes_by_us_before_7 += len([d for d in drakes_by_us_in_game if d['timestamp_ms'] < 7 * 60 * 1000])
-        drakes_by_us_before_15 += len([d for d in drakes_by_us_in_game if d['timestamp_ms'] < 15 * 60 * 1000])
-
-    result = { "take_rate": {} }
-    for i in range(1, 5):
-        us = drake_spawn_takes[i]['us']
-        them = drake_spawn_takes[i]['them']
-        total = us + them
-        result["take_rate"][i] = round((us / total) * 100) if total > 0 else 0
-
-    result["avg_drakes_at_7min"] = round(drakes_by_us_before_7 / total_games, 2)
-    result["avg_drakes_at_15min"] = round(drakes_by_us_before_15 / total_games, 2)
-    result["avg_drakes_per_game"] = round(total_drakes_by_us / total_games, 2)
-    result["soul_percent"] = round((games_with_soul / total_games) * 100) if total_games > 0 else 0
-    result["soul_wr_percent"] = round((games_with_soul_and_win / games_with_soul) * 100) if games_with_soul > 0 else 0
-    
-    result["avg_first_drake_timer"] = _ms_to_min_sec(statistics.mean(first_drake_by_us_times)) if first_drake_by_us_times else "N/A"
-    result["min_first_drake_timer"] = _ms_to_min_sec(min(first_drake_by_us_times)) if first_drake_by_us_times else "N/A"
-    result["max_first_drake_timer"] = _ms_to_min_sec(max(first_drake_by_us_times)) if first_drake_by_us_times else "N/A"
-    result["all_first_drake_timers"] = sorted([_ms_to_min_sec(t) for t in first_drake_by_us_times])
-
-    return result
-
-def _calculate_voidgrub_stats(games, events, team_tag):
+def compute_objects_stats(games, events_index, team_tags):
     """
-    Рассчитывает всю статистику по Личинкам Бездны.
-    Версия 2.2: Винрейт в таблице теперь возвращается как число для корректного окрашивания.
+    Считает статистику по объектам для команд team_tags за один проход:
+    события каждой игры просматриваются один раз, сводка игры обновляет
+    аккумуляторы overall и стороны для каждой из выбранных команд, игравших в ней.
+    Возвращает {team_tag: {"overall": ..., "blue_side": ..., "red_side": ...}} для команд, у которых есть игры.
     """
-    grubs_by_game = defaultdict(lambda: {'our_team_count': 0, 'win': False})
-    first_grub_times = []
-    total_games = len(games)
-    our_team_wins = len([g for g in games if g['Winner_Side'] == ('Blue' if g['Blue_Team_Name'] == team_tag else 'Red')])
-    base_winrate = (our_team_wins / total_games) * 100 if total_games > 0 else 0
+    team_tags = set(team_tags)
+    accumulators = {}
 
     for game in games:
-        game_id = game['Game_ID']
-        is_blue = game['Blue_Team_Name'] == team_tag
-        our_team_id = 100 if is_blue else 200
-        
-        grubs_in_game = sorted([e for e in events if e['game_id'] == game_id and e['objective_type'] == 'VOIDGRUB'], key=lambda x: x['timestamp_ms'])
-        
-        our_grubs_in_game = [g for g in grubs_in_game if g['team_id'] == our_team_id]
-        if our_grubs_in_game:
-            first_grub_times.append(our_grubs_in_game[0]['timestamp_ms'])
-
-        grubs_by_game[game_id]['our_team_count'] = len(our_grubs_in_game)
-        grubs_by_game[game_id]['win'] = game['Winner_Side'] == ('Blue' if is_blue else 'Red')
-
-    games_with_grubs_dist = defaultdict(lambda: {'count': 0, 'wins': 0})
-    for data in grubs_by_game.values():
-        count_key = data['our_team_count'] if data['our_team_count'] < 3 else 3 # 0, 1, 2, 3+
-        games_with_grubs_dist[count_key]['count'] += 1
-        if data['win']:
-            games_with_grubs_dist[count_key]['wins'] += 1
-    
-    result = {"wr_by_grubs": [], "first_grub_stats": {}}
-    for i in range(4):
-        data = games_with_grubs_dist.get(i, {'count': 0, 'wins': 0})
-        count = data['count']
-        wr = (data['wins'] / count * 100) if count > 0 else 0
-        result["wr_by_grubs"].append({
-            "grubs_count": i,
-            "games": count,
-            # --- ИЗМЕНЕНИЕ: Возвращаем число вместо строки ---
-            "winrate": wr,
-            "diff_wr": f"{'+' if wr > base_winrate else ''}{(wr - base_winrate):.2f}%"
-        })
-
-    total_grubs_taken = sum(g['our_team_count'] for g in grubs_by_game.values())
-    games_with_one_plus_grubs = len([g for g in grubs_by_game.values() if g['our_team_count'] >= 1])
-    games_with_three_plus_grubs = len([g for g in grubs_by_game.values() if g['our_team_count'] >= 3])
-
-    result["first_grub_stats"] = {
-        "avg_taken": f"{(total_grubs_taken / total_games):.2f}" if total_games > 0 else "0.00",
-        "one_plus_rate": round(games_with_one_plus_grubs / total_games * 100) if total_games > 0 else 0,
-        "three_plus_rate": round(games_with_three_plus_grubs / total_games * 100) if total_games > 0 else 0,
-        "avg_time": _ms_to_min_sec(statistics.mean(first_grub_times)) if first_grub_times else "N/A",
-        "min_time": _ms_to_min_sec(min(first_grub_times)) if first_grub_times else "N/A",
-        "max_time": _ms_to_min_sec(max(first_grub_times)) if first_grub_times else "N/A",
-        "start_times": sorted([_ms_to_min_sec(t) for t in first_grub_times])
+        sides = [(tag, 100, 'Blue') for tag in (game['Blue_Team_Name'],) if tag in team_tags]
+        sides += [(tag, 200, 'Red') for tag in (game['Red_Team_Name'],) if tag in team_tags and tag != game['Blue_Team_Name']]
+        if not sides: continue
+
+        summary = _summarize_game_objectives(events_index.get(game['Game_ID'], ()))
+        for team_tag, our_team_id, side in sides:
+            is_win = game['Winner_Side'] == side
+            team_accumulators = accumulators.setdefault(team_tag, {
+                "overall": _ObjectiveStatsAccumulator(),
+                "blue_side": _ObjectiveStatsAccumulator(),
+                "red_side": _ObjectiveStatsAccumulator(),
+            })
+            team_accumulators["overall"].add_game(summary, our_team_id, is_win)
+            team_accumulators["blue_side" if side == 'Blue' else "red_side"].add_game(summary, our_team_id, is_win)
+
+    return {
+        team_tag: {
+            "overall": team_accumulators["overall"].result("overall"),
+            "blue_side": team_accumulators["blue_side"].result("blue"),
+            "red_side": team_accumulators["red_side"].result("red"),
+        }
+        for team_tag, team_accumulators in accumulators.items()
     }
-    return result
-
-def _calculate_generic_objective_stats(games, events, team_tag, obj_type, obj_subtype=None):
-    # Эта функция остается без изменений
-    obj_times = []
-    games_with_obj = 0
-    games_with_obj_win = 0
-    
-    for game in games:
-        game_id = game['Game_ID']
-        is_blue = game['Blue_Team_Name'] == team_tag
-        our_team_id = 100 if is_blue else 200
-        
-        obj_events = [e for e in events if e['game_id'] == game_id and e['objective_type'] == obj_type]
-        if obj_subtype:
-            obj_events = [e for e in obj_events if e['objective_subtype'] == obj_subtype]
-
-        our_team_obj_events = sorted([e for e in obj_events if e['team_id'] == our_team_id], key=lambda x: x['timestamp_ms'])
-        
-        if our_team_obj_events:
-            games_with_obj += 1
-            obj_times.append(our_team_obj_events[0]['timestamp_ms'])
-            if game['Winner_Side'] == ('Blue' if is_blue else 'Red'):
-                games_with_obj_win += 1
-
-    total_games = len(games)
+
+def _empty_team_stats(team_full_name):
     return {
-        "percent": round((games_with_obj / total_games) * 100) if total_games > 0 else 0,
-        "total": games_with_obj,
-        "winrate": round((games_with_obj_win / games_with_obj) * 100) if games_with_obj > 0 else 0,
-        "avg_time": _ms_to_min_sec(statistics.mean(obj_times)) if obj_times else "N/A",
-        "min_time": _ms_to_min_sec(min(obj_times)) if obj_times else "N/A",
-        "max_time": _ms_to_min_sec(max(obj_times)) if obj_times else "N/A",
-        "start_times": sorted([_ms_to_min_sec(t) for t in obj_times])
+        "error": None, "message": None,
+        "selected_team_name": team_full_name,
+        "overall": {}, "blue_side": {}, "red_side": {}
     }
 
-def _calculate_ft_stats(games, events, team_tag):
+def _get_all_team_tags(cursor):
+    cursor.execute(f"""
+        SELECT DISTINCT Blue_Team_Name as team_tag FROM tournament_games
+        WHERE Blue_Team_Name NOT IN ('{UNKNOWN_BLUE_TAG}', 'Blue Team')
+        UNION
+        SELECT DISTINCT Red_Team_Name as team_tag FROM tournament_games
+        WHERE Red_Team_Name NOT IN ('{UNKNOWN_RED_TAG}', 'Red Team')
+    """)
+    return {row['team_tag'] for row in cursor.fetchall() if row['team_tag']}
+
+def _resolve_team_tag(team_full_name, all_teams_tags):
+    for tag, full_name in TEAM_TAG_TO_FULL_NAME.items():
+        if full_name == team_full_name: return tag
+    if team_full_name in all_teams_tags:
+        return team_full_name
+    return None
+
+def _load_games_and_events(cursor, team_tags):
+    """Игры команд team_tags и индекс их событий {game_id: [события по времени]}."""
+    if not team_tags: return [], {}
+    tag_placeholders = ','.join(['?'] * len(team_tags))
+    cursor.execute(f"SELECT * FROM tournament_games WHERE Blue_Team_Name IN ({tag_placeholders}) OR Red_Team_Name IN ({tag_placeholders})",
+                   list(team_tags) * 2)
+    games = [dict(row) for row in cursor.fetchall()]
+    if not games: return games, {}
+
+    game_ids = [game["Game_ID"] for game in games]
+    placeholders = ','.join(['?'] * len(game_ids))
+    cursor.execute(f"SELECT game_id, timestamp_ms, objective_type, objective_subtype, team_id, lane FROM objective_events WHERE game_id IN ({placeholders}) ORDER BY timestamp_ms ASC", game_ids)
+    return games, _build_events_index(dict(row) for row in cursor.fetchall())
+
+def _build_events_index(events):
     """
-    Рассчитывает всю статистику по башням.
-    Версия 2.2: FT% по линиям теперь показывает распределение, где была взята FT.
+    Индекс событий {game_id: [события]}, строится один раз на запрос.
+    События приходят из БД отсортированными по timestamp_ms, поэтому списки уже упорядочены по времени.
     """
-    total_games = len(games)
-    if total_games == 0: return {}
-    
-    # --- Этап 1: Сбор всех релевантных событий по каждой игре ---
-    
-    # Собираем сами события, когда НАША команда забирает FT, для анализа их местоположения
-    our_ft_events = [] 
-    
-    # Таймеры для FTL (Первая Башня на Линии - для расчета таймера)
-    our_ftl_times = {'TOP': [], 'MID': [], 'BOT': []}
-    
-    # Таймеры для сравнения T1 Destroyed vs T1 Lost
-    our_first_t1_times = {'TOP': [], 'MID': [], 'BOT': []}
-    enemy_first_t1_times = {'TOP': [], 'MID': [], 'BOT': []}
+    events_index = defaultdict(list)
+    for event in events:
+        events_index[event['game_id']].append(event)
+    return events_index
 
-    for game in games:
-        game_id = game['Game_ID']
-        is_blue = game['Blue_Team_Name'] == team_tag
-        our_team_id = 100 if is_blue else 200
-        enemy_team_id = 200 if is_blue else 100
-
-        all_towers_in_game = sorted([e for e in events if e['game_id'] == game_id and e['objective_type'] == 'TOWER'], key=lambda x: x['timestamp_ms'])
-        
-        # 1. Находим самую первую башню в игре
-        first_tower_event = next((t for t in all_towers_in_game), None)
-        if first_tower_event and first_tower_event['team_id'] == our_team_id:
-            our_ft_events.append(first_tower_event) # Сохраняем событие
-        
-        # 2. Собираем данные для таймеров по линиям
-        for lane_key, lane_db in [('TOP', 'TOP_LANE'), ('MID', 'MID_LANE'), ('BOT', 'BOT_LANE')]:
-            towers_on_lane = [t for t in all_towers_in_game if t['lane'] == lane_db]
-            
-            # Собираем таймеры для "Avg FT [LANE] Timer"
-            first_tower_on_lane = next((t for t in towers_on_lane), None)
-            if first_tower_on_lane and first_tower_on_lane['team_id'] == our_team_id:
-                our_ftl_times[lane_key].append(first_tower_on_lane['timestamp_ms'])
-                
-            # Собираем таймеры для "T1 Destroyed"
-            our_first_t1 = next((t for t in towers_on_lane if t['objective_subtype'] == 'OUTER' and t['team_id'] == our_team_id), None)
-            if our_first_t1:
-                our_first_t1_times[lane_key].append(our_first_t1['timestamp_ms'])
-
-            # Собираем таймеры для "T1 Lost"
-            enemy_first_t1 = next((t for t in towers_on_lane if t['objective_subtype'] == 'OUTER' and t['team_id'] == enemy_team_id), None)
-            if enemy_first_t1:
-                enemy_first_t1_times[lane_key].append(enemy_first_t1['timestamp_ms'])
-
-    # --- Этап 2: Расчет итоговой статистики ---
-    result = {"by_lane": {}}
-    
-    our_ft_count = len(our_ft_events)
-    our_ft_total_times = [e['timestamp_ms'] for e in our_ft_events]
-
-    # Общая статистика по FT (не меняется)
-    result['avg_ft_percent'] = round((our_ft_count / total_games) * 100) if total_games > 0 else 0
-    result['avg_ft_timer'] = _ms_to_min_sec(statistics.mean(our_ft_total_times)) if our_ft_total_times else "N/A"
-    
-    # Считаем, на каких линиях были взяты FT
-    ft_location_counts = {'TOP': 0, 'MID': 0, 'BOT': 0}
-    for ft_event in our_ft_events:
-        if ft_event['lane'] == 'TOP_LANE': ft_location_counts['TOP'] += 1
-        elif ft_event['lane'] == 'MID_LANE': ft_location_counts['MID'] += 1
-        elif ft_event['lane'] == 'BOT_LANE': ft_location_counts['BOT'] += 1
-        
-    # Статистика по линиям
-    for lane in ['TOP', 'MID', 'BOT']:
-        # --- НОВАЯ ЛОГИКА для FT % по линии ---
-        # Считаем процент от общего числа взятых FT, а не от числа игр
-        avg_ftl_percent = round((ft_location_counts[lane] / our_ft_count) * 100) if our_ft_count > 0 else 0
-        
-        # Логика таймеров остается прежней
-        avg_ftl_timer = _ms_to_min_sec(statistics.mean(our_ftl_times[lane])) if our_ftl_times[lane] else "N/A"
-        
-        our_t1_avg_ms = statistics.mean(our_first_t1_times[lane]) if our_first_t1_times[lane] else 0
-        enemy_t1_avg_ms = statistics.mean(enemy_first_t1_times[lane]) if enemy_first_t1_times[lane] else 0
-        
-        time_diff_ms = our_t1_avg_ms - enemy_t1_avg_ms if our_t1_avg_ms and enemy_t1_avg_ms else 0
-        time_diff_str = "0:00"
-        if time_diff_ms != 0:
-            prefix = "+" if time_diff_ms > 0 else "-"
-            time_diff_str = f"{prefix}{_ms_to_min_sec(abs(time_diff_ms))}"
-            
-        result["by_lane"][lane] = {
-            "ft_percent": avg_ftl_percent,
-            "ft_timer": avg_ftl_timer,
-            "t1_our_avg": _ms_to_min_sec(our_t1_avg_ms),
-            "t1_enemy_avg": _ms_to_min_sec(enemy_t1_avg_ms),
-            "t1_diff": time_diff_str
+LANES = [('TOP', 'TOP_LANE'), ('MID', 'MID_LANE'), ('BOT', 'BOT_LANE')]
+LANE_KEY_BY_DB_LANE = {lane_db: lane_key for lane_key, lane_db in LANES}
+GENERIC_OBJECTIVE_TYPES = {'ATAKHAN': 'atakhan', 'HERALD': 'heralds', 'BARON': 'barons'}
+
+def _summarize_game_objectives(game_events):
+    """
+    Один проход по событиям игры (по времени). Сводка не зависит от того, за какую команду смотрим:
+    все значения разложены по team_id, поэтому одна сводка обслуживает обе команды игры.
+    """
+    summary = {
+        'drake_takers': [],                     # team_id взявших драконов по порядку спавна (без ELDER/ATAKHAN)
+        'drakes': defaultdict(list),            # team_id -> время взятых драконов
+        'soul_team_id': None,                   # team_id команды, первой взявшей 4 дракона
+        'grubs': defaultdict(list),             # team_id -> время взятых личинок
+        'first_objective': {},                  # (objective_type, team_id) -> время первого взятия
+        'first_tower': None,                    # первая башня в игре
+        'first_lane_tower': {},                 # lane_key -> первая башня на линии
+        'first_outer_tower': {},                # (lane_key, team_id) -> время первой внешней башни
+    }
+    drake_counts = defaultdict(int)
+
+    for event in game_events:
+        obj_type = event['objective_type']
+        team_id = event['team_id']
+        ts = event['timestamp_ms']
+
+        if obj_type == 'DRAGON':
+            # --- Исключаем ELDER и ATAKHAN из подсчета обычных драконов ---
+            if event['objective_subtype'] in ['ELDER', 'ATAKHAN']: continue
+            summary['drake_takers'].append(team_id)
+            summary['drakes'][team_id].append(ts)
+            drake_counts[team_id] += 1
+            if summary['soul_team_id'] is None and drake_counts[team_id] >= 4:
+                summary['soul_team_id'] = team_id
+        elif obj_type == 'VOIDGRUB':
+            summary['grubs'][team_id].append(ts)
+        elif obj_type in GENERIC_OBJECTIVE_TYPES:
+            summary['first_objective'].setdefault((obj_type, team_id), ts)
+        elif obj_type == 'TOWER':
+            if summary['first_tower'] is None: summary['first_tower'] = event
+            lane_key = LANE_KEY_BY_DB_LANE.get(event['lane'])
+            if lane_key:
+                summary['first_lane_tower'].setdefault(lane_key, event)
+                if event['objective_subtype'] == 'OUTER':
+                    summary['first_outer_tower'].setdefault((lane_key, team_id), ts)
+
+    return summary
+
+def _ms_to_min_sec(ms):
+    if not isinstance(ms, (int, float)) or ms <= 0: return "N/A"
+    seconds = int(ms / 1000)
+    minutes = seconds // 60
+    seconds %= 60
+    return f"{minutes}:{seconds:02d}"
+
+def _mean_timer(times):
+    return _ms_to_min_sec(statistics.mean(times)) if times else "N/A"
+
+class _ObjectiveStatsAccumulator:
+    """Накопитель статистики по всем объектам для одной команды в одном срезе (overall / blue / red)."""
+
+    def __init__(self):
+        self.total_games = 0
+        self.wins = 0
+        # Драконы
+        self.drake_spawn_takes = defaultdict(lambda: {'us': 0, 'them': 0})
+        self.games_with_soul = 0
+        self.games_with_soul_and_win = 0
+        self.first_drake_by_us_times = []
+        self.drakes_by_us_before_7 = 0
+        self.drakes_by_us_before_15 = 0
+        self.total_drakes_by_us = 0
+        # Личинки: распределение 0, 1, 2, 3+ взятых за игру
+        self.grubs_dist = defaultdict(lambda: {'count': 0, 'wins': 0})
+        self.total_grubs_taken = 0
+        self.first_grub_times = []
+        # Atakhan / Herald / Baron
+        self.generic = {obj_type: {'times': [], 'wins': 0} for obj_type in GENERIC_OBJECTIVE_TYPES}
+        # Башни
+        self.our_ft_events = []
+        self.our_ftl_times = {lane_key: [] for lane_key, _ in LANES}
+        self.our_first_t1_times = {lane_key: [] for lane_key, _ in LANES}
+        self.enemy_first_t1_times = {lane_key: [] for lane_key, _ in LANES}
+
+    def add_game(self, summary, our_team_id, is_win):
+        enemy_team_id = 200 if our_team_id == 100 else 100
+        self.total_games += 1
+        if is_win: self.wins += 1
+
+        for i, team_id in enumerate(summary['drake_takers']):
+            self.drake_spawn_takes[i + 1]['us' if team_id == our_team_id else 'them'] += 1
+        our_drakes = summary['drakes'].get(our_team_id, ())
+        self.total_drakes_by_us += len(our_drakes)
+        self.drakes_by_us_before_7 += sum(1 for ts in our_drakes if ts < 7 * 60 * 1000)
+        self.drakes_by_us_before_15 += sum(1 for ts in our_drakes if ts < 15 * 60 * 1000)
+        if summary['drake_takers'] and summary['drake_takers'][0] == our_team_id:
+            self.first_drake_by_us_times.append(our_drakes[0])
+        if summary['soul_team_id'] == our_team_id:
+            self.games_with_soul += 1
+            if is_win: self.games_with_soul_and_win += 1
+
+        our_grubs = summary['grubs'].get(our_team_id, ())
+        if our_grubs: self.first_grub_times.append(our_grubs[0])
+        self.total_grubs_taken += len(our_grubs)
+        grubs_bucket = self.grubs_dist[min(len(our_grubs), 3)]
+        grubs_bucket['count'] += 1
+        if is_win: grubs_bucket['wins'] += 1
+
+        for obj_type, data in self.generic.items():
+            ts = summary['first_objective'].get((obj_type, our_team_id))
+            if ts is not None:
+                data['times'].append(ts)
+                if is_win: data['wins'] += 1
+
+        first_tower = summary['first_tower']
+        if first_tower and first_tower['team_id'] == our_team_id:
+            self.our_ft_events.append(first_tower)
+        for lane_key, _ in LANES:
+            first_lane_tower = summary['first_lane_tower'].get(lane_key)
+            if first_lane_tower and first_lane_tower['team_id'] == our_team_id:
+                self.our_ftl_times[lane_key].append(first_lane_tower['timestamp_ms'])
+            our_t1 = summary['first_outer_tower'].get((lane_key, our_team_id))
+            if our_t1 is not None: self.our_first_t1_times[lane_key].append(our_t1)
+            enemy_t1 = summary['first_outer_tower'].get((lane_key, enemy_team_id))
+            if enemy_t1 is not None: self.enemy_first_t1_times[lane_key].append(enemy_t1)
+
+    def result(self, side_filter):
+        if self.total_games == 0:
+            return {'message': f"No games played on {side_filter} side."}
+        result = {'total_games': self.total_games, 'drakes': self._drake_stats(), 'voidgrubs': self._voidgrub_stats()}
+        for obj_type, key in GENERIC_OBJECTIVE_TYPES.items():
+            result[key] = self._generic_objective_stats(obj_type)
+        result['first_tower'] = self._ft_stats()
+        return result
+
+    def _drake_stats(self):
+        total_games = self.total_games
+        result = {"take_rate": {}}
+        for i in range(1, 5):
+            us = self.drake_spawn_takes[i]['us']
+            them = self.drake_spawn_takes[i]['them']
+            total = us + them
+            result["take_rate"][i] = round((us / total) * 100) if total > 0 else 0
+
+        result["avg_drakes_at_7min"] = round(self.drakes_by_us_before_7 / total_games, 2)
+        result["avg_drakes_at_15min"] = round(self.drakes_by_us_before_15 / total_games, 2)
+        result["avg_drakes_per_game"] = round(self.total_drakes_by_us / total_games, 2)
+        result["soul_percent"] = round((self.games_with_soul / total_games) * 100)
+        result["soul_wr_percent"] = round((self.games_with_soul_and_win / self.games_with_soul) * 100) if self.games_with_soul > 0 else 0
+
+        times = self.first_drake_by_us_times
+        result["avg_first_drake_timer"] = _mean_timer(times)
+        result["min_first_drake_timer"] = _ms_to_min_sec(min(times)) if times else "N/A"
+        result["max_first_drake_timer"] = _ms_to_min_sec(max(times)) if times else "N/A"
+        result["all_first_drake_timers"] = sorted([_ms_to_min_sec(t) for t in times])
+        return result
+
+    def _voidgrub_stats(self):
+        """Винрейт в таблице возвращается как число для корректного окрашивания."""
+        total_games = self.total_games
+        base_winrate = (self.wins / total_games) * 100
+
+        result = {"wr_by_grubs": [], "first_grub_stats": {}}
+        for i in range(4):
+            data = self.grubs_dist.get(i, {'count': 0, 'wins': 0})
+            count = data['count']
+            wr = (data['wins'] / count * 100) if count > 0 else 0
+            result["wr_by_grubs"].append({
+                "grubs_count": i,
+                "games": count,
+                "winrate": wr,
+                "diff_wr": f"{'+' if wr > base_winrate else ''}{(wr - base_winrate):.2f}%"
+            })
+
+        games_with_one_plus_grubs = total_games - self.grubs_dist.get(0, {'count': 0})['count']
+        games_with_three_plus_grubs = self.grubs_dist.get(3, {'count': 0})['count']
+        times = self.first_grub_times
+        result["first_grub_stats"] = {
+            "avg_taken": f"{(self.total_grubs_taken / total_games):.2f}",
+            "one_plus_rate": round(games_with_one_plus_grubs / total_games * 100),
+            "three_plus_rate": round(games_with_three_plus_grubs / total_games * 100),
+            "avg_time": _mean_timer(times),
+            "min_time": _ms_to_min_sec(min(times)) if times else "N/A",
+            "max_time": _ms_to_min_sec(max(times)) if times else "N/A",
+            "start_times": sorted([_ms_to_min_sec(t) for t in times])
         }
-        
-    return result
\ No newline at end of file
+        return result
+
+    def _generic_objective_stats(self, obj_type):
+        times = self.generic[obj_type]['times']
+        games_with_obj = len(times)
+        games_with_obj_win = self.generic[obj_type]['wins']
+        return {
+            "percent": round((games_with_obj / self.total_games) * 100),
+            "total": games_with_obj,
+            "winrate": round((games_with_obj_win / games_with_obj) * 100) if games_with_obj > 0 else 0,
+            "avg_time": _mean_timer(times),
+            "min_time": _ms_to_min_sec(min(times)) if times else "N/A",
+            "max_time": _ms_to_min_sec(max(times)) if times else "N/A",
+            "start_times": sorted([_ms_to_min_sec(t) for t in times])
+        }
+
+    def _ft_stats(self):
+        """FT% по линиям показывает распределение, где была взята FT."""
+        result = {"by_lane": {}}
+
+        our_ft_count = len(self.our_ft_events)
+        our_ft_total_times = [e['timestamp_ms'] for e in self.our_ft_events]
+        result['avg_ft_percent'] = round((our_ft_count / self.total_games) * 100)
+        result['avg_ft_timer'] = _mean_timer(our_ft_total_times)
+
+        # Считаем, на каких линиях были взяты FT
+        ft_location_counts = {lane_key: 0 for lane_key, _ in LANES}
+        for ft_event in self.our_ft_events:
+            lane_key = LANE_KEY_BY_DB_LANE.get(ft_event['lane'])
+            if lane_key: ft_location_counts[lane_key] += 1
+
+        for lane, _ in LANES:
+            # Процент от общего числа взятых FT, а не от числа игр
+            avg_ftl_percent = round((ft_location_counts[lane] / our_ft_count) * 100) if our_ft_count > 0 else 0
+            avg_ftl_timer = _mean_timer(self.our_ftl_times[lane])
+
+            our_t1_avg_ms = statistics.mean(self.our_first_t1_times[lane]) if self.our_first_t1_times[lane] else 0
+            enemy_t1_avg_ms = statistics.mean(self.enemy_first_t1_times[lane]) if self.enemy_first_t1_times[lane] else 0
+
+            time_diff_ms = our_t1_avg_ms - enemy_t1_avg_ms if our_t1_avg_ms and enemy_t1_avg_ms else 0
+            time_diff_str = "0:00"
+            if time_diff_ms != 0:
+                prefix = "+" if time_diff_ms > 0 else "-"
+                time_diff_str = f"{prefix}{_ms_to_min_sec(abs(time_diff_ms))}"
+
+            result["by_lane"][lane] = {
+                "ft_percent": avg_ftl_percent,
+                "ft_timer": avg_ftl_timer,
+                "t1_our_avg": _ms_to_min_sec(our_t1_avg_ms),
+                "t1_enemy_avg": _ms_to_min_sec(enemy_t1_avg_ms),
+                "t1_diff": time_diff_str
+            }
+
+        return result
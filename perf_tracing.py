@@ -0,0 +1,294 @@
+# perf_tracing.py
+# Легкая трассировка запросов Flask: SQL (число запросов и время), span'ы логических функций и render_template.
+# Медленные запросы пишутся в лог и хранятся в кольцевом буфере для /debug/perf.
+# Вне HTTP-запроса (планировщики, загрузка данных) ничего не делает.
+
+import functools
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from log_utils import log_message
+
+PERF_TRACING_ENABLED = os.getenv("PERF_TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+PERF_SLOW_REQUEST_MS = float(os.getenv("PERF_SLOW_REQUEST_MS", "500"))
+PERF_RECENT_REQUESTS = int(os.getenv("PERF_RECENT_REQUESTS", "50"))  # сколько медленных запросов хранить
+# /debug/perf показывает SQL, пути и тайминги - регистрируется только явно
+PERF_DEBUG_ENDPOINT = os.getenv("PERF_DEBUG_ENDPOINT", "false").lower() in ("1", "true", "yes")
+PERF_TOP_STATEMENTS = 5      # самые дорогие SQL-выражения в разбивке запроса
+SQL_TEXT_LIMIT = 160         # SQL в отчете обрезается (IN (?, ?, ...) на тысячи параметров)
+
+_current_trace = ContextVar("perf_trace", default=None)
+_slow_requests = deque(maxlen=PERF_RECENT_REQUESTS)
+_endpoint_stats = {}
+_stats_lock = threading.Lock()
+
+
+class RequestTrace:
+    """Замеры одного HTTP-запроса. Заполняется из потока запроса и его соединений с БД."""
+    __slots__ = ("method", "path", "endpoint", "status", "started", "started_at",
+                 "sql_queries", "sql_ms", "statements", "spans", "render_ms")
+
+    def __init__(self, method, path, endpoint):
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint
+        self.status = None
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+        self.sql_queries = 0
+        self.sql_ms = 0.0
+        self.statements = {}  # SQL -> [число выполнений, мс]
+        self.spans = {}       # имя -> [число вызовов, мс]
+        self.render_ms = 0.0
+
+    def add_sql(self, sql, elapsed_ms, executed=True):
+        """executed=False - время выборки строк (fetch*) без нового запроса."""
+        self.sql_ms += elapsed_ms
+        entry = self.statements.get(sql)
+        if entry is None:
+            entry = self.statements[sql] = [0, 0.0]
+        if executed:
+            self.sql_queries += 1
+            entry[0] += 1
+        entry[1] += elapsed_ms
+
+    def add_span(self, name, elapsed_ms):
+        entry = self.spans.get(name)
+        if entry is None:
+            entry = self.spans[name] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += elapsed_ms
+
+    def to_dict(self, total_ms):
+        top_statements = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:PERF_TOP_STATEMENTS]
+        return {
+            "started_at": self.started_at,
+            "method": self.method,
+            "path": self.path,
+            "endpoint": self.endpoint,
+            "status": self.status,
+            "total_ms": round(total_ms, 1),
+            "sql": {
+                "queries": self.sql_queries,
+                "ms": round(self.sql_ms, 1),
+                "top": [{"sql": " ".join(sql.split())[:SQL_TEXT_LIMIT], "count": count, "ms": round(ms, 1)}
+                        for sql, (count, ms) in top_statements],
+            },
+            "render_ms": round(self.render_ms, 1),
+            # Время вложенных span'ов (и их SQL) входит и в родительский span
+            "spans": {name: {"count": count, "ms": round(ms, 1)}
+                      for name, (count, ms) in sorted(self.spans.items(), key=lambda item: item[1][1], reverse=True)},
+            "other_ms": round(max(total_ms - self.sql_ms - self.render_ms, 0.0), 1),
+        }
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def traced(name=None):
+    """
+    Декоратор: время вызова функции добавляется в span текущего запроса.
+    Без активного запроса - один ContextVar.get() сверху.
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                trace.add_span(span_name, (time.perf_counter() - started) * 1000)
+        return wrapper
+    return decorator
+
+
+class TracedCursor(sqlite3.Cursor):
+    """
+    Курсор, который учитывает execute*/fetch* в трассе соединения.
+    Строки выбираются по мере fetch*, поэтому их время тоже относится к SQL (без увеличения числа запросов).
+    Перебор курсора в цикле for не замеряется: в коде везде fetchall/fetchone.
+    """
+
+    def _record(self, sql, started, executed=True):
+        trace = self.connection.perf_trace
+        if trace is not None:
+            trace.add_sql(sql, (time.perf_counter() - started) * 1000, executed)
+
+    def execute(self, sql, parameters=()):
+        self.perf_sql = sql
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(sql, started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.perf_sql = sql
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(sql, started)
+
+    def executescript(self, sql_script):
+        self.perf_sql = sql_script
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._record(sql_script, started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self._record(getattr(self, "perf_sql", ""), started, executed=False)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany() if size is None else super().fetchmany(size)
+        finally:
+            self._record(getattr(self, "perf_sql", ""), started, executed=False)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._record(getattr(self, "perf_sql", ""), started, executed=False)
+
+
+class TracedConnection(sqlite3.Connection):
+    """Соединение, созданное во время запроса: курсоры пишут в трассу этого запроса."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.perf_trace = _current_trace.get()
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute* создают курсор в обход cursor(), поэтому переопределены явно
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connection_factory():
+    """Класс соединения для sqlite3.connect: трассируемый только внутри запроса."""
+    return TracedConnection if _current_trace.get() is not None else sqlite3.Connection
+
+
+def start_request(method, path, endpoint=None):
+    if not PERF_TRACING_ENABLED: return None
+    trace = RequestTrace(method, path, endpoint)
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_request():
+    """Закрывает трассу текущего запроса: статистика по endpoint'у, лог и буфер для медленных."""
+    trace = _current_trace.get()
+    if trace is None: return None
+    _current_trace.set(None)
+    total_ms = (time.perf_counter() - trace.started) * 1000
+    endpoint = trace.endpoint or trace.path
+    with _stats_lock:
+        stats = _endpoint_stats.get(endpoint)
+        if stats is None:
+            stats = _endpoint_stats[endpoint] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "sql_queries": 0, "sql_ms": 0.0, "slow": 0}
+        stats["count"] += 1
+        stats["total_ms"] += total_ms
+        stats["max_ms"] = max(stats["max_ms"], total_ms)
+        stats["sql_queries"] += trace.sql_queries
+        stats["sql_ms"] += trace.sql_ms
+        if total_ms >= PERF_SLOW_REQUEST_MS: stats["slow"] += 1
+    if total_ms >= PERF_SLOW_REQUEST_MS:
+        report = trace.to_dict(total_ms)
+        with _stats_lock:
+            _slow_requests.append(report)
+        spans = ", ".join(f"{name} {span['ms']:.0f} ms" for name, span in list(report["spans"].items())[:3])
+        log_message(f"[Perf] Slow request {trace.method} {trace.path} -> {trace.status}: {total_ms:.0f} ms "
+             f"(SQL {trace.sql_queries} queries / {trace.sql_ms:.0f} ms, render {trace.render_ms:.0f} ms"
+             f"{', ' + spans if spans else ''})")
+    return trace
+
+
+def get_perf_report():
+    """Данные для /debug/perf: сводка по endpoint'ам и последние медленные запросы (новые первыми)."""
+    with _stats_lock:
+        endpoints = {
+            endpoint: {
+                "count": stats["count"],
+                "avg_ms": round(stats["total_ms"] / stats["count"], 1),
+                "max_ms": round(stats["max_ms"], 1),
+                "avg_sql_queries": round(stats["sql_queries"] / stats["count"], 1),
+                "avg_sql_ms": round(stats["sql_ms"] / stats["count"], 1),
+                "slow": stats["slow"],
+            }
+            for endpoint, stats in sorted(_endpoint_stats.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+        }
+        slow_requests = list(reversed(_slow_requests))
+    return {
+        "enabled": PERF_TRACING_ENABLED,
+        "slow_request_ms": PERF_SLOW_REQUEST_MS,
+        "endpoints": endpoints,
+        "slow_requests": slow_requests,
+    }
+
+
+def install_request_tracing(app):
+    """Подключает трассировку к приложению Flask: хуки запроса и сигналы рендеринга шаблонов."""
+    if not PERF_TRACING_ENABLED: return
+    from flask import before_render_template, request, template_rendered
+
+    render_started = ContextVar("perf_render_started", default=None)
+
+    @app.before_request
+    def _perf_start_request():
+        start_request(request.method, request.path, request.endpoint)
+
+    @app.after_request
+    def _perf_record_status(response):
+        trace = _current_trace.get()
+        if trace is not None: trace.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _perf_finish_request(exc):
+        trace = _current_trace.get()
+        if trace is not None and exc is not None and trace.status is None: trace.status = 500
+        finish_request()
+
+    def _on_before_render(sender, template, context, **extra):
+        if _current_trace.get() is not None: render_started.set(time.perf_counter())
+
+    def _on_rendered(sender, template, context, **extra):
+        trace = _current_trace.get()
+        started = render_started.get()
+        if trace is None or started is None: return
+        render_started.set(None)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        trace.render_ms += elapsed_ms
+        trace.add_span(f"render_template {template.name}", elapsed_ms)
+
+    before_render_template.connect(_on_before_render, app, weak=False)
+    template_rendered.connect(_on_rendered, app, weak=False)
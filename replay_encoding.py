@@ -0,0 +1,187 @@
+# replay_encoding.py
+# Компактный бинарный формат таймлайна для плеера реплея:
+# участники (чемпион, команда) один раз в заголовке + Int16 массивы x/z на участника с фиксированным шагом
+
+import json
+import struct
+import sys
+from array import array
+from itertools import repeat
+
+REPLAY_FORMAT_VERSION = 1
+REPLAY_MAGIC = b"RPL1"
+REPLAY_TICK_MS = 1000          # шаг кадров (снапшоты скримов пишутся раз в секунду)
+REPLAY_LOD_TICKS_MS = (1000, 5000, 30000)  # разрешения, предрассчитываемые при загрузке реплея
+MISSING_COORD = -32768         # на этом тике позиции участника нет
+INT16_MAX = 32767
+
+# Формат (little-endian):
+#   4 байта  REPLAY_MAGIC
+#   uint32   длина заголовка N
+#   N байт   JSON-заголовок (дополнен пробелами до кратности 4, чтобы массивы были выровнены)
+#   далее для каждого участника из header["participants"] по порядку:
+#            Int16[frame_count] x, затем Int16[frame_count] z
+# Кадр i соответствует времени start_ms + i * tick_ms; end_ms - время последнего снапшота игры.
+
+
+class PositionColumns:
+    """
+    Колоночный буфер тиков позиций (timestamp_ms, participant_id, x, z) на typed array:
+    без кортежа или словаря на каждую запись, вставка в БД одним executemany через rows().
+    """
+    __slots__ = ("timestamps", "participant_ids", "xs", "zs")
+
+    def __init__(self):
+        self.timestamps = array("q")
+        self.participant_ids = array("i")
+        self.xs = array("i")
+        self.zs = array("i")
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, timestamp_ms, participant_id, x, z):
+        self.timestamps.append(timestamp_ms)
+        self.participant_ids.append(participant_id)
+        self.xs.append(x)
+        self.zs.append(z)
+
+    def rows(self, key):
+        """Строки (key, timestamp_ms, participant_id, x, z) для executemany."""
+        return zip(repeat(key), self.timestamps, self.participant_ids, self.xs, self.zs)
+
+
+def _participant_key(position):
+    participant_id = position.get("participantID")
+    return participant_id if participant_id is not None else position.get("championName")
+
+
+def _to_int16(value):
+    return max(-INT16_MAX, min(INT16_MAX, int(round(value))))
+
+
+def build_replay_tracks(snapshots, tick_ms=REPLAY_TICK_MS):
+    """
+    Раскладывает снапшоты [(timestamp_ms, [позиции])] (по возрастанию времени) в треки с фиксированным шагом.
+    Возвращает {"start_ms", "tick_ms", "frame_count", "participants": [...], "tracks": [(xs, zs), ...]}.
+    Тики без данных заполняются MISSING_COORD.
+    """
+    snapshots = [(ts, positions) for ts, positions in snapshots if positions]
+    if not snapshots:
+        return {"start_ms": 0, "end_ms": 0, "tick_ms": tick_ms, "frame_count": 0, "participants": [], "tracks": []}
+
+    start_ms = snapshots[0][0]
+    frame_count = (snapshots[-1][0] - start_ms) // tick_ms + 1
+    participants = {}
+    tracks = {}
+
+    for ts, positions in snapshots:
+        frame = (ts - start_ms) // tick_ms
+        for position in positions:
+            key = _participant_key(position)
+            if key is None: continue
+            if key not in participants:
+                participants[key] = {
+                    "participantID": position.get("participantID"),
+                    "championName": position.get("championName", "Unknown"),
+                    "teamId": position.get("teamId", 0),
+                }
+                tracks[key] = (array("h", [MISSING_COORD]) * frame_count, array("h", [MISSING_COORD]) * frame_count)
+            xs, zs = tracks[key]
+            xs[frame] = _to_int16(position["x"])
+            zs[frame] = _to_int16(position["z"])
+
+    # Сначала по participantID, участники без ID (ключ - имя чемпиона) в конце
+    ordered_keys = sorted(participants, key=lambda k: (participants[k]["participantID"] is None, participants[k]["participantID"] or 0, str(k)))
+    return {
+        "start_ms": start_ms,
+        "end_ms": snapshots[-1][0],
+        "tick_ms": tick_ms,
+        "frame_count": frame_count,
+        "participants": [participants[k] for k in ordered_keys],
+        "tracks": [tracks[k] for k in ordered_keys],
+    }
+
+
+def downsample_replay(replay, tick_ms):
+    """Треки с более крупным шагом: каждый k-й кадр, k = tick_ms / шаг исходных треков. end_ms сохраняется."""
+    step = max(1, tick_ms // replay["tick_ms"])
+    if step == 1: return replay
+    return dict(replay,
+                tick_ms=replay["tick_ms"] * step,
+                frame_count=len(range(0, replay["frame_count"], step)),
+                tracks=[(xs[::step], zs[::step]) for xs, zs in replay["tracks"]])
+
+
+def slice_replay(replay, from_ms=None, to_ms=None):
+    """Кадры, попадающие в окно [from_ms, to_ms]."""
+    start_ms, tick_ms, frame_count = replay["start_ms"], replay["tick_ms"], replay["frame_count"]
+    first = 0 if from_ms is None else max(0, -((start_ms - from_ms) // tick_ms))
+    last = frame_count - 1 if to_ms is None else min(frame_count - 1, (to_ms - start_ms) // tick_ms)
+    if first == 0 and last == frame_count - 1: return replay
+    if last < first:
+        return dict(replay, start_ms=start_ms + first * tick_ms, frame_count=0, tracks=[(xs[:0], zs[:0]) for xs, zs in replay["tracks"]])
+    return dict(replay,
+                start_ms=start_ms + first * tick_ms,
+                end_ms=replay["end_ms"] if to_ms is None else min(replay["end_ms"], to_ms),
+                frame_count=last - first + 1,
+                tracks=[(xs[first:last + 1], zs[first:last + 1]) for xs, zs in replay["tracks"]])
+
+
+def encode_replay_payload(replay, extra_header=None):
+    """Кодирует результат build_replay_tracks (и доп. поля заголовка, например события) в байты."""
+    header = {
+        "version": REPLAY_FORMAT_VERSION,
+        "start_ms": replay["start_ms"],
+        "end_ms": replay["end_ms"],
+        "tick_ms": replay["tick_ms"],
+        "frame_count": replay["frame_count"],
+        "missing": MISSING_COORD,
+        "participants": replay["participants"],
+    }
+    if extra_header: header.update(extra_header)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-(8 + len(header_bytes)) % 4)
+
+    parts = [REPLAY_MAGIC, struct.pack("<I", len(header_bytes)), header_bytes]
+    for xs, zs in replay["tracks"]:
+        for values in (xs, zs):
+            if sys.byteorder == "big":
+                values = array("h", values); values.byteswap()
+            parts.append(values.tobytes())
+    return b"".join(parts)
+
+
+def decode_replay_payload(payload):
+    """Обратное преобразование: (header, [(xs, zs), ...]) - для проверок и бенчмарков."""
+    if payload[:4] != REPLAY_MAGIC:
+        raise ValueError("Not a replay payload")
+    (header_len,) = struct.unpack_from("<I", payload, 4)
+    header = json.loads(payload[8:8 + header_len].decode("utf-8"))
+    frame_count = header["frame_count"]
+    offset = 8 + header_len
+    tracks = []
+    for _ in header["participants"]:
+        pair = []
+        for _axis in range(2):
+            values = array("h")
+            values.frombytes(payload[offset:offset + frame_count * 2])
+            if sys.byteorder == "big": values.byteswap()
+            pair.append(values)
+            offset += frame_count * 2
+        tracks.append(tuple(pair))
+    return header, tracks
+
+
+def replay_from_payload(payload):
+    """Payload -> (replay в формате build_replay_tracks, полный заголовок)."""
+    header, tracks = decode_replay_payload(payload)
+    replay = {
+        "start_ms": header["start_ms"],
+        "end_ms": header.get("end_ms", header["start_ms"] + max(header["frame_count"] - 1, 0) * header["tick_ms"]),
+        "tick_ms": header["tick_ms"],
+        "frame_count": header["frame_count"],
+        "participants": header["participants"],
+        "tracks": tracks,
+    }
+    return replay, header
@@ -0,0 +1,101 @@
+# replay_pipeline.py
+# Конвейер обработки реплеев: поток загрузки ставит сырые данные в очередь, разбор идет в пуле процессов,
+# а запись в БД - в одном потоке-писателе строго в порядке постановки.
+
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from log_utils import log_message
+
+REPLAY_PARSE_WORKERS = int(os.getenv("REPLAY_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+REPLAY_PIPELINE_MAX_PENDING = 8   # сколько разобранных/разбираемых реплеев может ждать записи (ограничивает память)
+
+_STOP = object()
+
+
+class ReplayIngestPipeline:
+    """
+    Producer/consumer конвейер: submit() из потока загрузки -> parse_func(*args) в пуле процессов ->
+    write_func(key, результат) в потоке-писателе, в порядке вызовов submit().
+    write_func может вернуть False - тогда реплей считается неудачным.
+
+    parse_func должна быть функцией верхнего уровня модуля (передается в дочерний процесс).
+    При workers=0 разбор выполняется в потоке-писателе (без пула процессов).
+    Очередь ограничена max_pending: если писатель не успевает, submit() ждет, а не копит данные в памяти.
+    """
+
+    def __init__(self, parse_func, write_func, workers=REPLAY_PARSE_WORKERS, max_pending=REPLAY_PIPELINE_MAX_PENDING):
+        self.parse_func = parse_func
+        self.write_func = write_func
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._executor = None
+        self._writer = None
+        self.written = 0
+        self.failed = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def start(self):
+        if self.workers > 0:
+            # spawn, а не fork: пул создается из потока запроса, когда в процессе уже работают потоки Flask
+            # и фоновые потоки, и fork унаследовал бы захваченные ими блокировки (например, stdout в log_message).
+            # Дочерний процесс заново импортирует __main__ - app.py не инициализирует БД в дочерних процессах.
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            except (OSError, ValueError) as e:
+                log_message(f"[ReplayPipeline] Process pool unavailable ({e}), parsing in the writer thread.")
+                self._executor = None
+        self._writer = threading.Thread(target=self._write_loop, name="replay-db-writer", daemon=True)
+        self._writer.start()
+
+    def submit(self, key, *args):
+        """Ставит реплей в конвейер. Блокируется, если в очереди уже max_pending реплеев."""
+        if self._executor is not None:
+            try:
+                task = self._executor.submit(self.parse_func, *args)
+            except RuntimeError as e:  # пул сломан (например, упал дочерний процесс)
+                log_message(f"[ReplayPipeline] Process pool rejected {key} ({e}), parsing in the writer thread.")
+                task = args
+        else:
+            task = args
+        self._queue.put((key, task))
+
+    def pending(self):
+        """Сколько реплеев поставлено, но еще не записано (приблизительно)."""
+        return self._queue.qsize()
+
+    def close(self):
+        """Дожидается записи всего поставленного и останавливает пул и писателя."""
+        if self._writer is None: return
+        self._queue.put(_STOP)
+        self._writer.join()
+        self._writer = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP: return
+            key, task = item
+            try:
+                parsed = task.result() if isinstance(task, Future) else self.parse_func(*task)
+                if self.write_func(key, parsed) is False:
+                    self.failed += 1
+                else:
+                    self.written += 1
+            except Exception as e:
+                self.failed += 1
+                log_message(f"[ReplayPipeline] Failed to process replay {key}: {e}\n{traceback.format_exc()}")
@@ -0,0 +1,129 @@
+# retry_policy.py
+# Повторы запросов с full jitter, circuit breaker по группам endpoint и общий дедлайн загрузки
+
+import functools
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from log_utils import log_message
+
+RETRY_MAX_DELAY = 30.0           # верхняя граница одной паузы между попытками (секунд)
+BREAKER_FAILURE_THRESHOLD = 5    # подряд неудачных запросов до размыкания
+BREAKER_RESET_TIMEOUT = 60.0     # через сколько секунд пропустить пробный запрос
+
+
+def full_jitter_delay(attempt, base_delay, max_delay=RETRY_MAX_DELAY):
+    """Пауза перед повтором: случайная в [0, min(max_delay, base_delay * 2^attempt)] (AWS "full jitter")."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def endpoint_group(endpoint):
+    """Ключ circuit breaker: первые два сегмента пути ('file-download/events', 'central-data/graphql')."""
+    return "/".join(endpoint.strip("/").split("/")[:2])
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker по ключу (группе endpoint).
+    После failure_threshold неудач подряд ключ размыкается и запросы сразу отклоняются;
+    через reset_timeout пропускается один пробный запрос: успех замыкает цепь, неудача размыкает снова.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = {}     # key -> неудач подряд
+        self._opened_at = {}    # key -> время размыкания
+        self._probing = set()   # ключи, по которым идет пробный запрос
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        with self._lock:
+            opened_at = self._opened_at.get(key)
+            if opened_at is None: return True
+            if key in self._probing or time.monotonic() - opened_at < self.reset_timeout: return False
+            self._probing.add(key)
+            return True
+
+    def record_success(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+            self._opened_at.pop(key, None)
+            self._probing.discard(key)
+
+    def record_failure(self, key):
+        with self._lock:
+            failures = self._failures.get(key, 0) + 1
+            self._failures[key] = failures
+            probe_failed = key in self._probing
+            if probe_failed or failures >= self.failure_threshold:
+                if probe_failed or key not in self._opened_at:
+                    log_message(f"[Retry] Circuit opened for '{key}' after {failures} consecutive failure(s).")
+                self._opened_at[key] = time.monotonic()
+                self._probing.discard(key)
+
+    def is_open(self, key):
+        with self._lock:
+            return key in self._opened_at
+
+
+# --- Дедлайн загрузки (на поток) ---
+_deadline_local = threading.local()
+
+
+@contextmanager
+def ingest_deadline(seconds):
+    """Ограничивает общее время загрузки: после дедлайна запросы и повторы не выполняются."""
+    previous = getattr(_deadline_local, "deadline", None)
+    deadline = time.monotonic() + seconds
+    _deadline_local.deadline = deadline if previous is None else min(previous, deadline)
+    try:
+        yield
+    finally:
+        _deadline_local.deadline = previous
+
+
+def with_ingest_deadline(seconds):
+    """Декоратор: вся функция выполняется под ingest_deadline(seconds)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with ingest_deadline(seconds):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def deadline_remaining():
+    """Секунд до дедлайна текущей загрузки или None, если дедлайна нет."""
+    deadline = getattr(_deadline_local, "deadline", None)
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_exceeded():
+    remaining = deadline_remaining()
+    return remaining is not None and remaining <= 0
+
+
+def cap_timeout_to_deadline(timeout):
+    """Урезает (connect, read) таймаут до времени, оставшегося до дедлайна."""
+    remaining = deadline_remaining()
+    if remaining is None: return timeout
+    remaining = max(remaining, 0.1)
+    if isinstance(timeout, tuple): return tuple(min(part, remaining) for part in timeout)
+    return min(timeout, remaining)
+
+
+def wait_before_retry(attempt, base_delay, retry_after=None):
+    """
+    Ждет перед повтором (Retry-After сервера или full jitter).
+    Возвращает False, если пауза не укладывается в дедлайн - тогда повторять не нужно.
+    """
+    delay = retry_after if retry_after is not None else full_jitter_delay(attempt, base_delay)
+    remaining = deadline_remaining()
+    if remaining is not None and delay >= remaining:
+        return False
+    time.sleep(delay)
+    return True
@@ -0,0 +1,110 @@
+# riot_rate_limiter.py
+# Планировщик запросов к Riot API с учетом лимитов из заголовков X-App-Rate-Limit / X-Method-Rate-Limit
+
+import threading
+import time
+from collections import deque
+
+# Лимиты dev/personal ключа по умолчанию, пока не пришел первый ответ с заголовками
+DEFAULT_APP_RATE_LIMIT = "20:1,100:120"
+
+
+def parse_rate_limit_header(header_value):
+    """'20:1,100:120' -> [(20, 1), (100, 120)] (запросов, секунд)."""
+    windows = []
+    if not header_value: return windows
+    for part in header_value.split(','):
+        try:
+            limit, seconds = part.strip().split(':')
+            windows.append((int(limit), int(seconds)))
+        except ValueError:
+            continue
+    return windows
+
+
+class _RateWindow:
+    """Скользящее окно: не больше limit запросов за последние seconds секунд."""
+
+    def __init__(self, limit, seconds):
+        self.limit = limit
+        self.seconds = seconds
+        self.timestamps = deque()
+
+    def wait_time(self, now):
+        while self.timestamps and self.timestamps[0] <= now - self.seconds:
+            self.timestamps.popleft()
+        if len(self.timestamps) < self.limit: return 0.0
+        return self.timestamps[0] + self.seconds - now
+
+    def record(self, now):
+        self.timestamps.append(now)
+
+
+class RiotRateLimiter:
+    """
+    Потокобезопасный лимитер запросов к Riot API.
+
+    Лимиты ведутся отдельно для каждого региона (хоста): общий лимит приложения и лимит каждого метода.
+    Окна берутся из заголовков ответов и соблюдаются точно (скользящее окно по всем окнам сразу),
+    поэтому потоки могут делать запросы параллельно, не превышая бюджет ключа.
+    """
+
+    def __init__(self, default_app_limit=DEFAULT_APP_RATE_LIMIT, safety_margin=0.05):
+        self.default_app_limit = default_app_limit
+        self.safety_margin = safety_margin  # небольшой запас на рассинхрон часов с сервером
+        self._app_windows = {}     # host -> {(limit, seconds): _RateWindow}
+        self._method_windows = {}  # (host, method) -> {(limit, seconds): _RateWindow}
+        self._blocked_until = {}   # host или (host, method) -> время окончания Retry-After
+        self._cond = threading.Condition()
+
+    def _windows_for(self, host, method):
+        if host not in self._app_windows:
+            self._app_windows[host] = {w: _RateWindow(*w) for w in parse_rate_limit_header(self.default_app_limit)}
+        method_windows = self._method_windows.setdefault((host, method), {})
+        return list(self._app_windows[host].values()) + list(method_windows.values())
+
+    def acquire(self, host, method):
+        """Блокирует поток, пока запрос не укладывается во все окна, и резервирует слот."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                windows = self._windows_for(host, method)
+                wait = max([w.wait_time(now) for w in windows] + [
+                    self._blocked_until.get(host, 0) - now,
+                    self._blocked_until.get((host, method), 0) - now,
+                ])
+                if wait <= 0:
+                    for window in windows: window.record(now)
+                    return
+                self._cond.wait(wait + self.safety_margin)
+
+    def update_from_headers(self, host, method, headers):
+        """Подстраивает окна под фактические лимиты ключа из заголовков ответа."""
+        if headers is None: return
+        with self._cond:
+            self._sync_windows(self._app_windows.setdefault(host, {}), headers.get("X-App-Rate-Limit"))
+            self._sync_windows(self._method_windows.setdefault((host, method), {}), headers.get("X-Method-Rate-Limit"))
+            self._cond.notify_all()
+
+    @staticmethod
+    def _sync_windows(current_windows, header_value):
+        new_limits = parse_rate_limit_header(header_value)
+        if not new_limits or set(new_limits) == set(current_windows): return
+        for key in list(current_windows):
+            if key not in new_limits: del current_windows[key]
+        for limit, seconds in new_limits:
+            if (limit, seconds) not in current_windows:
+                # Новое окно начинаем с уже сделанных запросов самого длинного известного окна
+                window = _RateWindow(limit, seconds)
+                known = max(current_windows.values(), key=lambda w: w.seconds, default=None)
+                if known is not None:
+                    now = time.monotonic()
+                    window.timestamps.extend(t for t in known.timestamps if t > now - seconds)
+                current_windows[(limit, seconds)] = window
+
+    def penalize(self, host, method, retry_after, limit_type=None):
+        """Обработка 429: блокирует регион (лимит приложения) или метод на Retry-After секунд."""
+        with self._cond:
+            key = (host, method) if limit_type == "method" else host
+            self._blocked_until[key] = max(self._blocked_until.get(key, 0), time.monotonic() + retry_after)
+            self._cond.notify_all()
@@ -7,9 +7,20 @@ from datetime import datetime, timedelta, timezone
 import time
 from collections import defaultdict
 import sqlite3
+import hashlib
 # Убедитесь, что database.py находится там, где его можно импортировать
 # Возможно, потребуется from .database import ... если структура проекта изменилась
 from database import get_db_connection, SCRIMS_HEADER
+from log_utils import log_message
+from ttl_cache import TTLCache
+from perf_tracing import traced
+from grid_http_client import GridHttpClient
+from retry_policy import CircuitBreaker, endpoint_group, deadline_exceeded, wait_before_retry, with_ingest_deadline
+from replay_pipeline import ReplayIngestPipeline
+from replay_encoding import (
+    REPLAY_FORMAT_VERSION, REPLAY_TICK_MS, REPLAY_LOD_TICKS_MS,
+    PositionColumns, build_replay_tracks, downsample_replay, slice_replay, encode_replay_payload, replay_from_payload
+)
 import math # Для округления
 
 # --- КОНСТАНТЫ (HLL) ---
@@ -20,6 +31,15 @@ PLAYER_IDS = {"22193": "BW StarScreen", "23093": "BW Elramir", "21143": "BW aliX
 ROSTER_RIOT_NAME_TO_GRID_ID = {"BW StarScreen": "22193", "BW Elramir": "23093", "BW aliX": "21143", "BW Kenal": "20958", "BW Lekcyc": "20510"} # HLL Roster
 PLAYER_ROLES_BY_ID = {"22193": "TOP", "23093": "JUNGLE", "21143": "MIDDLE", "20958": "BOTTOM", "20510": "UTILITY"} # HLL Roles
 API_REQUEST_DELAY = 0.5 # HLL Delay
+SCRIM_DISCOVERY_MAX_DAYS = 40       # Глубже курсор не уходит (прежнее фиксированное окно)
+SCRIM_DISCOVERY_OVERLAP_HOURS = 24  # Перекрытие для поздно появляющихся игр: свежие серии перепроверяются
+SCRIM_SERIES_MAX_ATTEMPTS = 3       # Устоявшаяся серия без игр / с ошибками загрузки перепроверяется столько обновлений
+# Общий клиент GRID API: keep-alive соединения, gzip/br, ETag, таймауты по endpoint
+GRID_HTTP_CLIENT = GridHttpClient()
+# При недоступности группы endpoint запросы к ней сразу отклоняются, а не ждут таймаутов игра за игрой
+GRID_CIRCUIT_BREAKER = CircuitBreaker()
+SERIES_STATE_BATCH_SIZE = 25 # Серий в одном GraphQL-запросе seriesState (с алиасами)
+GRID_INGEST_DEADLINE_SECONDS = int(os.getenv("GRID_INGEST_DEADLINE_SECONDS", str(20 * 60))) # Общий лимит времени одного обновления
 ROLE_ORDER_FOR_SHEET = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
 PLAYER_NAME_MAP = {
 "BW StarScreen":"BW StarScreen",
@@ -30,25 +50,30 @@ PLAYER_NAME_MAP = {
 }
 PLAYER_DISPLAY_ORDER = ["BW StarScreen", "BW Elramir", "BW aliX", "BW Kenal", "BW Lekcyc"]
 
-# --- Логирование ---
-def log_message(message):
-    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
-    print(f"{timestamp} :: {message}")
-
 # --- Функции для работы с GRID API (Без изменений от HLL версии) ---
-def post_graphql_request(query_string, variables, endpoint, retries=3, initial_delay=1):
-    """ Отправляет GraphQL POST запрос с обработкой ошибок и повторами """
+def post_graphql_request(query_string, variables, endpoint, retries=3, initial_delay=1, allow_partial=False):
+    """
+    Отправляет GraphQL POST запрос с обработкой ошибок и повторами (full jitter, circuit breaker, дедлайн загрузки).
+    allow_partial=True - при ошибках в ответе вернуть то, что есть в "data" (для запросов с алиасами).
+    """
     if not GRID_API_KEY:
         log_message("API Key Error: GRID_API_KEY not set.")
         return None
     headers = {"x-api-key": GRID_API_KEY, "Content-Type": "application/json"}
     payload = json.dumps({"query": query_string, "variables": variables})
     url = f"{GRID_BASE_URL}{endpoint}"
+    breaker_key = endpoint_group(endpoint)
     last_exception = None
 
     for attempt in range(retries):
+        if deadline_exceeded(): log_message(f"Ingest deadline exceeded, skipping GraphQL request to {endpoint}."); return None
+        if not GRID_CIRCUIT_BREAKER.allow(breaker_key): log_message(f"Circuit open for '{breaker_key}', skipping GraphQL request."); return None
+        response = None
+        retry_after = None
         try:
-            response = requests.post(url, headers=headers, data=payload, timeout=20)
+            response = GRID_HTTP_CLIENT.post(url, endpoint=endpoint, headers=headers, data=payload)
+            if response.status_code >= 500: GRID_CIRCUIT_BREAKER.record_failure(breaker_key)
+            else: GRID_CIRCUIT_BREAKER.record_success(breaker_key)
             response.raise_for_status()
             response_data = response.json()
             if "errors" in response_data and response_data["errors"]:
@@ -57,38 +82,36 @@ def post_graphql_request(query_string, variables, endpoint, retries=3, initial_d
                 if "UNAUTHENTICATED" in error_msg or "UNAUTHORIZED" in error_msg or "forbidden" in error_msg.lower():
                      log_message(f"GraphQL Auth/Permission Error: {error_msg}. Check API Key/Permissions.")
                      return None
+                if allow_partial and response_data.get("data"): return response_data["data"]
                 last_exception = Exception(f"GraphQL Error: {error_msg}")
-                time.sleep(initial_delay * (2 ** attempt))
-                continue
-            return response_data.get("data")
+            else:
+                return response_data.get("data")
         except requests.exceptions.HTTPError as http_err:
             log_message(f"HTTP error on attempt {attempt + 1}: {http_err}")
             last_exception = http_err
-            if response is not None:
-                if response.status_code == 429:
-                    retry_after = int(response.headers.get("Retry-After", initial_delay * (2 ** attempt)))
-                    log_message(f"Rate limited (429). Retrying after {retry_after} seconds.")
-                    time.sleep(retry_after)
-                    continue
-                elif response.status_code in [401, 403]:
-                    log_message(f"Authorization error ({response.status_code}). Check API Key/Permissions.")
-                    return None
-                elif response.status_code == 400:
-                     try: error_details = response.json(); log_message(f"Bad Request (400) details: {json.dumps(error_details)}")
-                     except json.JSONDecodeError: log_message(f"Bad Request (400), could not decode JSON: {response.text[:500]}")
-                     break # Не повторяем 400 Bad Request
-            if response is None or 500 <= response.status_code < 600: # Повторяем серверные ошибки
-                 time.sleep(initial_delay * (2 ** attempt))
-            else: break # Не повторяем другие клиентские ошибки
-        except requests.exceptions.RequestException as req_err: log_message(f"Request exception on attempt {attempt + 1}: {req_err}"); last_exception = req_err; time.sleep(initial_delay * (2 ** attempt))
-        except json.JSONDecodeError as json_err: log_message(f"JSON decode error attempt {attempt+1}: {json_err}. Response: {response.text[:200] if response else 'N/A'}"); last_exception = json_err; time.sleep(initial_delay * (2 ** attempt))
-        except Exception as e: import traceback; log_message(f"Unexpected error in post_graphql attempt {attempt + 1}: {e}\n{traceback.format_exc()}"); last_exception = e; time.sleep(initial_delay * (2 ** attempt))
-
-    log_message(f"GraphQL request failed after {retries} attempts. Last error: {last_exception}")
+            if response.status_code == 429:
+                retry_after = int(response.headers.get("Retry-After", initial_delay * (2 ** attempt)))
+                log_message(f"Rate limited (429). Retrying after {retry_after} seconds.")
+            elif response.status_code in [401, 403]:
+                log_message(f"Authorization error ({response.status_code}). Check API Key/Permissions.")
+                return None
+            elif response.status_code == 400:
+                 try: error_details = response.json(); log_message(f"Bad Request (400) details: {json.dumps(error_details)}")
+                 except json.JSONDecodeError: log_message(f"Bad Request (400), could not decode JSON: {response.text[:500]}")
+                 break # Не повторяем 400 Bad Request
+            elif response.status_code < 500: break # Не повторяем другие клиентские ошибки
+        except requests.exceptions.RequestException as req_err: log_message(f"Request exception on attempt {attempt + 1}: {req_err}"); last_exception = req_err; GRID_CIRCUIT_BREAKER.record_failure(breaker_key)
+        except json.JSONDecodeError as json_err: log_message(f"JSON decode error attempt {attempt+1}: {json_err}. Response: {response.text[:200] if response is not None else 'N/A'}"); last_exception = json_err
+        except Exception as e: import traceback; log_message(f"Unexpected error in post_graphql attempt {attempt + 1}: {e}\n{traceback.format_exc()}"); last_exception = e
+
+        if attempt + 1 < retries and not wait_before_retry(attempt, initial_delay, retry_after):
+            log_message(f"Ingest deadline too close to retry GraphQL request to {endpoint}."); break
+
+    log_message(f"GraphQL request failed after {attempt + 1} attempt(s). Last error: {last_exception}")
     return None
 
 def get_rest_request(endpoint, retries=5, initial_delay=2, expected_type='json'):
-    """ Отправляет REST GET запрос с обработкой ошибок и повторами """
+    """ Отправляет REST GET запрос с обработкой ошибок и повторами (full jitter, circuit breaker, дедлайн загрузки) """
     if not GRID_API_KEY:
         log_message("API Key Error: GRID_API_KEY not set.")
         return None
@@ -96,11 +119,17 @@ def get_rest_request(endpoint, retries=5, initial_delay=2, expected_type='json')
     if expected_type == 'json': headers['Accept'] = 'application/json'
 
     url = f"{GRID_BASE_URL}{endpoint}"
+    breaker_key = endpoint_group(endpoint)
     last_exception = None
 
     for attempt in range(retries):
+        if deadline_exceeded(): log_message(f"Ingest deadline exceeded, skipping GET {endpoint}."); return None
+        if not GRID_CIRCUIT_BREAKER.allow(breaker_key): log_message(f"Circuit open for '{breaker_key}', skipping GET {endpoint}."); return None
+        retry_after = None
         try:
-            response = requests.get(url, headers=headers, timeout=15) # Таймаут 15 секунд
+            response = GRID_HTTP_CLIENT.get(url, endpoint=endpoint, headers=headers) # Таймаут задается по endpoint
+            if response.status_code >= 500: GRID_CIRCUIT_BREAKER.record_failure(breaker_key)
+            else: GRID_CIRCUIT_BREAKER.record_success(breaker_key)
             if response.status_code == 200:
                 if expected_type == 'json':
                     try: return response.json()
@@ -109,29 +138,38 @@ def get_rest_request(endpoint, retries=5, initial_delay=2, expected_type='json')
             elif response.status_code == 429:
                 retry_after = int(response.headers.get("Retry-After", initial_delay * (2 ** attempt)))
                 log_message(f"Rate limited (429). Retrying after {retry_after} seconds.")
-                time.sleep(retry_after); last_exception = requests.exceptions.HTTPError(f"429 Too Many Requests"); continue
+                last_exception = requests.exceptions.HTTPError(f"429 Too Many Requests")
             elif response.status_code == 404: log_message(f"Resource not found (404) at {endpoint}"); last_exception = requests.exceptions.HTTPError(f"404 Not Found"); return None # Не найдено - не повторяем
             elif response.status_code in [401, 403]: error_msg = f"Auth error ({response.status_code}) for {endpoint}. Check API Key."; log_message(error_msg); last_exception = requests.exceptions.HTTPError(f"{response.status_code} Unauthorized/Forbidden"); return None # Ошибка доступа - не повторяем
             else: response.raise_for_status() # Вызовет HTTPError для других кодов 4xx/5xx
-        except requests.exceptions.HTTPError as http_err: log_message(f"HTTP error attempt {attempt + 1}: {http_err}"); last_exception = http_err; time.sleep(initial_delay * (2 ** attempt)) # Повторяем серверные ошибки
-        except requests.exceptions.RequestException as req_err: log_message(f"Request exception attempt {attempt + 1}: {req_err}"); last_exception = req_err; time.sleep(initial_delay * (2 ** attempt)) # Повторяем ошибки сети
-        except Exception as e: log_message(f"Unexpected error attempt {attempt + 1}: {e}"); last_exception = e; time.sleep(initial_delay * (2 ** attempt)) # Повторяем другие ошибки
+        except requests.exceptions.HTTPError as http_err: log_message(f"HTTP error attempt {attempt + 1}: {http_err}"); last_exception = http_err # Повторяем серверные ошибки
+        except requests.exceptions.RequestException as req_err: log_message(f"Request exception attempt {attempt + 1}: {req_err}"); last_exception = req_err; GRID_CIRCUIT_BREAKER.record_failure(breaker_key) # Повторяем ошибки сети
+        except Exception as e: log_message(f"Unexpected error attempt {attempt + 1}: {e}"); last_exception = e # Повторяем другие ошибки
 
-    log_message(f"REST GET failed after {retries} attempts for {endpoint}. Last error: {last_exception}")
+        if attempt + 1 < retries and not wait_before_retry(attempt, initial_delay, retry_after):
+            log_message(f"Ingest deadline too close to retry GET {endpoint}."); break
+
+    log_message(f"REST GET failed after {attempt + 1} attempt(s) for {endpoint}. Last error: {last_exception}")
     return None
 
-def get_all_series(days_ago=40):
-    """ Получает список ID и дат начала LoL скримов за последние N дней """
+def get_all_series(days_ago=40, start_time_gte=None):
+    """ Получает список ID и дат начала LoL скримов за последние N дней (или начиная с start_time_gte, ISO UTC) """
+    return list_series_since(start_time_gte or (datetime.now(timezone.utc) - timedelta(days=days_ago)).strftime("%Y-%m-%dT%H:%M:%SZ"))[0]
+
+def list_series_since(start_thresh):
+    """
+    Скримы с startTimeScheduled >= start_thresh, новые первыми.
+    Возвращает (series_nodes, complete): complete=False, если список оборвался (ошибка страницы или лимит страниц).
+    """
     query_string = """
         query ($filter: SeriesFilter, $first: Int, $after: Cursor, $orderBy: SeriesOrderBy, $orderDirection: OrderDirection) {
           allSeries( filter: $filter, first: $first, after: $after, orderBy: $orderBy, orderDirection: $orderDirection ) {
             totalCount, pageInfo { hasNextPage, endCursor }, edges { node { id, startTimeScheduled } } } }
     """
-    start_thresh = (datetime.now(timezone.utc) - timedelta(days=days_ago)).strftime("%Y-%m-%dT%H:%M:%SZ")
     variables_template = { "filter": {"titleId": 3, "types": ["SCRIM"], "startTimeScheduled": {"gte": start_thresh}}, "first": 50, "orderBy": "StartTimeScheduled", "orderDirection": "DESC" }
-    all_nodes = []; cursor = None; page_num = 1; max_pages = 20
+    all_nodes = []; cursor = None; page_num = 1; max_pages = 20; complete = False
 
-    log_message(f"Fetching series from the last {days_ago} days...")
+    log_message(f"Fetching series scheduled since {start_thresh}...")
     while page_num <= max_pages:
         current_variables = variables_template.copy()
         if cursor: current_variables["after"] = cursor
@@ -143,14 +181,48 @@ def get_all_series(days_ago=40):
         series_data = response_data.get("allSeries", {}); edges = series_data.get("edges", [])
         nodes = [edge["node"] for edge in edges if "node" in edge]; all_nodes.extend(nodes)
         page_info = series_data.get("pageInfo", {}); has_next_page = page_info.get("hasNextPage", False); cursor = page_info.get("endCursor")
-        if not has_next_page or not cursor: break
+        if not has_next_page or not cursor: complete = True; break
         page_num += 1; time.sleep(API_REQUEST_DELAY)
 
-    log_message(f"Finished fetching series. Total series found: {len(all_nodes)}")
-    return all_nodes
+    log_message(f"Finished fetching series. Total series found: {len(all_nodes)}{'' if complete else ' (listing incomplete)'}")
+    return all_nodes, complete
+
+# --- Курсор инкрементальной загрузки серий (таблицы ingest_cursors / ingested_series) ---
+def parse_grid_datetime(value):
+    """'2024-05-01T12:00:00Z' / '...+00:00' / с миллисекундами -> aware datetime (UTC) или None."""
+    if not value: return None
+    try: return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc)
+    except (ValueError, AttributeError): return None
+
+def get_ingest_cursor(cursor, source):
+    """Возвращает (последний startTimeScheduled как datetime или None, set ID полностью загруженных серий)."""
+    cursor.execute("SELECT last_start_time FROM ingest_cursors WHERE source = ?", (source,))
+    row = cursor.fetchone()
+    cursor.execute("SELECT series_id FROM ingested_series WHERE source = ?", (source,))
+    return parse_grid_datetime(row['last_start_time']) if row else None, {r['series_id'] for r in cursor.fetchall()}
+
+def save_ingest_cursor(cursor, source, last_start_dt):
+    cursor.execute("INSERT OR REPLACE INTO ingest_cursors (source, last_start_time, updated_at) VALUES (?, ?, ?)",
+                   (source, last_start_dt.strftime("%Y-%m-%dT%H:%M:%SZ"), int(time.time())))
+
+def mark_series_ingested(cursor, source, series_id, start_time):
+    cursor.execute("INSERT OR REPLACE INTO ingested_series (source, series_id, start_time, ingested_at) VALUES (?, ?, ?, ?)",
+                   (source, series_id, start_time, int(time.time())))
+
+def record_series_failure(cursor, source, series_id, start_time):
+    """Засчитывает неудачную попытку загрузки серии. Возвращает число попыток с учетом этой."""
+    cursor.execute("""
+        INSERT INTO series_ingest_failures (source, series_id, start_time, attempts, last_attempt_at) VALUES (?, ?, ?, 1, ?)
+        ON CONFLICT(source, series_id) DO UPDATE SET attempts = attempts + 1, last_attempt_at = excluded.last_attempt_at
+    """, (source, series_id, start_time, int(time.time())))
+    cursor.execute("SELECT attempts FROM series_ingest_failures WHERE source = ? AND series_id = ?", (source, series_id))
+    return cursor.fetchone()['attempts']
+
+def clear_series_failures(cursor, source, series_id):
+    cursor.execute("DELETE FROM series_ingest_failures WHERE source = ? AND series_id = ?", (source, series_id))
 
 def get_series_state(series_id):
-    """ Получает список игр (id, sequenceNumber) для заданной серии """
+    """ Получает список игр (id, sequenceNumber) для заданной серии ([] - игр нет, None - запрос не удался) """
     query_template = """ query GetSeriesGames($seriesId: ID!) { seriesState ( id: $seriesId ) { id, games { id, sequenceNumber } } } """
     variables = {"seriesId": series_id}
     response_data = post_graphql_request(query_string=query_template, variables=variables, endpoint="live-data-feed/series-state/graphql")
@@ -160,7 +232,47 @@ def get_series_state(series_id):
         if games is None: log_message(f"Series {series_id} found, but games list is null."); return []
         return games
     elif response_data and not response_data.get("seriesState"): log_message(f"No seriesState found for series {series_id}."); return []
-    else: log_message(f"Failed to get games for series {series_id}."); return []
+    else: log_message(f"Failed to get games for series {series_id}."); return None
+
+def get_series_states_batch(series_ids, chunk_size=SERIES_STATE_BATCH_SIZE):
+    """
+    Список игр для нескольких серий: одна GraphQL-операция на chunk_size серий
+    (s0: seriesState(id: $id0) ...). Если запрос не прошел (например, из-за лимита сложности),
+    пачка делится пополам. Возвращает {series_id: [games]}, как get_series_state: [] - сервер ответил,
+    что игр нет; None - ответа не получено (ошибка, открытый circuit breaker, дедлайн).
+    """
+    series_states = {}
+    series_ids = list(dict.fromkeys(series_id for series_id in series_ids if series_id))
+    pending_chunks = [series_ids[i:i + chunk_size] for i in range(0, len(series_ids), chunk_size)]
+    requests_count = 0
+    while pending_chunks:
+        chunk = pending_chunks.pop(0)
+        variable_defs = ", ".join(f"$id{i}: ID!" for i in range(len(chunk)))
+        selections = " ".join(f"s{i}: seriesState(id: $id{i}) {{ id, games {{ id, sequenceNumber }} }}" for i in range(len(chunk)))
+        query_string = f"query GetSeriesGamesBatch({variable_defs}) {{ {selections} }}"
+        variables = {f"id{i}": series_id for i, series_id in enumerate(chunk)}
+        response_data = post_graphql_request(query_string, variables, "live-data-feed/series-state/graphql", allow_partial=True)
+        requests_count += 1
+
+        if response_data is None:
+            if len(chunk) > 1 and not deadline_exceeded():
+                half = len(chunk) // 2
+                log_message(f"Series state batch of {len(chunk)} failed, retrying as {half} + {len(chunk) - half}.")
+                pending_chunks[:0] = [chunk[:half], chunk[half:]]
+            else:
+                for series_id in chunk:
+                    log_message(f"Failed to get games for series {series_id}.")
+                    series_states[series_id] = None
+            continue
+
+        for i, series_id in enumerate(chunk):
+            series_state = response_data.get(f"s{i}")
+            if not series_state: log_message(f"No seriesState found for series {series_id}."); series_states[series_id] = []
+            elif series_state.get("games") is None: log_message(f"Series {series_id} found, but games list is null."); series_states[series_id] = []
+            else: series_states[series_id] = series_state["games"]
+
+    log_message(f"Fetched series states for {len(series_ids)} series in {requests_count} request(s).")
+    return series_states
 
 def download_riot_summary_data(series_id, sequence_number):
     """ Скачивает Riot Summary JSON для конкретной игры """
@@ -217,19 +329,33 @@ def extract_team_tag(riot_id_game_name):
     return None
 
 # --- Функция обновления и сохранения данных скримов в SQLite (Без изменений от HLL) ---
+@with_ingest_deadline(GRID_INGEST_DEADLINE_SECONDS)
 def fetch_and_store_scrims():
     log_message("Starting scrims update process...")
-    series_list = get_all_series(days_ago=40)
-    if not series_list: 
-        log_message("No recent series found.")
-        return 0
-
     conn = get_db_connection()
     if not conn: 
         log_message("DB Connection failed for scrim update.")
         return -1 
     cursor = conn.cursor()
 
+    # Запрашиваем только серии новее курсора (с перекрытием), полностью загруженные серии пропускаем
+    now_utc = datetime.now(timezone.utc)
+    discovery_floor = now_utc - timedelta(days=SCRIM_DISCOVERY_MAX_DAYS)
+    try:
+        last_start_dt, ingested_series_ids = get_ingest_cursor(cursor, "scrims")
+    except sqlite3.Error as e:
+        log_message(f"Error reading scrims ingest cursor: {e}. Falling back to the full {SCRIM_DISCOVERY_MAX_DAYS}-day window.")
+        last_start_dt, ingested_series_ids = None, set()
+    since_dt = discovery_floor
+    if last_start_dt: since_dt = max(discovery_floor, last_start_dt - timedelta(hours=SCRIM_DISCOVERY_OVERLAP_HOURS))
+    listed_series, listing_complete = list_series_since(since_dt.strftime("%Y-%m-%dT%H:%M:%SZ"))
+    series_list = [series for series in listed_series if series.get("id") and series["id"] not in ingested_series_ids]
+    log_message(f"{len(series_list)} of {len(listed_series)} listed series need processing (cursor: {last_start_dt}).")
+    if not series_list: 
+        log_message("No new series found.")
+        conn.close()
+        return 0
+
     try:
         cursor.execute("SELECT Game_ID FROM scrims")
         existing_game_ids = {row['Game_ID'] for row in cursor.fetchall()}
@@ -248,206 +374,269 @@ def fetch_and_store_scrims():
     sql_placeholders = ", ".join(["?"] * len(sql_column_names))
     insert_sql = f"INSERT OR IGNORE INTO scrims ({columns_string}) VALUES ({sql_placeholders})"
 
-    for series_summary in series_list:
-        processed_series_count += 1
-        if processed_series_count % 10 == 0:
-            log_message(f"Processing series {processed_series_count}/{total_series}...")
-
+    # Игры всех серий одним пакетом GraphQL-запросов вместо запроса на каждую серию
+    series_games = get_series_states_batch([series_summary.get("id") for series_summary in series_list])
+
+    # Для курсора: самые новые полностью обработанные серии и самые старые необработанные
+    settled_before = now_utc - timedelta(hours=SCRIM_DISCOVERY_OVERLAP_HOURS)
+    complete_start_dts = []
+    incomplete_start_dts = []
+    if not listing_complete and listed_series:
+        # Список обрезан: более старые серии не получены, курсор не должен уйти дальше самой старой из полученных
+        incomplete_start_dts.append(parse_grid_datetime(listed_series[-1].get("startTimeScheduled")))
+
+    def give_up_on_series(series_summary, reason):
+        """
+        Засчитывает неудачную попытку по устоявшейся серии. После SCRIM_SERIES_MAX_ATTEMPTS серия
+        (отмененная, без игр или с постоянно падающей загрузкой игр) помечается загруженной и больше не держит курсор.
+        Неудавшийся запрос seriesState попыткой не считается: при сбое GRID серии просто ждут следующего обновления.
+        """
         series_id = series_summary.get("id")
-        if not series_id: continue
-
-        games_in_series = get_series_state(series_id)
-        if not games_in_series: 
-            time.sleep(API_REQUEST_DELAY / 2)
-            continue
-
-        for game_info in games_in_series:
-            game_id = game_info.get("id")
-            sequence_number = game_info.get("sequenceNumber")
-            if not game_id or sequence_number is None: continue
-            if game_id in existing_game_ids: continue
-
-            summary_data = download_riot_summary_data(series_id, sequence_number)
-            if not summary_data: 
-                time.sleep(API_REQUEST_DELAY)
+        attempts = record_series_failure(cursor, "scrims", series_id, series_summary.get("startTimeScheduled"))
+        if attempts < SCRIM_SERIES_MAX_ATTEMPTS:
+            conn.commit()
+            return False
+        log_message(f"Series {series_id} ({reason}) still incomplete after {attempts} attempts, no longer retrying.")
+        mark_series_ingested(cursor, "scrims", series_id, series_summary.get("startTimeScheduled"))
+        clear_series_failures(cursor, "scrims", series_id)
+        complete_start_dts.append(parse_grid_datetime(series_summary.get("startTimeScheduled")))
+        conn.commit()
+        return True
+
+    # Реплеи: скачиваются здесь, разбираются в пуле процессов, в БД пишутся отдельным потоком по порядку
+    with ReplayIngestPipeline(parse_replay_timeline, save_parsed_replay) as replay_pipeline:
+        for series_summary in series_list:
+            series_id = series_summary.get("id")
+            series_start_dt = parse_grid_datetime(series_summary.get("startTimeScheduled"))
+            if deadline_exceeded():
+                log_message(f"Ingest deadline reached after {processed_series_count}/{total_series} series. Remaining series will be picked up next update.")
+                incomplete_start_dts.extend(parse_grid_datetime(s.get("startTimeScheduled")) for s in series_list[processed_series_count:])
+                break
+            processed_series_count += 1
+            if processed_series_count % 10 == 0:
+                log_message(f"Processing series {processed_series_count}/{total_series}...")
+
+            series_complete = True
+            games_in_series = series_games.get(series_id)
+            if games_in_series is None:
+                # seriesState не получен (сбой GRID) - перепроверим, попытка не засчитывается
+                incomplete_start_dts.append(series_start_dt)
+                continue
+            if not games_in_series:
+                # Игр еще нет - перепроверим (устоявшуюся серию - не больше SCRIM_SERIES_MAX_ATTEMPTS раз)
+                series_settled = series_start_dt and series_start_dt <= settled_before
+                if series_settled and give_up_on_series(series_summary, "no games"): continue
+                incomplete_start_dts.append(series_start_dt)
                 continue
 
-            try:
-                participants = summary_data.get("participants", [])
-                teams_data = summary_data.get("teams", [])
-                if not participants or len(participants) != 10 or not teams_data or len(teams_data) != 2: 
+            for game_info in games_in_series:
+                game_id = game_info.get("id")
+                sequence_number = game_info.get("sequenceNumber")
+                if not game_id or sequence_number is None: continue
+                if game_id in existing_game_ids: continue
+
+                summary_data = download_riot_summary_data(series_id, sequence_number)
+                if not summary_data: 
+                    series_complete = False
+                    time.sleep(API_REQUEST_DELAY)
                     continue
 
-                our_side = None
-                our_team_id = None
-                for idx, p in enumerate(participants):
-                    normalized_name = normalize_player_name(p.get("riotIdGameName"))
-                    if normalized_name in ROSTER_RIOT_NAME_TO_GRID_ID:
-                        current_side = 'blue' if idx < 5 else 'red'
-                        current_team_id = 100 if idx < 5 else 200
-                        if our_side is None: 
-                            our_side = current_side
-                            our_team_id = current_team_id
-                        elif our_side != current_side: 
-                            log_message(f"Warn: Players on both sides! G:{game_id}")
-                            break
-                if our_side is None: continue
-
-                opponent_team_name = "Opponent"
-                opponent_tags = defaultdict(int)
-                opponent_indices = range(5, 10) if our_side == 'blue' else range(0, 5)
-                for idx in opponent_indices:
-                    if idx < len(participants): 
-                        tag = extract_team_tag(participants[idx].get("riotIdGameName"))
-                        if tag: opponent_tags[tag] += 1
+                try:
+                    participants = summary_data.get("participants", [])
+                    teams_data = summary_data.get("teams", [])
+                    if not participants or len(participants) != 10 or not teams_data or len(teams_data) != 2: 
+                        continue
+
+                    our_side = None
+                    our_team_id = None
+                    for idx, p in enumerate(participants):
+                        normalized_name = normalize_player_name(p.get("riotIdGameName"))
+                        if normalized_name in ROSTER_RIOT_NAME_TO_GRID_ID:
+                            current_side = 'blue' if idx < 5 else 'red'
+                            current_team_id = 100 if idx < 5 else 200
+                            if our_side is None: 
+                                our_side = current_side
+                                our_team_id = current_team_id
+                            elif our_side != current_side: 
+                                log_message(f"Warn: Players on both sides! G:{game_id}")
+                                break
+                    if our_side is None: continue
+
+                    opponent_team_name = "Opponent"
+                    opponent_tags = defaultdict(int)
+                    opponent_indices = range(5, 10) if our_side == 'blue' else range(0, 5)
+                    for idx in opponent_indices:
+                        if idx < len(participants): 
+                            tag = extract_team_tag(participants[idx].get("riotIdGameName"))
+                            if tag: opponent_tags[tag] += 1
                 
-                if opponent_tags: 
-                    sorted_tags = sorted(opponent_tags.items(), key=lambda item: item[1], reverse=True)
-                    opponent_team_name = sorted_tags[0][0] if sorted_tags[0][1] >= 3 else "Opponent"
+                    if opponent_tags: 
+                        sorted_tags = sorted(opponent_tags.items(), key=lambda item: item[1], reverse=True)
+                        opponent_team_name = sorted_tags[0][0] if sorted_tags[0][1] >= 3 else "Opponent"
                 
-                blue_team_name = TEAM_NAME if our_side == 'blue' else opponent_team_name
-                red_team_name = TEAM_NAME if our_side == 'red' else opponent_team_name
-
-                result = "Unknown"
-                for team_summary in teams_data:
-                    if team_summary.get("teamId") == our_team_id: 
-                        win_status = team_summary.get("win")
-                        result = "Win" if win_status is True else "Loss" if win_status is False else "Unknown"
-                        break
-
-                blue_bans = ["N/A"] * 5
-                red_bans = ["N/A"] * 5
-                for team in teams_data:
-                    target_bans = blue_bans if team.get("teamId") == 100 else red_bans
-                    bans_list = sorted(team.get("bans", []), key=lambda x: x.get('pickTurn', 99))
-                    for i, ban in enumerate(bans_list[:5]): 
-                        target_bans[i] = str(c_id) if (c_id := ban.get("championId", -1)) != -1 else "N/A"
-
-                game_creation_timestamp = summary_data.get("gameCreation")
-                date_str = "N/A"
-                if game_creation_timestamp:
-                    try: 
-                        dt_obj = datetime.fromtimestamp(game_creation_timestamp/1000, timezone.utc)
-                        date_str = dt_obj.strftime("%Y-%m-%d %H:%M:%S")
-                    except Exception: pass
-
-                game_duration_sec = summary_data.get("gameDuration", 0)
-                duration_str = "N/A"
-                if game_duration_sec > 0:
-                    minutes, seconds = divmod(int(game_duration_sec), 60)
-                    duration_str = f"{minutes}:{seconds:02d}"
-
-                game_version = summary_data.get("gameVersion", "N/A")
-                patch_str = "N/A"
-                if game_version != "N/A": 
-                    parts = game_version.split('.')
-                    patch_str = f"{parts[0]}.{parts[1]}" if len(parts) >= 2 else game_version
-
-                row_dict = {sql_col: "N/A" for sql_col in sql_column_names}
-                row_dict["Date"] = date_str
-                row_dict["Patch"] = patch_str
-                row_dict["Blue_Team_Name"] = blue_team_name
-                row_dict["Red_Team_Name"] = red_team_name
-                row_dict["Duration"] = duration_str
-                row_dict["Result"] = result
-                row_dict["Game_ID"] = game_id
-                for i in range(5): 
-                    row_dict[f"Blue_Ban_{i+1}_ID"] = blue_bans[i]
-                    row_dict[f"Red_Ban_{i+1}_ID"] = red_bans[i]
-
-                role_to_abbr = {"TOP": "TOP", "JUNGLE": "JGL", "MIDDLE": "MID", "BOTTOM": "BOT", "UTILITY": "SUP"}
-                for idx, p in enumerate(participants):
-                    role_name = ROLE_ORDER_FOR_SHEET[idx % 5]
-                    side_prefix = "Blue" if idx < 5 else "Red"
-                    role_abbr = role_to_abbr.get(role_name)
-                    player_col_prefix = f"{side_prefix}_{role_abbr}"
-                    if not role_abbr: continue
-
-                    row_dict[f"{player_col_prefix}_Player"] = normalize_player_name(p.get("riotIdGameName")) or "Unknown"
-                    row_dict[f"{player_col_prefix}_Champ"] = p.get("championName", "N/A")
-                    row_dict[f"{player_col_prefix}_K"] = p.get('kills', 0)
-                    row_dict[f"{player_col_prefix}_D"] = p.get('deaths', 0)
-                    row_dict[f"{player_col_prefix}_A"] = p.get('assists', 0)
-                    row_dict[f"{player_col_prefix}_Dmg"] = p.get('totalDamageDealtToChampions', 0)
-                    row_dict[f"{player_col_prefix}_CS"] = p.get('totalMinionsKilled', 0) + p.get('neutralMinionsKilled', 0)
+                    blue_team_name = TEAM_NAME if our_side == 'blue' else opponent_team_name
+                    red_team_name = TEAM_NAME if our_side == 'red' else opponent_team_name
+
+                    result = "Unknown"
+                    for team_summary in teams_data:
+                        if team_summary.get("teamId") == our_team_id: 
+                            win_status = team_summary.get("win")
+                            result = "Win" if win_status is True else "Loss" if win_status is False else "Unknown"
+                            break
+
+                    blue_bans = ["N/A"] * 5
+                    red_bans = ["N/A"] * 5
+                    for team in teams_data:
+                        target_bans = blue_bans if team.get("teamId") == 100 else red_bans
+                        bans_list = sorted(team.get("bans", []), key=lambda x: x.get('pickTurn', 99))
+                        for i, ban in enumerate(bans_list[:5]): 
+                            target_bans[i] = str(c_id) if (c_id := ban.get("championId", -1)) != -1 else "N/A"
+
+                    game_creation_timestamp = summary_data.get("gameCreation")
+                    date_str = "N/A"
+                    if game_creation_timestamp:
+                        try: 
+                            dt_obj = datetime.fromtimestamp(game_creation_timestamp/1000, timezone.utc)
+                            date_str = dt_obj.strftime("%Y-%m-%d %H:%M:%S")
+                        except Exception: pass
+
+                    game_duration_sec = summary_data.get("gameDuration", 0)
+                    duration_str = "N/A"
+                    if game_duration_sec > 0:
+                        minutes, seconds = divmod(int(game_duration_sec), 60)
+                        duration_str = f"{minutes}:{seconds:02d}"
+
+                    game_version = summary_data.get("gameVersion", "N/A")
+                    patch_str = "N/A"
+                    if game_version != "N/A": 
+                        parts = game_version.split('.')
+                        patch_str = f"{parts[0]}.{parts[1]}" if len(parts) >= 2 else game_version
+
+                    row_dict = {sql_col: "N/A" for sql_col in sql_column_names}
+                    row_dict["Date"] = date_str
+                    row_dict["Patch"] = patch_str
+                    row_dict["Blue_Team_Name"] = blue_team_name
+                    row_dict["Red_Team_Name"] = red_team_name
+                    row_dict["Duration"] = duration_str
+                    row_dict["Result"] = result
+                    row_dict["Game_ID"] = game_id
+                    for i in range(5): 
+                        row_dict[f"Blue_Ban_{i+1}_ID"] = blue_bans[i]
+                        row_dict[f"Red_Ban_{i+1}_ID"] = red_bans[i]
+
+                    role_to_abbr = {"TOP": "TOP", "JUNGLE": "JGL", "MIDDLE": "MID", "BOTTOM": "BOT", "UTILITY": "SUP"}
+                    for idx, p in enumerate(participants):
+                        role_name = ROLE_ORDER_FOR_SHEET[idx % 5]
+                        side_prefix = "Blue" if idx < 5 else "Red"
+                        role_abbr = role_to_abbr.get(role_name)
+                        player_col_prefix = f"{side_prefix}_{role_abbr}"
+                        if not role_abbr: continue
+
+                        row_dict[f"{player_col_prefix}_Player"] = normalize_player_name(p.get("riotIdGameName")) or "Unknown"
+                        row_dict[f"{player_col_prefix}_Champ"] = p.get("championName", "N/A")
+                        row_dict[f"{player_col_prefix}_K"] = p.get('kills', 0)
+                        row_dict[f"{player_col_prefix}_D"] = p.get('deaths', 0)
+                        row_dict[f"{player_col_prefix}_A"] = p.get('assists', 0)
+                        row_dict[f"{player_col_prefix}_Dmg"] = p.get('totalDamageDealtToChampions', 0)
+                        row_dict[f"{player_col_prefix}_CS"] = p.get('totalMinionsKilled', 0) + p.get('neutralMinionsKilled', 0)
                     
-                    items = [str(p.get(f"item{i}", 0)) for i in range(7) if p.get(f"item{i}", 0) != 0]
-                    row_dict[f"{player_col_prefix}_Items"] = ",".join(items)
-
-                    all_runes = []
-                    perks = p.get("perks", {})
-                    for style in perks.get("styles", []):
-                        for sel in style.get("selections", []):
-                            if (pid := sel.get("perk", 0)) != 0: all_runes.append(str(pid))
+                        items = [str(p.get(f"item{i}", 0)) for i in range(7) if p.get(f"item{i}", 0) != 0]
+                        row_dict[f"{player_col_prefix}_Items"] = ",".join(items)
+
+                        all_runes = []
+                        perks = p.get("perks", {})
+                        for style in perks.get("styles", []):
+                            for sel in style.get("selections", []):
+                                if (pid := sel.get("perk", 0)) != 0: all_runes.append(str(pid))
                     
-                    sp = perks.get("statPerks", {})
-                    for sk in ['offense', 'flex', 'defense']:
-                        if (sid := sp.get(sk, 0)) != 0: all_runes.append(str(sid))
+                        sp = perks.get("statPerks", {})
+                        for sk in ['offense', 'flex', 'defense']:
+                            if (sid := sp.get(sk, 0)) != 0: all_runes.append(str(sid))
                     
-                    row_dict[f"{player_col_prefix}_Runes"] = ",".join(all_runes) if all_runes else "0"
-                    row_dict[f"{player_col_prefix}_Gold"] = p.get('goldEarned', 0)
+                        row_dict[f"{player_col_prefix}_Runes"] = ",".join(all_runes) if all_runes else "0"
+                        row_dict[f"{player_col_prefix}_Gold"] = p.get('goldEarned', 0)
 
-                data_tuple = tuple(row_dict.get(sql_col, "N/A") for sql_col in sql_column_names)
+                    data_tuple = tuple(row_dict.get(sql_col, "N/A") for sql_col in sql_column_names)
                 
-                # Сохраняем основную информацию об игре
-                cursor.execute(insert_sql, data_tuple)
+                    # Сохраняем основную информацию об игре
+                    cursor.execute(insert_sql, data_tuple)
                 
-                if cursor.rowcount > 0:
-                    added_count += 1
-                    existing_game_ids.add(game_id)
+                    if cursor.rowcount > 0:
+                        added_count += 1
+                        existing_game_ids.add(game_id)
                     
-                    # !!! КРИТИЧЕСКОЕ ИЗМЕНЕНИЕ: 
-                    # Сначала подтверждаем запись в таблицу scrims и закрываем транзакцию,
-                    # чтобы освободить базу для функции process_replay_to_db.
-                    conn.commit() 
+                        # !!! КРИТИЧЕСКОЕ ИЗМЕНЕНИЕ: 
+                        # Сначала подтверждаем запись в таблицу scrims и закрываем транзакцию,
+                        # чтобы освободить базу для потока-писателя реплеев.
+                        conn.commit() 
                     
-                    log_message(f"New game {game_id} added. Fetching timeline...")
-                    timeline_data = download_riot_livestats_data(series_id, sequence_number)
+                        log_message(f"New game {game_id} added. Fetching timeline...")
+                        timeline_data = download_riot_livestats_data(series_id, sequence_number)
                     
-                    if timeline_data:
-                        # Теперь process_replay_to_db сможет открыть свое соединение без ошибок
-                        process_replay_to_db(game_id, timeline_data, summary_data)
-                        log_message(f"Replay data stored for {game_id}")
-                    else:
-                        log_message(f"Warning: Timeline data not available for {game_id}")
-
-            except Exception as e:
-                log_message(f"Parse/Process fail G:{game_id}: {e}")
-                import traceback
-                log_message(traceback.format_exc())
-                continue
-            finally: 
-                time.sleep(API_REQUEST_DELAY / 4)
+                        if timeline_data:
+                            # Разбор и запись идут в конвейере, пока здесь скачивается следующая игра
+                            replay_pipeline.submit(game_id, game_id, timeline_data, replay_participant_info(summary_data))
+                            log_message(f"Replay for {game_id} queued for processing")
+                        else:
+                            log_message(f"Warning: Timeline data not available for {game_id}")
+
+                except Exception as e:
+                    log_message(f"Parse/Process fail G:{game_id}: {e}")
+                    import traceback
+                    log_message(traceback.format_exc())
+                    series_complete = False
+                    continue
+                finally: 
+                    time.sleep(API_REQUEST_DELAY / 4)
+
+            series_settled = series_start_dt and series_start_dt <= settled_before
+            if series_complete:
+                complete_start_dts.append(series_start_dt)
+                # Серии из окна перекрытия еще могут получить игры - помечаем только "устоявшиеся"
+                if series_settled:
+                    mark_series_ingested(cursor, "scrims", series_id, series_summary.get("startTimeScheduled"))
+                    clear_series_failures(cursor, "scrims", series_id)
+            elif not (series_settled and give_up_on_series(series_summary, "failed games")):
+                incomplete_start_dts.append(series_start_dt)
+
+            # После каждой серии тоже делаем коммит
+            conn.commit() 
+            time.sleep(API_REQUEST_DELAY / 2)
+
+        log_message(f"Waiting for {replay_pipeline.pending()} queued replay(s) to be stored...")
+    log_message(f"Replay pipeline finished: {replay_pipeline.written} stored, {replay_pipeline.failed} failed.")
 
-        # После каждой серии тоже делаем коммит
-        conn.commit() 
-        time.sleep(API_REQUEST_DELAY / 2)
+    # Курсор: самая новая обработанная серия, но не дальше самой старой необработанной
+    new_cursor_dt = max([dt for dt in complete_start_dts if dt] + ([last_start_dt] if last_start_dt else []), default=None)
+    pending_start_dts = [dt for dt in incomplete_start_dts if dt and dt >= discovery_floor]
+    if new_cursor_dt and pending_start_dts: new_cursor_dt = min(new_cursor_dt, min(pending_start_dts))
+    if new_cursor_dt:
+        try:
+            save_ingest_cursor(cursor, "scrims", new_cursor_dt)
+            conn.commit()
+        except sqlite3.Error as e:
+            log_message(f"Error saving scrims ingest cursor: {e}")
 
     conn.close()
     log_message(f"Scrims update finished. Added {added_count} new game(s).")
     return added_count
 
 # --- Функции для работы с Data Dragon ---
-_champion_data_cache = {}
-_latest_patch_cache = None
-_patch_cache_time = None
+# Общий кэш справочных данных (патч, чемпионы и т.п.): single-flight + stale-while-revalidate
+_reference_data_cache = TTLCache(error_ttl=60)
+FALLBACK_PATCH_VERSION = "14.7.1"
+
+def _fetch_latest_patch_version():
+    response = requests.get("https://ddragon.leagueoflegends.com/api/versions.json", timeout=10)
+    response.raise_for_status()
+    versions = response.json()
+    return versions[0] if versions else None
 
 def get_latest_patch_version(cache_duration=3600):
     """Получает последнюю версию патча LoL, кэширует результат."""
-    global _latest_patch_cache, _patch_cache_time
-    now = time.time()
-    if _latest_patch_cache and _patch_cache_time and (now - _patch_cache_time < cache_duration):
-        return _latest_patch_cache
-    try:
-        response = requests.get("https://ddragon.leagueoflegends.com/api/versions.json", timeout=10)
-        response.raise_for_status()
-        versions = response.json()
-        if versions:
-            _latest_patch_cache = versions[0]
-            _patch_cache_time = now
-            return _latest_patch_cache
-        else: return "14.7.1" # Fallback
-    except Exception as e: log_message(f"Error getting latest patch: {e}"); return "14.7.1"
+    return _reference_data_cache.get_or_load(
+        'latest_patch', _fetch_latest_patch_version, ttl=cache_duration, fallback=FALLBACK_PATCH_VERSION
+    )
 
 # ОБНОВЛЕННАЯ normalize_champion_name_for_ddragon (с UOL)
 def normalize_champion_name_for_ddragon(champ):
@@ -480,40 +669,37 @@ def normalize_champion_name_for_ddragon(champ):
     # Data Dragon обычно чувствителен к регистру, но очищенное имя часто работает
     return name_clean
 
-def get_champion_data(cache_duration=86400):
-    """Загружает данные чемпионов с Data Dragon, кэширует результат."""
-    global _champion_data_cache
-    now = time.time()
-    cache_key = 'champion_data'
-    if cache_key in _champion_data_cache and (now - _champion_data_cache[cache_key]['timestamp'] < cache_duration):
-        return _champion_data_cache[cache_key]['data']
-
+def _fetch_champion_data():
     patch_version = get_latest_patch_version()
     url = f"https://ddragon.leagueoflegends.com/cdn/{patch_version}/data/en_US/champion.json"
     log_message(f"Fetching champion data from ddragon (Patch: {patch_version})...")
-    try:
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        data = response.json()['data']
-        champion_id_map = {} # 'ID': 'Name'
-        champion_name_map = {} # 'Name': 'DDragonName'
-        for champ_ddragon_name, champ_info in data.items():
-             champ_id = champ_info['key']
-             champ_name = champ_info['name']
-             champion_id_map[str(champ_id)] = champ_name
-             normalized_ddragon_name = normalize_champion_name_for_ddragon(champ_name)
-             # Используем нормализованное имя, если оно не None, иначе исходное из ddragon
-             champion_name_map[champ_name] = normalized_ddragon_name if normalized_ddragon_name else champ_ddragon_name
-
-        result_data = {'id_map': champion_id_map, 'name_map': champion_name_map}
-        _champion_data_cache[cache_key] = {'data': result_data, 'timestamp': now}
-        log_message("Champion data fetched and cached.")
-        return result_data
-    except Exception as e:
-        log_message(f"Failed to fetch or process champion data: {e}")
-        return {'id_map': {}, 'name_map': {}}
+    response = requests.get(url, timeout=15)
+    response.raise_for_status()
+    data = response.json()['data']
+    champion_id_map = {} # 'ID': 'Name'
+    champion_name_map = {} # 'Name': 'DDragonName'
+    for champ_ddragon_name, champ_info in data.items():
+         champ_id = champ_info['key']
+         champ_name = champ_info['name']
+         champion_id_map[str(champ_id)] = champ_name
+         normalized_ddragon_name = normalize_champion_name_for_ddragon(champ_name)
+         # Используем нормализованное имя, если оно не None, иначе исходное из ddragon
+         champion_name_map[champ_name] = normalized_ddragon_name if normalized_ddragon_name else champ_ddragon_name
+
+    if not champion_id_map:
+        return None # Пустой ответ не затирает последние удачные данные
+    log_message("Champion data fetched and cached.")
+    return {'id_map': champion_id_map, 'name_map': champion_name_map}
+
+@traced()
+def get_champion_data(cache_duration=86400):
+    """Загружает данные чемпионов с Data Dragon, кэширует результат."""
+    return _reference_data_cache.get_or_load(
+        'champion_data', _fetch_champion_data, ttl=cache_duration, fallback={'id_map': {}, 'name_map': {}}
+    )
 
 # ОБНОВЛЕННАЯ get_champion_icon_html (из UOL)
+@traced()
 def get_champion_icon_html(champion_name_or_id, champion_data, width=25, height=25):
     """Генерирует HTML img тэг (или fallback span '?') для иконки чемпиона."""
     func_input = champion_name_or_id # Сохраняем исходное значение для логов/title
@@ -576,6 +762,7 @@ def get_champion_icon_html(champion_name_or_id, champion_data, width=25, height=
         # log_message(f"[Icon] Failed to find valid ddragon name for '{display_name_fallback}'. Returning '?'.")
         return f'<span title="Icon error: {display_name_fallback}">?</span>'
     
+@traced()
 def get_rune_icon_html(rune_id_input, width=22, height=22):
     """
     Универсальная функция для иконок рун через OP.GG.
@@ -616,6 +803,7 @@ def get_rune_icon_html(rune_id_input, width=22, height=22):
             continue
 
     return "".join(html_elements)
+@traced()
 def aggregate_scrim_data(time_filter="All Time", side_filter="all"):
     """
     Исправленная версия: удален конфликтующий импорт get_rune_icon_html.
@@ -641,8 +829,8 @@ def aggregate_scrim_data(time_filter="All Time", side_filter="all"):
         cursor.execute(f"SELECT * FROM scrims {where_clause} ORDER BY \"Date\" DESC", params)
         all_scrim_data = cursor.fetchall()
         
-        # Импортируем только то, что точно есть в app.py
-        from app import get_champion_data, get_champion_icon_html
+        # get_champion_data/get_champion_icon_html определены в этом модуле: импорт из app заново
+        # выполнял бы старт приложения (init_db, планировщик), если app запущен как __main__
         champion_data = get_champion_data()
         
         overall_stats = { "total_games": 0, "blue_wins": 0, "blue_losses": 0, "red_wins": 0, "red_losses": 0 }
@@ -788,31 +976,17 @@ if __name__ == '__main__':
         else: print("No players in display order.")
         print("\nTest complete.")
 
+@traced()
 def get_game_replay_data(game_id):
     """Возвращает данные в формате, который ожидает JS плеер."""
-    import json
     conn = get_db_connection()
     if not conn:
         return {"timeline": [], "events": []}
     
     try:
         cursor = conn.cursor()
-        # 1. Загружаем позиции
-        cursor.execute("""
-            SELECT timestamp_seconds, positions_json 
-            FROM player_positions_snapshots 
-            WHERE game_id = ? 
-            ORDER BY timestamp_seconds ASC
-        """, (str(game_id),))
-        
-        rows = cursor.fetchall()
-        timeline = []
-        for row in rows:
-            # Превращаем секунды в миллисекунды, так как JS плеер работает с ms
-            timeline.append({
-                "timestamp": row[0] * 1000, 
-                "positions": json.loads(row[1])
-            })
+        # 1. Загружаем позиции (JS плеер работает с ms)
+        timeline = [{"timestamp": ts, "positions": positions} for ts, positions in load_position_snapshots(cursor, game_id)]
 
         # 2. Загружаем события (пока отдаем пустой список, если таблицы нет)
         events = []
@@ -838,34 +1012,243 @@ def get_game_replay_data(game_id):
     finally:
         conn.close()
 
-def log_message(msg):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
-    print(f"{timestamp} :: {msg}")
+def _replay_time_filter(from_ms, to_ms):
+    """Условие и параметры SQL для окна [from_ms, to_ms] по timestamp_seconds."""
+    clauses, params = [], []
+    if from_ms is not None:
+        clauses.append("timestamp_seconds >= ?"); params.append(int(from_ms) // 1000)
+    if to_ms is not None:
+        clauses.append("timestamp_seconds <= ?"); params.append(int(to_ms) // 1000)
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+@traced()
+def get_replay_etag(game_id, from_ms=None, to_ms=None, resolution_ms=REPLAY_TICK_MS):
+    """
+    Дешевый ETag бинарного реплея (без чтения позиций): версия формата, окно, разрешение
+    и версия данных игры (запись position_games или число снапшотов и время последней записи).
+    None, если позиций по игре нет.
+    """
+    conn = get_db_connection()
+    if not conn: return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT game_key, last_updated FROM position_games WHERE game_id = ?", (str(game_id),))
+        row = cursor.fetchone()
+        if row:
+            data_version = f"{row[0]}|{row[1]}"
+        else:
+            time_sql, time_params = _replay_time_filter(from_ms, to_ms)
+            cursor.execute(f"SELECT COUNT(*), MAX(last_updated) FROM player_positions_snapshots WHERE game_id = ?{time_sql}",
+                           [str(game_id)] + time_params)
+            count, last_updated = cursor.fetchone()
+            if not count: return None
+            data_version = f"{count}|{last_updated}"
+        version_key = f"{REPLAY_FORMAT_VERSION}|{game_id}|{from_ms}|{to_ms}|{resolution_ms}|{data_version}"
+        return "replay-" + hashlib.sha1(version_key.encode("utf-8")).hexdigest()
+    except sqlite3.Error as e:
+        log_message(f"Error computing replay ETag for {game_id}: {e}")
+        return None
+    finally:
+        conn.close()
 
-def process_replay_to_db(game_id, timeline_data, summary_data):
+def save_canonical_positions(cursor, game_id, participants, ticks, last_updated):
     """
-    Парсит NDJSON, сохраняет позиции И события объектов (башни/монстры).
+    Пишет позиции игры в компактное хранилище: строка position_games, участники один раз
+    ({participant_id: (puuid, чемпион, team_id)}) и тики (PositionColumns).
+    Вызывается внутри транзакции process_replay_to_db.
     """
-    conn = None
-    for attempt in range(5):
+    cursor.execute("SELECT game_key FROM position_games WHERE game_id = ?", (str(game_id),))
+    row = cursor.fetchone()
+    if row:
+        cursor.execute("DELETE FROM position_ticks WHERE game_key = ?", (row[0],))
+        cursor.execute("DELETE FROM position_participants WHERE game_key = ?", (row[0],))
+        cursor.execute("DELETE FROM position_games WHERE game_key = ?", (row[0],))
+    if not ticks: return
+
+    cursor.execute("INSERT INTO position_games (game_id, last_updated) VALUES (?, ?)", (str(game_id), last_updated))
+    game_key = cursor.lastrowid
+    cursor.executemany("""
+        INSERT INTO position_participants (game_key, participant_id, player_puuid, champion_name, team_id)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(game_key, pid, puuid, champion, team_id) for pid, (puuid, champion, team_id) in participants.items()])
+    cursor.executemany("""
+        INSERT OR REPLACE INTO position_ticks (game_key, timestamp_ms, participant_id, pos_x, pos_z)
+        VALUES (?, ?, ?, ?, ?)
+    """, ticks.rows(game_key))
+
+def load_position_snapshots(cursor, game_id, from_ms=None, to_ms=None):
+    """
+    Посекундные снапшоты позиций [(timestamp_ms, [позиции])] в формате плеера
+    (participantID, championName, teamId, x, z), окно [from_ms, to_ms] округляется до секунд.
+    Читает компактное хранилище (первый тик каждой секунды); для игр без него -
+    player_positions_snapshots (турниры и скримы, загруженные до его появления).
+    """
+    cursor.execute("SELECT game_key FROM position_games WHERE game_id = ?", (str(game_id),))
+    row = cursor.fetchone()
+    if not row:
+        time_sql, time_params = _replay_time_filter(from_ms, to_ms)
+        cursor.execute(f"""
+            SELECT timestamp_seconds, positions_json
+            FROM player_positions_snapshots
+            WHERE game_id = ?{time_sql}
+            ORDER BY timestamp_seconds ASC
+        """, [str(game_id)] + time_params)
+        return [(r[0] * 1000, json.loads(r[1])) for r in cursor.fetchall()]
+
+    game_key = row[0]
+    cursor.execute("SELECT participant_id, champion_name, team_id FROM position_participants WHERE game_key = ?", (game_key,))
+    participant_info = {r[0]: (r[1], r[2]) for r in cursor.fetchall()}
+
+    tick_sql, tick_params = "", []
+    if from_ms is not None:
+        tick_sql += " AND timestamp_ms >= ?"; tick_params.append(int(from_ms) // 1000 * 1000)
+    if to_ms is not None:
+        tick_sql += " AND timestamp_ms < ?"; tick_params.append((int(to_ms) // 1000 + 1) * 1000)
+    cursor.execute(f"""
+        SELECT timestamp_ms, participant_id, pos_x, pos_z FROM position_ticks
+        WHERE game_key = ?{tick_sql}
+        ORDER BY timestamp_ms, participant_id
+    """, [game_key] + tick_params)
+
+    snapshots = []
+    current_sec = current_ts = None
+    for ts, pid, x, z in cursor.fetchall():
+        sec = ts // 1000
+        if sec != current_sec:
+            current_sec, current_ts = sec, ts
+            positions = []
+            snapshots.append((sec * 1000, positions))
+        if ts != current_ts: continue  # В снапшот секунды идет только ее первый тик
+        champion, team_id = participant_info.get(pid, ("Unknown", 0))
+        positions.append({"participantID": pid, "championName": champion, "teamId": team_id, "x": float(x), "z": float(z)})
+    return snapshots
+
+def save_replay_lod_tracks(cursor, game_id, snapshot_map, last_updated):
+    """
+    Предрассчитывает треки реплея во всех разрешениях REPLAY_LOD_TICKS_MS и пишет их в replay_lod_tracks.
+    snapshot_map: {секунда: [позиции]}. Вызывается внутри транзакции process_replay_to_db.
+    """
+    cursor.execute("DELETE FROM replay_lod_tracks WHERE game_id = ?", (str(game_id),))
+    replay = build_replay_tracks([(t_sec * 1000, positions) for t_sec, positions in sorted(snapshot_map.items())])
+    if replay["frame_count"] == 0: return
+    rows = []
+    for tick_ms in REPLAY_LOD_TICKS_MS:
+        lod = downsample_replay(replay, tick_ms)
+        payload = encode_replay_payload(lod, {"game_id": str(game_id), "events": []})
+        rows.append((str(game_id), tick_ms, lod["start_ms"], lod["frame_count"], sqlite3.Binary(payload), last_updated))
+    cursor.executemany("""
+        INSERT INTO replay_lod_tracks (game_id, tick_ms, start_ms, frame_count, payload, last_updated)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+
+@traced()
+def get_game_replay_binary(game_id, from_ms=None, to_ms=None, resolution_ms=REPLAY_TICK_MS):
+    """
+    Реплей в компактном бинарном формате (см. replay_encoding): чемпионы один раз в заголовке,
+    Int16 x/z на участника с шагом resolution_ms. Можно ограничить окном [from_ms, to_ms].
+    Берет предрассчитанные треки из replay_lod_tracks; для игр без них строит треки из снапшотов.
+    """
+    conn = get_db_connection()
+    if not conn: return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT payload FROM replay_lod_tracks WHERE game_id = ? AND tick_ms = ?", (str(game_id), int(resolution_ms)))
+        lod_row = cursor.fetchone()
+
+        events = []
         try:
-            conn = get_db_connection()
-            conn.execute("PRAGMA busy_timeout = 60000")
-            break
-        except sqlite3.OperationalError:
-            log_message(f"Database busy, retrying connection {attempt+1}/5...")
-            time.sleep(1)
+            cursor.execute("SELECT timestamp_ms, event_type, victim_id FROM game_events WHERE game_id = ?", (str(game_id),))
+            events = [{"timestamp_ms": er[0], "event_type": er[1], "victim_id": er[2]} for er in cursor.fetchall()
+                      if (from_ms is None or er[0] >= from_ms) and (to_ms is None or er[0] <= to_ms)]
+        except sqlite3.Error:
+            pass # Таблицы событий может еще не быть
+
+        if lod_row:
+            # Готовый payload отдаем как есть, если не нужно ни окно, ни события
+            if from_ms is None and to_ms is None and not events:
+                return bytes(lod_row[0])
+            replay, _ = replay_from_payload(bytes(lod_row[0]))
+        else:
+            snapshots = load_position_snapshots(cursor, game_id, from_ms, to_ms)
+            replay = downsample_replay(build_replay_tracks(snapshots), resolution_ms)
 
-    if not conn:
-        log_message(f"!!! Could not get DB connection for game {game_id} after retries.")
-        return
+        replay = slice_replay(replay, from_ms, to_ms)
+        return encode_replay_payload(replay, {"game_id": str(game_id), "events": events})
+    except Exception as e:
+        log_message(f"Error building binary replay for {game_id}: {e}")
+        return None
+    finally:
+        conn.close()
 
-    cursor = conn.cursor()
+# Схемы livestats, нужные плееру (позиции и объекты). Остальные строки не декодируются вовсе.
+REPLAY_SCHEMA_MARKERS = ('"stats_update"', '"epic_monster_kill"', '"building_destroyed"', '"ELITE_MONSTER_KILL"')
+
+def parse_replay_timeline(game_id, timeline_data, pid_to_info):
+    """
+    Разбирает NDJSON livestats скрима за один проход.
+    Возвращает (PositionColumns тиков, {participant_id: (puuid, чемпион, team_id)},
+    {секунда: [позиции первого тика секунды]}, [события объектов]).
+    """
+    if isinstance(timeline_data, bytes):
+        timeline_data = timeline_data.decode('utf-8')
+
+    lines = timeline_data.strip().split('\n')
+    log_message(f"--- Processing {len(lines)} lines for scrim {game_id} ---")
+
+    position_ticks = PositionColumns()
+    participants_seen = {}      # participant_id -> (puuid, чемпион, team_id)
+    snapshot_map = {}
+    objective_events_list = []
+    append_tick = position_ticks.append
+
+    for line in lines:
+        if not any(marker in line for marker in REPLAY_SCHEMA_MARKERS): continue
+        try:
+            snapshot = json.loads(line)
+        except json.JSONDecodeError: continue
+
+        schema = snapshot.get("rfc461Schema")
+        game_time_ms = snapshot.get("gameTime") or snapshot.get("timestamp")
+
+        # --- ПАРСИНГ ПОЗИЦИЙ ---
+        if schema == "stats_update" and game_time_ms is not None:
+            tick_ms = int(game_time_ms)
+            t_sec = int(game_time_ms / 1000)
+            # Словари для плеера собираем только для первого тика секунды
+            snapshot_positions = [] if t_sec not in snapshot_map else None
+
+            for p_data in snapshot.get("participants", []):
+                p_id = p_data.get("participantID")
+                pos = p_data.get("position")
+                if p_id is None or not pos or 'x' not in pos or 'z' not in pos: continue
+                if p_id not in participants_seen:
+                    info = pid_to_info.get(p_id, {})
+                    puuid = p_data.get("puuid") or info.get("puuid")
+                    participants_seen[p_id] = (str(puuid) if puuid else f"unknown_{p_id}",
+                                               info.get("champion", "Unknown"), info.get("teamId", 0))
+                append_tick(tick_ms, int(p_id), int(pos['x']), int(pos['z']))
+                if snapshot_positions is not None:
+                    _, champion, team_id = participants_seen[p_id]
+                    snapshot_positions.append({
+                        "participantID": p_id, "championName": champion, "teamId": team_id,
+                        "x": float(pos['x']), "z": float(pos['z'])
+                    })
+
+            if snapshot_positions:
+                snapshot_map[t_sec] = snapshot_positions
+
+        # --- ПАРСИНГ СОБЫТИЙ ОБЪЕКТОВ (Драконы, Башни) ---
+        elif schema in ["epic_monster_kill", "building_destroyed"] or snapshot.get("eventType") == "ELITE_MONSTER_KILL":
+            extracted = extract_single_event(snapshot, game_id, pid_to_info)
+            if extracted:
+                objective_events_list.append(extracted)
 
-    # 1. Маппинг участников для определения команд и чемпионов
-    participants = summary_data.get("participants", [])
+    return position_ticks, participants_seen, snapshot_map, objective_events_list
+
+def replay_participant_info(summary_data):
+    """Маппинг участников для определения команд и чемпионов: {participantId: {puuid, champion, teamId}}."""
     pid_to_info = {}
-    for p in participants:
+    for p in summary_data.get("participants", []):
         pid = p.get("participantId")
         if pid is not None:
             pid_to_info[pid] = {
@@ -873,62 +1256,42 @@ def process_replay_to_db(game_id, timeline_data, summary_data):
                 "champion": p.get("championName", "Unknown"),
                 "teamId": p.get("teamId")
             }
+    return pid_to_info
 
+def process_replay_to_db(game_id, timeline_data, summary_data):
+    """
+    Парсит NDJSON, сохраняет позиции И события объектов (башни/монстры).
+    """
     try:
-        if isinstance(timeline_data, bytes):
-            timeline_data = timeline_data.decode('utf-8')
-        
-        lines = timeline_data.strip().split('\n')
-        log_message(f"--- Processing {len(lines)} lines for scrim {game_id} ---")
-        
-        timeline_records = []
-        snapshot_map = {} 
-        objective_events_list = []
+        parsed = parse_replay_timeline(game_id, timeline_data, replay_participant_info(summary_data))
+    except Exception as e:
+        log_message(f"!!! ERROR in process_replay_to_db (G:{game_id}): {e}")
+        return
+    return save_parsed_replay(game_id, parsed)
 
-        for line in lines:
-            if not line.strip(): continue
-            try:
-                snapshot = json.loads(line)
-            except: continue
+def save_parsed_replay(game_id, parsed):
+    """
+    Записывает результат parse_replay_timeline в БД одной транзакцией. Возвращает True при успехе.
+    Вызывается из process_replay_to_db и из потока-писателя ReplayIngestPipeline.
+    """
+    position_ticks, participants_seen, snapshot_map, objective_events_list = parsed
+    conn = None
+    for attempt in range(5):
+        try:
+            conn = get_db_connection()
+            conn.execute("PRAGMA busy_timeout = 60000")
+            break
+        except sqlite3.OperationalError:
+            log_message(f"Database busy, retrying connection {attempt+1}/5...")
+            time.sleep(1)
 
-            schema = snapshot.get("rfc461Schema")
-            game_time_ms = snapshot.get("gameTime") or snapshot.get("timestamp")
-            
-            # --- ПАРСИНГ ПОЗИЦИЙ ---
-            if schema == "stats_update" and game_time_ms is not None:
-                current_participants = snapshot.get("participants", [])
-                t_sec = int(game_time_ms / 1000)
-                snapshot_positions = []
-
-                for p_data in current_participants:
-                    p_id = p_data.get("participantID")
-                    pos = p_data.get("position")
-                    if p_id is not None and pos and 'x' in pos and 'z' in pos:
-                        info = pid_to_info.get(p_id, {})
-                        puuid = p_data.get("puuid") or info.get("puuid")
-                        
-                        timeline_records.append((
-                            str(game_id), int(game_time_ms), int(p_id),
-                            str(puuid) if puuid else f"unknown_{p_id}",
-                            int(pos['x']), int(pos['z']),
-                            datetime.now(timezone.utc).isoformat()
-                        ))
-                        snapshot_positions.append({
-                            "participantID": p_id,
-                            "championName": info.get("champion", "Unknown"),
-                            "teamId": info.get("teamId", 0),
-                            "x": float(pos['x']), "z": float(pos['z'])
-                        })
-                
-                if snapshot_positions and t_sec not in snapshot_map:
-                    snapshot_map[t_sec] = snapshot_positions
+    if not conn:
+        log_message(f"!!! Could not get DB connection for game {game_id} after retries.")
+        return False
 
-            # --- ПАРСИНГ СОБЫТИЙ ОБЪЕКТОВ (Драконы, Башни) ---
-            elif schema in ["epic_monster_kill", "building_destroyed"] or snapshot.get("eventType") == "ELITE_MONSTER_KILL":
-                extracted = extract_single_event(snapshot, game_id, pid_to_info)
-                if extracted:
-                    objective_events_list.append(extracted)
+    cursor = conn.cursor()
 
+    try:
         # 2. Запись всех данных в одной транзакции
         cursor.execute("BEGIN IMMEDIATE TRANSACTION")
         try:
@@ -937,25 +1300,13 @@ def process_replay_to_db(game_id, timeline_data, summary_data):
             cursor.execute("DELETE FROM player_positions_snapshots WHERE game_id = ?", (str(game_id),))
             cursor.execute("DELETE FROM objective_events WHERE game_id = ?", (str(game_id),))
 
-            # Сохранение позиций
-            if timeline_records:
-                cursor.executemany("""
-                    INSERT INTO player_positions_timeline 
-                    (game_id, timestamp_ms, participant_id, player_puuid, pos_x, pos_z, last_updated)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, timeline_records)
-
-            # Сохранение снапшотов
-            snapshot_insert_data = [
-                (str(game_id), ts, json.dumps(pos_list), datetime.now(timezone.utc).isoformat())
-                for ts, pos_list in snapshot_map.items()
-            ]
-            if snapshot_insert_data:
-                cursor.executemany("""
-                    INSERT INTO player_positions_snapshots 
-                    (game_id, timestamp_seconds, positions_json, last_updated)
-                    VALUES (?, ?, ?, ?)
-                """, snapshot_insert_data)
+            # Сохранение позиций: одно компактное хранилище вместо timeline + JSON-снапшотов
+            # (старые строки этой игры в player_positions_timeline / player_positions_snapshots удалены выше)
+            last_updated = datetime.now(timezone.utc).isoformat()
+            save_canonical_positions(cursor, game_id, participants_seen, position_ticks, last_updated)
+
+            # Треки для плеера в разрешениях 1 c / 5 c / 30 c
+            save_replay_lod_tracks(cursor, game_id, snapshot_map, last_updated)
 
             # Сохранение событий объектов (ИСПРАВЛЕНО ДЛЯ event_type)
             if objective_events_list:
@@ -979,13 +1330,15 @@ def process_replay_to_db(game_id, timeline_data, summary_data):
                 """, to_insert_obj)
 
             conn.commit()
-            log_message(f"DONE G:{game_id}: Saved {len(timeline_records)} pos & {len(objective_events_list)} events.")
+            log_message(f"DONE G:{game_id}: Saved {len(position_ticks)} pos & {len(objective_events_list)} events.")
         except Exception as e:
             conn.rollback()
             raise e
+        return True
 
     except Exception as e:
-        log_message(f"!!! ERROR in process_replay_to_db (G:{game_id}): {e}")
+        log_message(f"!!! ERROR in save_parsed_replay (G:{game_id}): {e}")
+        return False
     finally:
         if conn: conn.close()
 
@@ -5,12 +5,19 @@ import requests
 import time
 from datetime import datetime, timedelta, timezone
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 import math
 import sqlite3
+import threading
+import traceback
 
 # Импорты из вашего проекта
 from database import get_db_connection, SOLOQ_GAMES_HEADER
-from scrims_logic import log_message, get_champion_data, get_champion_icon_html
+from perf_tracing import traced
+from log_utils import log_message
+from scrims_logic import get_champion_data, get_champion_icon_html
+from riot_rate_limiter import RiotRateLimiter
 
 # --- Константы ---
 # Загружаем ключ из переменных окружения
@@ -20,43 +27,74 @@ if not RIOT_API_KEY:
     # Можно либо завершить работу, либо продолжить без возможности обновления
     # raise ValueError("RIOT_API_KEY не установлен")
 
-# Ростер команды (как в вашем коде)
-# Переименовал Centu для единообразия с другими файлами
-TEAM_ROSTERS = {
+# Начальные составы: переносятся в таблицы soloq_players/soloq_accounts при первом запуске,
+# дальше составы (в том числе соперников для скаутинга) хранятся и редактируются в БД
+DEFAULT_TEAM_ROSTERS = {
     "Gamespace": {
-        "Aytekn": {"game_name": ["AyteknnnN777"], "tag_line": ["777"], "role": "TOP"},
+        "Aytekn": {"game_name": ["AyteknnnN777"], "tag_line": ["777"], "region": ["europe"], "role": "TOP"},
     }
 }
-# Регион по умолчанию для API (можно вынести в конфиг)
-DEFAULT_REGION_ACCOUNT = "europe" # Для Account API (получение PUUID)
-DEFAULT_REGION_MATCH = "europe"   # Для Match API (история, детали)
-
-# URL Адреса Riot API
-BASE_ACCOUNT_URL = f"https://{DEFAULT_REGION_ACCOUNT}.api.riotgames.com/riot/account/v1/accounts/by-riot-id"
-BASE_MATCH_HISTORY_URL = f"https://{DEFAULT_REGION_MATCH}.api.riotgames.com/lol/match/v5/matches/by-puuid"
-BASE_MATCH_DETAIL_URL = f"https://{DEFAULT_REGION_MATCH}.api.riotgames.com/lol/match/v5/matches"
-
-# Задержка между запросами к Riot API (в секундах) - НАСТРОЙТЕ ПРИ НЕОБХОДИМОСТИ
-RIOT_API_DELAY = 1.3 # ~1 запрос в 1.3 секунды, чтобы уложиться в стандартные лимиты (20/сек, 100/2мин)
+DEFAULT_TEAM = "Gamespace"
+
+# Regional routing values Riot API (лимиты считаются отдельно для каждого региона)
+RIOT_REGIONS = ("americas", "asia", "europe", "sea")
+DEFAULT_REGION = "europe"
+# account-v1 не обслуживается кластером sea - Riot ID ищем через asia
+ACCOUNT_API_REGION = {"sea": "asia"}
+
+# URL Адреса Riot API (регион подставляется для каждого аккаунта)
+BASE_ACCOUNT_URL = "https://{region}.api.riotgames.com/riot/account/v1/accounts/by-riot-id"
+BASE_MATCH_HISTORY_URL = "https://{region}.api.riotgames.com/lol/match/v5/matches/by-puuid"
+BASE_MATCH_DETAIL_URL = "https://{region}.api.riotgames.com/lol/match/v5/matches"
+
+# Запросы к Riot API идут через общий лимитер: окна берутся из заголовков X-App-Rate-Limit/X-Method-Rate-Limit
+RIOT_RATE_LIMITER = RiotRateLimiter()
+RIOT_API_MAX_ATTEMPTS = 3
+SOLOQ_FETCH_WORKERS = 8  # параллельные запросы деталей матчей (темп все равно ограничивает лимитер)
+SOLOQ_ACCOUNT_WORKERS = 4  # аккаунты одного региона, обновляемые одновременно
+
+# Загрузка истории: страницы match-v5 по 100 ID, дальше high-water mark аккаунта (soloq_account_sync)
+MATCH_IDS_PAGE_SIZE = 100
+SOLOQ_BACKFILL_START_TIME = None  # Unix timestamp, с которого грузить историю нового аккаунта (None - вся доступная)
+SOLOQ_REQUEST_BUDGET = 300        # максимум запросов к Match API за одно обновление игрока
+
+# Фоновое обновление пула аккаунтов по кругу: каждые SOLOQ_REFRESH_INTERVAL_SECONDS в каждом регионе
+# обновляются самые давно обновленные аккаунты, столько, чтобы весь пул обходился за SOLOQ_MAX_STALENESS_SECONDS
+SOLOQ_REFRESH_INTERVAL_SECONDS = int(os.getenv("SOLOQ_REFRESH_INTERVAL_SECONDS", "0"))  # 0 - выключено
+SOLOQ_MAX_STALENESS_SECONDS = int(os.getenv("SOLOQ_MAX_STALENESS_SECONDS", str(6 * 3600)))
+
+# Сколько хранить PUUID в riot_accounts, прежде чем перепроверить Riot ID (игрок может сменить ник)
+PUUID_CACHE_TTL_SECONDS = 30 * 24 * 3600
+
+# Ключи методов Riot API для раздельных method-лимитов
+RIOT_METHOD_ACCOUNT_BY_RIOT_ID = "account-v1.by-riot-id"
+RIOT_METHOD_MATCH_IDS_BY_PUUID = "match-v5.ids-by-puuid"
+RIOT_METHOD_MATCH_BY_ID = "match-v5.match"
 
 # --- Вспомогательная функция для запросов к Riot API ---
-def _riot_api_request(url):
+def _riot_api_request(url, method=RIOT_METHOD_MATCH_BY_ID):
     """Отправляет GET запрос к Riot API с обработкой ошибок и лимитов."""
     if not RIOT_API_KEY:
         log_message("Riot API request failed: API Key not configured.")
         return None
 
     headers = {"X-Riot-Token": RIOT_API_KEY}
+    host = urlparse(url).netloc
+    response = None
     try:
-        # log_message(f"Riot API Request: {url}") # Лог для отладки
-        response = requests.get(url, headers=headers, timeout=15)
-
-        # Обработка Rate Limit (429) - простая задержка, можно улучшить экспоненциальным отступлением
-        if response.status_code == 429:
-            retry_after = int(response.headers.get("Retry-After", "5")) # По умолчанию ждем 5 секунд
-            log_message(f"Rate limited (429). Retrying after {retry_after} seconds...")
-            time.sleep(retry_after)
-            response = requests.get(url, headers=headers, timeout=15) # Повторная попытка
+        for attempt in range(1, RIOT_API_MAX_ATTEMPTS + 1):
+            RIOT_RATE_LIMITER.acquire(host, method)
+            response = requests.get(url, headers=headers, timeout=15)
+            RIOT_RATE_LIMITER.update_from_headers(host, method, response.headers)
+
+            # 429: блокируем регион/метод на Retry-After и пробуем снова
+            if response.status_code == 429 and attempt < RIOT_API_MAX_ATTEMPTS:
+                retry_after = int(response.headers.get("Retry-After", "5")) # По умолчанию ждем 5 секунд
+                limit_type = response.headers.get("X-Rate-Limit-Type")
+                log_message(f"Rate limited (429, {limit_type or 'unknown'}). Retrying after {retry_after} seconds...")
+                RIOT_RATE_LIMITER.penalize(host, method, retry_after, limit_type)
+                continue
+            break
 
         response.raise_for_status() # Вызовет исключение для других ошибок (4xx, 5xx)
         return response.json()
@@ -76,104 +114,388 @@ def _riot_api_request(url):
 
     return None # Возвращаем None при любой ошибке
 
+# --- Кэш PUUID (таблица riot_accounts) ---
+def get_cached_puuid(game_name, tag_line, max_age_seconds=PUUID_CACHE_TTL_SECONDS):
+    """PUUID из riot_accounts, если запись не старше max_age_seconds, иначе None."""
+    conn = get_db_connection()
+    if not conn: return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT puuid, fetched_at FROM riot_accounts WHERE game_name = ? AND tag_line = ?", (game_name, tag_line))
+        row = cursor.fetchone()
+        if row and time.time() - row['fetched_at'] < max_age_seconds:
+            return row['puuid']
+    except sqlite3.Error as e:
+        log_message(f"DB Error reading PUUID cache for {game_name}#{tag_line}: {e}")
+    finally:
+        conn.close()
+    return None
+
+def save_cached_puuid(game_name, tag_line, puuid):
+    conn = get_db_connection()
+    if not conn: return False
+    try:
+        conn.execute("INSERT OR REPLACE INTO riot_accounts (game_name, tag_line, puuid, fetched_at) VALUES (?, ?, ?, ?)",
+                     (game_name, tag_line, puuid, int(time.time())))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        log_message(f"DB Error saving PUUID cache for {game_name}#{tag_line}: {e}")
+        return False
+    finally:
+        conn.close()
+
+def invalidate_puuid_cache(game_name=None, tag_line=None):
+    """Удаляет кэшированный PUUID одного аккаунта (или всех, если аккаунт не указан). Возвращает число удаленных записей."""
+    conn = get_db_connection()
+    if not conn: return 0
+    try:
+        cursor = conn.cursor()
+        if game_name and tag_line:
+            cursor.execute("DELETE FROM riot_accounts WHERE game_name = ? AND tag_line = ?", (game_name, tag_line))
+        else:
+            cursor.execute("DELETE FROM riot_accounts")
+        conn.commit()
+        label = f"{game_name}#{tag_line}" if game_name else "all accounts"
+        log_message(f"PUUID cache invalidated ({label}): {cursor.rowcount} entries removed.")
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        log_message(f"DB Error invalidating PUUID cache: {e}")
+        return 0
+    finally:
+        conn.close()
+
+# --- Составы SoloQ (таблицы soloq_players / soloq_accounts) ---
+def seed_soloq_rosters():
+    """Переносит DEFAULT_TEAM_ROSTERS в БД, если составов там еще нет."""
+    conn = get_db_connection()
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM soloq_players LIMIT 1")
+        if cursor.fetchone(): return False
+        for team_name, players in DEFAULT_TEAM_ROSTERS.items():
+            for player_name, config in players.items():
+                accounts = zip(config.get("game_name", []), config.get("tag_line", []),
+                               config.get("region", []) or [DEFAULT_REGION] * len(config.get("game_name", [])))
+                _save_soloq_player(cursor, team_name, player_name, config.get("role"), list(accounts))
+        conn.commit()
+        log_message(f"[SoloQ] Seeded SoloQ rosters for {len(DEFAULT_TEAM_ROSTERS)} team(s).")
+        return True
+    except sqlite3.Error as e:
+        log_message(f"[SoloQ] Error seeding SoloQ rosters: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+def _save_soloq_player(cursor, team_name, player_name, role, accounts):
+    cursor.execute("""
+        INSERT INTO soloq_players (player_name, team_name, role) VALUES (?, ?, ?)
+        ON CONFLICT(player_name) DO UPDATE SET team_name = excluded.team_name, role = excluded.role
+    """, (player_name, team_name, role))
+    # Аккаунты обновляются на месте (last_refresh_ts сохраняется), удаляются только убранные из списка
+    for game_name, tag_line, region in accounts:
+        region = (region or DEFAULT_REGION).lower()
+        if region not in RIOT_REGIONS: raise ValueError(f"Unknown Riot region '{region}'")
+        cursor.execute("""
+            INSERT INTO soloq_accounts (game_name, tag_line, player_name, region) VALUES (?, ?, ?, ?)
+            ON CONFLICT(game_name, tag_line) DO UPDATE SET player_name = excluded.player_name, region = excluded.region
+        """, (game_name, tag_line, player_name, region))
+    kept_accounts = {(game_name, tag_line) for game_name, tag_line, _ in accounts}
+    cursor.execute("SELECT game_name, tag_line FROM soloq_accounts WHERE player_name = ?", (player_name,))
+    removed_accounts = [tuple(row) for row in cursor.fetchall() if tuple(row) not in kept_accounts]
+    cursor.executemany("DELETE FROM soloq_accounts WHERE game_name = ? AND tag_line = ?", removed_accounts)
+
+def save_soloq_player(team_name, player_name, role, accounts):
+    """Добавляет/обновляет игрока и заменяет список его аккаунтов [(game_name, tag_line, region)]."""
+    conn = get_db_connection()
+    if not conn: return False
+    try:
+        _save_soloq_player(conn.cursor(), team_name, player_name, role, accounts)
+        conn.commit()
+        return True
+    except (sqlite3.Error, ValueError) as e:
+        log_message(f"Error saving SoloQ player {player_name} ({team_name}): {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+def delete_soloq_player(player_name):
+    """Убирает игрока из отслеживания (сохраненные игры остаются в soloq_games)."""
+    conn = get_db_connection()
+    if not conn: return False
+    try:
+        conn.execute("DELETE FROM soloq_accounts WHERE player_name = ?", (player_name,))
+        conn.execute("DELETE FROM soloq_players WHERE player_name = ?", (player_name,))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        log_message(f"Error deleting SoloQ player {player_name}: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+def parse_riot_accounts(accounts_text):
+    """
+    Разбирает аккаунты из формы составов: по одному на строку, "GameName#TAG [region]"
+    (в имени могут быть пробелы, в теге - нет). Возвращает [(game_name, tag_line, region)].
+    """
+    accounts = []
+    for line in accounts_text.splitlines():
+        line = line.strip()
+        if not line: continue
+        game_name, sep, rest = line.partition("#")
+        rest_parts = rest.split()
+        if not sep or not game_name.strip() or not rest_parts or len(rest_parts) > 2:
+            raise ValueError(f"Invalid Riot ID '{line}', expected 'GameName#TAG [region]'")
+        region = rest_parts[1].lower() if len(rest_parts) == 2 else DEFAULT_REGION
+        if region not in RIOT_REGIONS:
+            raise ValueError(f"Unknown Riot region '{region}' for {line}, expected one of: {', '.join(RIOT_REGIONS)}")
+        accounts.append((game_name.strip(), rest_parts[0], region))
+    return accounts
+
+def get_soloq_players(team_name=None):
+    """
+    {player_name: {"team", "role", "accounts": [(game_name, tag_line, region), ...]}}
+    в порядке добавления (все команды или одна).
+    """
+    conn = get_db_connection()
+    if not conn: return {}
+    players = {}
+    try:
+        cursor = conn.cursor()
+        sql = """
+            SELECT p.player_name, p.team_name, p.role, a.game_name, a.tag_line, a.region
+            FROM soloq_players p LEFT JOIN soloq_accounts a ON a.player_name = p.player_name"""
+        params = []
+        if team_name:
+            sql += " WHERE p.team_name = ?"
+            params.append(team_name)
+        cursor.execute(sql + " ORDER BY p.rowid, a.rowid", params)
+        for row in cursor.fetchall():
+            player = players.setdefault(row['player_name'], {"team": row['team_name'], "role": row['role'], "accounts": []})
+            if row['game_name']:
+                player["accounts"].append((row['game_name'], row['tag_line'], row['region']))
+    except sqlite3.Error as e:
+        log_message(f"DB Error reading SoloQ rosters: {e}")
+    finally:
+        conn.close()
+    return players
+
+@traced()
+def get_team_rosters():
+    """Составы в прежнем формате TEAM_ROSTERS: {team: {player: {"game_name": [...], "tag_line": [...], "region": [...], "role"}}}."""
+    rosters = {}
+    for player_name, player in get_soloq_players().items():
+        rosters.setdefault(player["team"], {})[player_name] = {
+            "game_name": [account[0] for account in player["accounts"]],
+            "tag_line": [account[1] for account in player["accounts"]],
+            "region": [account[2] for account in player["accounts"]],
+            "role": player["role"],
+        }
+    return rosters
+
+def _mark_soloq_account_refreshed(cursor, game_name, tag_line):
+    cursor.execute("UPDATE soloq_accounts SET last_refresh_ts = ? WHERE game_name = ? AND tag_line = ?",
+                   (int(time.time()), game_name, tag_line))
+
 # --- Функции для получения данных от Riot API ---
-def get_puuid(game_name, tag_line):
-    """Получает PUUID по Riot ID (game name + tag line)."""
-    url = f"{BASE_ACCOUNT_URL}/{game_name}/{tag_line}"
-    data = _riot_api_request(url)
+def get_puuid(game_name, tag_line, use_cache=True, region=DEFAULT_REGION):
+    """Получает PUUID по Riot ID (game name + tag line). Сначала смотрит в кэш riot_accounts."""
+    if use_cache:
+        cached_puuid = get_cached_puuid(game_name, tag_line)
+        if cached_puuid: return cached_puuid
+
+    account_region = ACCOUNT_API_REGION.get(region, region)
+    url = f"{BASE_ACCOUNT_URL.format(region=account_region)}/{game_name}/{tag_line}"
+    data = _riot_api_request(url, RIOT_METHOD_ACCOUNT_BY_RIOT_ID)
     if data and "puuid" in data:
+        save_cached_puuid(game_name, tag_line, data["puuid"])
         return data["puuid"]
     else:
         log_message(f"Could not get PUUID for {game_name}#{tag_line}")
         return None
 
 
-def get_soloq_activity_data(player_name, aggregation_type="Day"):
-    log_message(f"Getting activity data for {player_name}. Aggregate by: {aggregation_type}")
+# --- Дневной rollup soloq_daily ---
+SOLOQ_DAILY_UPSERT_SQL = """
+    INSERT INTO soloq_daily (player, day, champion, role, games, wins, kills, deaths, assists)
+    VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)
+    ON CONFLICT(player, day, champion, role) DO UPDATE SET
+        games = games + 1, wins = wins + excluded.wins,
+        kills = kills + excluded.kills, deaths = deaths + excluded.deaths, assists = assists + excluded.assists
+"""
+
+# Ключ периода графика по дню rollup (неделя начинается с понедельника)
+SOLOQ_PERIOD_SQL = {
+    "Day": "day",
+    "Week": "date(day, '-6 days', 'weekday 1')",
+    "Month": "strftime('%Y-%m-01', day)",
+}
+
+
+def add_soloq_daily_game(cursor, player_name, game_creation_ts, champion, role, win, kills, deaths, assists):
+    """Добавляет одну новую игру в soloq_daily. Вызывать в той же транзакции, что и вставку в soloq_games."""
+    day = datetime.fromtimestamp(game_creation_ts, timezone.utc).strftime("%Y-%m-%d")
+    cursor.execute(SOLOQ_DAILY_UPSERT_SQL, (player_name, day, champion, role, win, kills, deaths, assists))
+
+
+def rebuild_soloq_daily(force=False):
+    """
+    Пересчитывает soloq_daily по всем играм soloq_games.
+    Без force пересчет выполняется, только если rollup пуст, а игры уже есть (старая БД).
+    """
     conn = get_db_connection()
-    if not conn: return {}
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        if not force:
+            cursor.execute("SELECT 1 FROM soloq_daily LIMIT 1")
+            if cursor.fetchone(): return False
+            cursor.execute("SELECT 1 FROM soloq_games LIMIT 1")
+            if not cursor.fetchone(): return False
+        cursor.execute("DELETE FROM soloq_daily")
+        cursor.execute("""
+            INSERT INTO soloq_daily (player, day, champion, role, games, wins, kills, deaths, assists)
+            SELECT Player_Name, date(Timestamp, 'unixepoch'), Champion, Role,
+                   COUNT(*), SUM(Win), SUM(Kills), SUM(Deaths), SUM(Assists)
+            FROM soloq_games
+            WHERE Player_Name IS NOT NULL AND Timestamp IS NOT NULL AND Champion IS NOT NULL AND Role IS NOT NULL
+            GROUP BY Player_Name, date(Timestamp, 'unixepoch'), Champion, Role
+        """)
+        conn.commit()
+        log_message(f"[SoloQ] Rebuilt soloq_daily rollup ({cursor.rowcount} rows).")
+        return True
+    except sqlite3.Error as e:
+        log_message(f"[SoloQ] Error rebuilding soloq_daily: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
 
-    # Используем defaultdict для удобства
-    activity_data = defaultdict(lambda: {'wins': 0, 'losses': 0, 'total': 0})
+
+def get_soloq_period_buckets(player_name, aggregation_type="Day"):
+    """{ключ периода: {'games', 'wins'}} по rollup soloq_daily для графиков."""
+    period_sql = SOLOQ_PERIOD_SQL.get(aggregation_type, SOLOQ_PERIOD_SQL["Day"])
+    conn = get_db_connection()
+    if not conn: return None
     try:
         cursor = conn.cursor()
-        # Получаем Timestamp и Win для игрока
-        cursor.execute("SELECT Timestamp, Win FROM soloq_games WHERE Player_Name = ?", (player_name,))
-        rows = cursor.fetchall()
+        cursor.execute(f"""
+            SELECT {period_sql} AS period, SUM(games) AS games, SUM(wins) AS wins
+            FROM soloq_daily WHERE player = ? GROUP BY period
+        """, (player_name,))
+        return {row['period']: {'games': row['games'], 'wins': row['wins'] or 0} for row in cursor.fetchall()}
+    finally:
+        conn.close()
 
-        for row in rows:
-            ts = row['Timestamp']
-            win = row['Win'] # 0 или 1
-            # Проверка на None перед конвертацией
-            if ts is None:
-                log_message(f"Warning: Found null Timestamp for player {player_name}")
-                continue
-            try:
-                dt_object = datetime.fromtimestamp(ts, timezone.utc)
-            except (OSError, OverflowError, TypeError) as ts_err:
-                 log_message(f"Warning: Invalid timestamp {ts} for player {player_name}: {ts_err}")
-                 continue
-
-
-            if aggregation_type == "Day":
-                date_key = dt_object.strftime("%Y-%m-%d")
-            elif aggregation_type == "Week":
-                 # Начало недели (понедельник)
-                 start_of_week = dt_object - timedelta(days=dt_object.weekday())
-                 date_key = start_of_week.strftime("%Y-%m-%d")
-            elif aggregation_type == "Month":
-                 date_key = dt_object.strftime("%Y-%m-01") # Первый день месяца
-            else: # По умолчанию - день
-                 date_key = dt_object.strftime("%Y-%m-%d")
-
-            activity_data[date_key]['total'] += 1
-            # Убедимся, что win это 0 или 1
-            if win == 1:
-                activity_data[date_key]['wins'] += 1
-            else: # Считаем все остальное (0 или None) как поражение
-                activity_data[date_key]['losses'] += 1
 
+@traced()
+def get_soloq_activity_data(player_name, aggregation_type="Day"):
+    log_message(f"Getting activity data for {player_name}. Aggregate by: {aggregation_type}")
+    try:
+        buckets = get_soloq_period_buckets(player_name, aggregation_type)
     except sqlite3.Error as e:
         log_message(f"DB Error getting activity data for {player_name}: {e}")
         return {}
-    finally:
-        if conn: conn.close()
+    if buckets is None: return {}
 
     # Вернем просто словарь, его удобнее обработать в JS
+    activity_data = {
+        date_key: {'wins': data['wins'], 'losses': data['games'] - data['wins'], 'total': data['games']}
+        for date_key, data in buckets.items()
+    }
     log_message(f"Activity data processed for {player_name}. Found {len(activity_data)} points.")
-    return dict(activity_data)
+    return activity_data
 
-def get_match_ids(puuid, count=20, start_time=None):
-    """Получает список ID матчей для PUUID."""
+def get_match_ids(puuid, count=20, start_time=None, start=0, region=DEFAULT_REGION):
+    """Получает список ID матчей для PUUID (новые первыми). start/count - страница истории."""
     # Уменьшил count до 20 для ускорения обновлений, можно увеличить до 100
-    url = f"{BASE_MATCH_HISTORY_URL}/{puuid}/ids?start=0&count={count}"
+    url = f"{BASE_MATCH_HISTORY_URL.format(region=region)}/{puuid}/ids?start={start}&count={count}"
     if start_time: # Опционально: фильтр по времени начала (Unix timestamp seconds)
         url += f"&startTime={start_time}"
     # Добавляем тип матча - только ranked solo/duo (420)
     url += "&queue=420"
-    match_ids = _riot_api_request(url)
+    match_ids = _riot_api_request(url, RIOT_METHOD_MATCH_IDS_BY_PUUID)
     # API возвращает список строк или None при ошибке
     return match_ids if isinstance(match_ids, list) else []
 
-def get_match_details(match_id):
+def collect_match_ids(puuid, start_time=None, request_budget=None, region=DEFAULT_REGION):
+    """
+    Постранично собирает все ID матчей начиная со start_time (страницы по MATCH_IDS_PAGE_SIZE).
+    request_budget - SoloQRequestBudget, из которого берется по запросу на страницу (None - без ограничения).
+    Возвращает (match_ids новые первыми, история получена полностью, потрачено запросов).
+    """
+    match_ids = []
+    requests_used = 0
+    start = 0
+    while request_budget is None or request_budget.take(1):
+        page = get_match_ids(puuid, count=MATCH_IDS_PAGE_SIZE, start_time=start_time, start=start, region=region)
+        requests_used += 1
+        match_ids.extend(page)
+        if len(page) < MATCH_IDS_PAGE_SIZE:
+            return match_ids, True, requests_used
+        start += MATCH_IDS_PAGE_SIZE
+    return match_ids, False, requests_used
+
+def get_account_sync_state(cursor, puuid):
+    """High-water mark аккаунта: время создания последней игры, до которой история загружена без пропусков."""
+    cursor.execute("SELECT last_seen_ts FROM soloq_account_sync WHERE puuid = ?", (puuid,))
+    row = cursor.fetchone()
+    return row['last_seen_ts'] if row else None
+
+def save_account_sync_state(cursor, puuid, player_name, last_seen_ts):
+    cursor.execute("""
+        INSERT INTO soloq_account_sync (puuid, player_name, last_seen_ts, last_refresh_ts) VALUES (?, ?, ?, ?)
+        ON CONFLICT(puuid) DO UPDATE SET player_name = excluded.player_name,
+            last_seen_ts = CASE WHEN excluded.last_seen_ts IS NULL THEN last_seen_ts
+                                ELSE MAX(COALESCE(last_seen_ts, 0), excluded.last_seen_ts) END,
+            last_refresh_ts = excluded.last_refresh_ts
+    """, (puuid, player_name, last_seen_ts, int(time.time())))
+
+def get_match_details(match_id, region=DEFAULT_REGION):
     """Получает детали конкретного матча по его ID."""
-    url = f"{BASE_MATCH_DETAIL_URL}/{match_id}"
-    return _riot_api_request(url)
+    url = f"{BASE_MATCH_DETAIL_URL.format(region=region)}/{match_id}"
+    return _riot_api_request(url, RIOT_METHOD_MATCH_BY_ID)
+
+class SoloQRequestBudget:
+    """Бюджет запросов к Match API на одно обновление игрока; общий для всех его аккаунтов и потоков."""
+    def __init__(self, total):
+        self.remaining = total
+        self._lock = threading.Lock()
+
+    def take(self, count):
+        """Забирает до count запросов из бюджета. Возвращает, сколько удалось взять."""
+        with self._lock:
+            granted = max(0, min(count, self.remaining))
+            self.remaining -= granted
+            return granted
 
 # --- Логика сохранения данных в БД ---
-def fetch_and_store_soloq_data(player_name):
+def fetch_and_store_soloq_data(player_name, backfill=False, request_budget=SOLOQ_REQUEST_BUDGET, accounts=None):
     """
     Загружает историю матчей SoloQ для игрока из Riot API
     и сохраняет новые игры в базу данных SQLite.
+
+    Обычное обновление запрашивает только игры новее high-water mark аккаунта.
+    backfill=True заново проходит всю историю с SOLOQ_BACKFILL_START_TIME (уже сохраненные игры не запрашиваются).
+    request_budget ограничивает число запросов к Match API (число или SoloQRequestBudget, общий для нескольких
+    одновременных вызовов по одному игроку); недогруженное продолжится при следующем обновлении.
+    accounts - список (game_name, tag_line, region) для обновления; по умолчанию все аккаунты игрока из soloq_accounts.
     """
     if not RIOT_API_KEY:
         log_message(f"Skipping SoloQ update for {player_name}: RIOT_API_KEY not set.")
         return 0
 
-    player_config = TEAM_ROSTERS["Gamespace"].get(player_name)
-    if not player_config:
-        log_message(f"Player {player_name} not found in TEAM_ROSTERS.")
-        return 0
+    if accounts is None:
+        player_config = get_soloq_players().get(player_name)
+        if not player_config:
+            log_message(f"Player {player_name} not found in SoloQ rosters.")
+            return 0
+        accounts = player_config["accounts"]
 
     log_message(f"Starting SoloQ update for {player_name}...")
     added_count_total = 0
@@ -184,33 +506,47 @@ def fetch_and_store_soloq_data(player_name):
     if not conn: return -1 # Ошибка подключения к БД
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT Match_ID FROM soloq_games WHERE Player_Name = ?", (player_name,))
-        existing_match_ids = {row['Match_ID'] for row in cursor.fetchall()}
+        cursor.execute("SELECT Match_ID, Timestamp FROM soloq_games WHERE Player_Name = ?", (player_name,))
+        existing_match_ids = {row['Match_ID']: row['Timestamp'] for row in cursor.fetchall()}
         log_message(f"Found {len(existing_match_ids)} existing SoloQ games for {player_name} in DB.")
     except sqlite3.Error as e:
         log_message(f"Error reading existing SoloQ games for {player_name}: {e}")
-        existing_match_ids = set() # Продолжаем без проверки дубликатов в случае ошибки
+        existing_match_ids = {} # Продолжаем без проверки дубликатов в случае ошибки
+    budget = request_budget if isinstance(request_budget, SoloQRequestBudget) else SoloQRequestBudget(request_budget)
 
     # Перебираем все Riot ID аккаунты игрока
-    for game_name, tag_line in zip(player_config.get("game_name", []), player_config.get("tag_line", [])):
+    for game_name, tag_line, region in accounts:
         processed_accounts += 1
-        log_message(f"Processing account {processed_accounts}/{len(player_config.get('game_name', []))}: {game_name}#{tag_line}")
+        log_message(f"Processing account {processed_accounts}/{len(accounts)}: {game_name}#{tag_line} ({region})")
 
-        puuid = get_puuid(game_name, tag_line)
-        time.sleep(RIOT_API_DELAY) # Задержка после запроса PUUID
+        puuid = get_puuid(game_name, tag_line, region=region)
 
         if not puuid:
+            _mark_soloq_account_refreshed(cursor, game_name, tag_line) # Не ставим аккаунт в начало очереди снова
+            conn.commit()
             continue # Переходим к следующему аккаунту, если PUUID не найден
 
-        match_ids = get_match_ids(puuid, count=100) # Берем последние 30 игр (можно настроить)
-        time.sleep(RIOT_API_DELAY) # Задержка после запроса истории
+        if budget.remaining <= 0:
+            log_message(f"Request budget exhausted, skipping {game_name}#{tag_line} until next update.")
+            continue
+
+        last_seen_ts = get_account_sync_state(cursor, puuid)
+        if backfill or last_seen_ts is None: start_time = SOLOQ_BACKFILL_START_TIME
+        else: start_time = last_seen_ts + 1
+        match_ids, history_complete, _ = collect_match_ids(puuid, start_time, budget, region=region)
 
         if not match_ids:
             log_message(f"No recent SoloQ match IDs found for {game_name}#{tag_line} (PUUID: {puuid})")
+            if history_complete and last_seen_ts is None: save_account_sync_state(cursor, puuid, player_name, None)
+            _mark_soloq_account_refreshed(cursor, game_name, tag_line)
+            conn.commit()
             continue
 
+        # Старые игры первыми: если бюджет кончится, high-water mark останется перед первой пропущенной игрой
+        match_ids.reverse()
         new_match_ids = [m_id for m_id in match_ids if m_id not in existing_match_ids]
-        log_message(f"Found {len(new_match_ids)} new match(es) to process for {game_name}#{tag_line}.")
+        new_match_ids = new_match_ids[:budget.take(len(new_match_ids))]
+        log_message(f"Found {len(new_match_ids)} new match(es) to process for {game_name}#{tag_line} (startTime: {start_time}).")
 
         added_count_for_account = 0
         sql_column_names_db = [hdr.replace(" ", "_").replace(".", "").replace("-", "_") for hdr in SOLOQ_GAMES_HEADER]
@@ -219,10 +555,11 @@ def fetch_and_store_soloq_data(player_name):
         sql_placeholders_db = ", ".join(["?"] * len(sql_column_names_db))
         insert_sql = f"INSERT OR IGNORE INTO soloq_games ({columns_string_db}) VALUES ({sql_placeholders_db})"
 
-        for match_id in new_match_ids:
-            match_details = get_match_details(match_id)
-            time.sleep(RIOT_API_DELAY) # Задержка после запроса деталей матча
+        # Детали матчей запрашиваем параллельно, темп задает RIOT_RATE_LIMITER
+        with ThreadPoolExecutor(max_workers=SOLOQ_FETCH_WORKERS) as executor:
+            match_details_list = list(executor.map(lambda m_id: get_match_details(m_id, region), new_match_ids))
 
+        for match_id, match_details in zip(new_match_ids, match_details_list):
             if not match_details or "info" not in match_details:
                 log_message(f"Failed to get details for Match ID: {match_id}")
                 continue
@@ -240,6 +577,7 @@ def fetch_and_store_soloq_data(player_name):
 
             if not player_part_data:
                 log_message(f"Could not find participant data for PUUID {puuid} in Match ID: {match_id}")
+                existing_match_ids[match_id] = game_creation_ts # Повторный запрос не поможет, считаем обработанным
                 continue
 
             # Извлекаем нужные данные
@@ -277,12 +615,24 @@ def fetch_and_store_soloq_data(player_name):
             try:
                 cursor.execute(insert_sql, data_tuple)
                 if cursor.rowcount > 0:
+                    add_soloq_daily_game(cursor, player_name, game_creation_ts, champion, role_normalized, win, kills, deaths, assists)
                     added_count_for_account += 1
-                    existing_match_ids.add(match_id) # Добавляем в сет, чтобы не обработать снова
+                existing_match_ids[match_id] = game_creation_ts # Запоминаем, чтобы не обработать снова
             except sqlite3.Error as e:
                  log_message(f"DB Insert Error SoloQ Match:{match_id} for Player:{player_name}: {e}")
                  log_message(f"Data attempted (SoloQ): {data_tuple}")
 
+        # High-water mark двигаем только по непрерывному префиксу загруженных игр (от старых к новым),
+        # и только если список ID получен полностью
+        if history_complete:
+            contiguous_ts = None
+            for match_id in match_ids:
+                if match_id not in existing_match_ids: break
+                match_ts = existing_match_ids[match_id]
+                if match_ts is not None: contiguous_ts = max(contiguous_ts or 0, match_ts)
+            save_account_sync_state(cursor, puuid, player_name, contiguous_ts)
+        _mark_soloq_account_refreshed(cursor, game_name, tag_line)
+
         # Коммит после обработки одного Riot ID аккаунта
         try:
             conn.commit()
@@ -298,141 +648,272 @@ def fetch_and_store_soloq_data(player_name):
     return added_count_total
 
 
-# --- Логика агрегации данных из БД ---
-def aggregate_soloq_data_from_db(player_name, time_filter="All Time", date_from_str=None, date_to_str=None):
-    log_message(f"Aggregating SoloQ data for {player_name}. Time filter: {time_filter}, Dates: {date_from_str} - {date_to_str}") # Добавил даты в лог
-    player_config = TEAM_ROSTERS["Gamespace"].get(player_name)
-    if not player_config:
-        log_message(f"Cannot aggregate: Player {player_name} not in roster.")
-        return {}
-    player_main_role = player_config.get("role")
+def _run_region_workers(jobs_by_region, backfill=False):
+    """
+    Обновляет аккаунты, по одному потоку на регион (лимиты Riot API у каждого региона свои);
+    внутри региона до SOLOQ_ACCOUNT_WORKERS аккаунтов одновременно, темп задает RIOT_RATE_LIMITER.
+    У каждого игрока один SOLOQ_REQUEST_BUDGET на все его аккаунты во всех регионах.
+    jobs_by_region: {region: [(player_name, game_name, tag_line), ...]}.
+    Возвращает {player_name: число добавленных игр или -1 при ошибке}.
+    """
+    results = {}
+    results_lock = threading.Lock()
+    budgets = {player_name: SoloQRequestBudget(SOLOQ_REQUEST_BUDGET)
+               for jobs in jobs_by_region.values() for player_name, _, _ in jobs}
+
+    def _account_job(region, player_name, game_name, tag_line):
+        try:
+            added_count = fetch_and_store_soloq_data(player_name, backfill, budgets[player_name], accounts=[(game_name, tag_line, region)])
+        except Exception as e:
+            log_message(f"Error during SoloQ update for {player_name} ({game_name}#{tag_line}, {region}): {e}")
+            log_message(traceback.format_exc())
+            added_count = -1
+        with results_lock:
+            previous = results.get(player_name, 0)
+            results[player_name] = -1 if -1 in (previous, added_count) else previous + added_count
+
+    def _region_worker(region, jobs):
+        with ThreadPoolExecutor(max_workers=min(SOLOQ_ACCOUNT_WORKERS, len(jobs))) as executor:
+            for future in [executor.submit(_account_job, region, *job) for job in jobs]:
+                future.result()
+
+    jobs_by_region = {region: jobs for region, jobs in jobs_by_region.items() if jobs}
+    if not jobs_by_region: return results
+    with ThreadPoolExecutor(max_workers=len(jobs_by_region)) as executor:
+        for future in [executor.submit(_region_worker, region, jobs) for region, jobs in jobs_by_region.items()]:
+            future.result()
+    return results
+
+
+def fetch_and_store_soloq_data_for_players(player_names, backfill=False):
+    """
+    Обновляет SoloQ для нескольких игроков одновременно (аккаунты разных регионов - параллельно).
+    backfill=True - догрузить всю доступную историю, а не только игры новее high-water mark.
+    Возвращает {player_name: число добавленных игр или -1 при ошибке}.
+    """
+    players = get_soloq_players()
+    jobs_by_region = defaultdict(list)
+    results = {}
+    for player_name in player_names:
+        player_config = players.get(player_name)
+        if not player_config:
+            log_message(f"Player {player_name} not found in SoloQ rosters.")
+            results[player_name] = 0
+            continue
+        results[player_name] = 0
+        for game_name, tag_line, region in player_config["accounts"]:
+            jobs_by_region[region].append((player_name, game_name, tag_line))
+    results.update(_run_region_workers(jobs_by_region, backfill))
+    return results
 
+
+# --- Фоновое обновление пула аккаунтов (round-robin) ---
+def select_stalest_soloq_accounts(interval_seconds=None, max_staleness_seconds=None):
+    """
+    Для каждого региона выбирает самые давно обновленные аккаунты.
+    Размер пачки = ceil(аккаунтов в регионе * интервал / допустимая устарелость),
+    поэтому при обновлении каждые interval_seconds весь пул обходится за max_staleness_seconds.
+    Возвращает {region: [(player_name, game_name, tag_line), ...]}.
+    """
+    interval_seconds = interval_seconds or SOLOQ_REFRESH_INTERVAL_SECONDS
+    max_staleness_seconds = max_staleness_seconds or SOLOQ_MAX_STALENESS_SECONDS
     conn = get_db_connection()
     if not conn: return {}
+    jobs_by_region = {}
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT region, COUNT(*) AS accounts FROM soloq_accounts GROUP BY region")
+        for row in cursor.fetchall():
+            batch_size = max(1, math.ceil(row['accounts'] * interval_seconds / max_staleness_seconds))
+            cursor.execute("""
+                SELECT player_name, game_name, tag_line FROM soloq_accounts
+                WHERE region = ? ORDER BY COALESCE(last_refresh_ts, 0), rowid LIMIT ?
+            """, (row['region'], batch_size))
+            jobs_by_region[row['region']] = [tuple(job) for job in cursor.fetchall()]
+    except sqlite3.Error as e:
+        log_message(f"DB Error selecting SoloQ accounts to refresh: {e}")
+    finally:
+        conn.close()
+    return jobs_by_region
+
+
+def refresh_stalest_soloq_accounts():
+    """Один шаг round-robin обновления. Возвращает {player_name: добавлено игр}."""
+    jobs_by_region = select_stalest_soloq_accounts()
+    log_message("[SoloQ] Scheduled refresh: " + ", ".join(f"{region}: {len(jobs)}" for region, jobs in jobs_by_region.items()))
+    return _run_region_workers(jobs_by_region)
+
+
+_soloq_scheduler_thread = None
+_soloq_scheduler_lock = threading.Lock()
+
+def run_soloq_refresh_loop():
+    """
+    Бесконечный цикл round-robin обновления (шаг каждые SOLOQ_REFRESH_INTERVAL_SECONDS).
+    Шаг должен укладываться в интервал, иначе реальная устарелость будет больше SOLOQ_MAX_STALENESS_SECONDS.
+    Лимитер Riot API общий только внутри процесса, поэтому цикл должен работать в одном процессе на ключ.
+    """
+    while True:
+        started = time.monotonic()
+        try:
+            refresh_stalest_soloq_accounts()
+        except Exception as e:
+            log_message(f"[SoloQ] Scheduled refresh failed: {e}")
+            log_message(traceback.format_exc())
+        elapsed = time.monotonic() - started
+        if elapsed > SOLOQ_REFRESH_INTERVAL_SECONDS:
+            log_message(f"[SoloQ] Scheduled refresh took {elapsed:.0f}s, longer than the {SOLOQ_REFRESH_INTERVAL_SECONDS}s interval.")
+        time.sleep(max(0, SOLOQ_REFRESH_INTERVAL_SECONDS - elapsed))
+
+def start_soloq_refresh_scheduler():
+    """
+    Запускает run_soloq_refresh_loop в фоновом потоке (если SOLOQ_REFRESH_INTERVAL_SECONDS > 0).
+    Вызывается только из процесса, который обслуживает запросы при `python app.py`;
+    при WSGI-сервере с несколькими воркерами цикл запускается отдельно: `python soloq_scheduler.py`.
+    """
+    global _soloq_scheduler_thread
+    if SOLOQ_REFRESH_INTERVAL_SECONDS <= 0 or not RIOT_API_KEY: return False
+    with _soloq_scheduler_lock:
+        if _soloq_scheduler_thread is not None: return False
+        _soloq_scheduler_thread = threading.Thread(target=run_soloq_refresh_loop, name="soloq-refresh-scheduler", daemon=True)
+        _soloq_scheduler_thread.start()
+    log_message(f"[SoloQ] Refresh scheduler started (interval {SOLOQ_REFRESH_INTERVAL_SECONDS}s, max staleness {SOLOQ_MAX_STALENESS_SECONDS}s).")
+    return True
 
-    # --- Фильтр по времени ---
-    sql = "SELECT Champion, Win, Kills, Deaths, Assists, Role FROM soloq_games WHERE Player_Name = ?"
-    params = [player_name]
-    date_filter_active = False
 
+# --- Логика агрегации данных из БД ---
+def get_soloq_time_window(time_filter="All Time", date_from_str=None, date_to_str=None):
+    """
+    Переводит фильтр страницы SoloQ в окно по rollup soloq_daily.
+    Возвращает (day_from, day_to, partial_day_range): границы полных дней 'YYYY-MM-DD' (или None)
+    и (ts_from, ts_to) - часть дня на границе фильтра "N weeks", которую считаем по отдельным играм.
+    """
     # Приоритет у ручного выбора дат
     if date_from_str or date_to_str:
         try:
-            if date_from_str:
-                # Добавляем 00:00:00 к начальной дате
-                dt_from = datetime.strptime(date_from_str + " 00:00:00", "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-                ts_from = int(dt_from.timestamp())
-                sql += " AND Timestamp >= ?"
-                params.append(ts_from)
-                # log_message(f"Applying date filter: Timestamp >= {dt_from}")
-                date_filter_active = True
-            if date_to_str:
-                # Добавляем 23:59:59 к конечной дате
-                dt_to = datetime.strptime(date_to_str + " 23:59:59", "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-                ts_to = int(dt_to.timestamp())
-                sql += " AND Timestamp <= ?"
-                params.append(ts_to)
-                # log_message(f"Applying date filter: Timestamp <= {dt_to}")
-                date_filter_active = True
+            day_from = datetime.strptime(date_from_str, "%Y-%m-%d").strftime("%Y-%m-%d") if date_from_str else None
+            day_to = datetime.strptime(date_to_str, "%Y-%m-%d").strftime("%Y-%m-%d") if date_to_str else None
+            return day_from, day_to, None
         except ValueError:
              log_message(f"Invalid date format received: from='{date_from_str}', to='{date_to_str}'. Ignoring date filter.")
-             date_filter_active = False # Сбрасываем флаг при ошибке
 
     # Если ручные даты не применились, используем dropdown
-    if not date_filter_active and time_filter != "All Time":
-        now_utc_ts = int(datetime.now(timezone.utc).timestamp())
-        delta_seconds = None
-        if time_filter == "1 week": delta_seconds = timedelta(weeks=1).total_seconds()
-        elif time_filter == "2 weeks": delta_seconds = timedelta(weeks=2).total_seconds()
-        elif time_filter == "3 weeks": delta_seconds = timedelta(weeks=3).total_seconds()
-        elif time_filter == "4 weeks": delta_seconds = timedelta(weeks=4).total_seconds()
-
-        if delta_seconds:
-            cutoff_ts = now_utc_ts - delta_seconds
-            sql += " AND Timestamp >= ?"
-            params.append(int(cutoff_ts))
-            # log_message(f"Applying time filter: {time_filter} (Timestamp >= {datetime.fromtimestamp(cutoff_ts, timezone.utc)})") # Скрыл лог
-        # else: log_message(f"Warning: Unknown time filter '{time_filter}'.")
+    delta_seconds = None
+    if time_filter == "1 week": delta_seconds = timedelta(weeks=1).total_seconds()
+    elif time_filter == "2 weeks": delta_seconds = timedelta(weeks=2).total_seconds()
+    elif time_filter == "3 weeks": delta_seconds = timedelta(weeks=3).total_seconds()
+    elif time_filter == "4 weeks": delta_seconds = timedelta(weeks=4).total_seconds()
+    if not delta_seconds: return None, None, None
+
+    cutoff_ts = int(datetime.now(timezone.utc).timestamp() - delta_seconds)
+    cutoff_dt = datetime.fromtimestamp(cutoff_ts, timezone.utc)
+    next_day_dt = cutoff_dt.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return next_day_dt.strftime("%Y-%m-%d"), None, (cutoff_ts, int(next_day_dt.timestamp()))
+
+
+@traced()
+def aggregate_soloq_data_for_players(player_names, time_filter="All Time", date_from_str=None, date_to_str=None):
+    """
+    Статистика чемпионов на основной роли сразу для нескольких игроков.
+    Один grouped-запрос к soloq_daily на весь состав (плюс один к soloq_games для неполного дня).
+    Возвращает {player_name: [статистика по чемпионам]}.
+    """
+    log_message(f"Aggregating SoloQ data for {len(player_names)} player(s). Time filter: {time_filter}, Dates: {date_from_str} - {date_to_str}")
+    players = get_soloq_players()
+    roster = []
+    for player_name in player_names:
+        player_config = players.get(player_name)
+        if not player_config:
+            log_message(f"Cannot aggregate: Player {player_name} not in roster.")
+            continue
+        roster.append((player_name, player_config.get("role")))
+    if not roster: return {}
+
+    day_from, day_to, partial_day_range = get_soloq_time_window(time_filter, date_from_str, date_to_str)
 
     # --- Агрегация ---
-    aggregated_data = defaultdict(lambda: {'games': 0, 'wins': 0, 'kills': 0, 'deaths': 0, 'assists': 0})
+    # Полные дни берутся из rollup soloq_daily; если граница периода внутри дня
+    # (фильтр "N weeks"), этот день добирается из soloq_games по индексу (Player_Name, Timestamp)
+    roster_cte = "WITH roster(player, role) AS (VALUES " + ", ".join(["(?, ?)"] * len(roster)) + ")"
+    roster_params = [value for pair in roster for value in pair]
+    daily_sql = f"""
+        {roster_cte}
+        SELECT d.player AS player, d.champion AS champion, SUM(d.games) AS games, SUM(d.wins) AS wins,
+               SUM(d.kills) AS kills, SUM(d.deaths) AS deaths, SUM(d.assists) AS assists
+        FROM roster JOIN soloq_daily d ON d.player = roster.player AND d.role = roster.role"""
+    daily_params = list(roster_params)
+    day_conditions = []
+    if day_from: day_conditions.append("d.day >= ?"); daily_params.append(day_from)
+    if day_to: day_conditions.append("d.day <= ?"); daily_params.append(day_to)
+    if day_conditions: daily_sql += " WHERE " + " AND ".join(day_conditions)
+    daily_sql += " GROUP BY d.player, d.champion"
+
+    aggregated_data = defaultdict(lambda: defaultdict(lambda: {'games': 0, 'wins': 0, 'kills': 0, 'deaths': 0, 'assists': 0}))
+    conn = get_db_connection()
+    if not conn: return {}
     try:
         cursor = conn.cursor()
-        cursor.execute(sql, params)
+        cursor.execute(daily_sql, daily_params)
         rows = cursor.fetchall()
-        # log_message(f"Fetched {len(rows)} SoloQ games for {player_name} from DB matching filters.") # Скрыл лог
+        if partial_day_range:
+            cursor.execute(f"""
+                {roster_cte}
+                SELECT g.Player_Name AS player, g.Champion AS champion, COUNT(*) AS games, SUM(g.Win) AS wins,
+                       SUM(g.Kills) AS kills, SUM(g.Deaths) AS deaths, SUM(g.Assists) AS assists
+                FROM roster JOIN soloq_games g ON g.Player_Name = roster.player AND g.Role = roster.role
+                WHERE g.Timestamp >= ? AND g.Timestamp < ?
+                GROUP BY g.Player_Name, g.Champion
+            """, roster_params + list(partial_day_range))
+            rows += cursor.fetchall()
 
         for row in rows:
-            game = dict(row)
-            if game.get("Role") == player_main_role: # Фильтр по основной роли
-                champion = game.get("Champion")
-                if champion:
-                    stats = aggregated_data[champion]
-                    stats['games'] += 1
-                    stats['wins'] += game.get("Win", 0)
-                    stats['kills'] += game.get("Kills", 0)
-                    stats['deaths'] += game.get("Deaths", 0)
-                    stats['assists'] += game.get("Assists", 0)
-
-    except sqlite3.Error as e: log_message(f"DB Error aggregating SoloQ data for {player_name}: {e}"); return {}
+            if row["champion"]:
+                stats = aggregated_data[row["player"]][row["champion"]]
+                for key in ('games', 'wins', 'kills', 'deaths', 'assists'):
+                    stats[key] += row[key] or 0
+
+    except sqlite3.Error as e: log_message(f"DB Error aggregating SoloQ data: {e}"); return {}
     finally: conn.close()
 
     # --- Форматирование результата ---
-    formatted_stats = []
-    # Загружаем данные чемпионов один раз перед циклом
+    # Данные чемпионов загружаем один раз, иконку строим один раз на чемпиона для всего состава
     champ_data_local = get_champion_data()
-    for champ, data in aggregated_data.items():
-        games = data['games']
-        if games > 0:
-            win_rate = round((data['wins'] / games) * 100, 1)
-            deaths = max(1, data['deaths'])
-            kda = round((data['kills'] + data['assists']) / deaths, 1)
-            formatted_stats.append({ "Champion": champ, "Games": games, "WinRate": win_rate, "KDA": kda, "icon_html": get_champion_icon_html(champ, champ_data_local, width=30, height=30) })
+    icon_html_cache = {}
+    result = {}
+    for player_name, _ in roster:
+        formatted_stats = []
+        for champ, data in aggregated_data.get(player_name, {}).items():
+            games = data['games']
+            if games > 0:
+                win_rate = round((data['wins'] / games) * 100, 1)
+                deaths = max(1, data['deaths'])
+                kda = round((data['kills'] + data['assists']) / deaths, 1)
+                if champ not in icon_html_cache:
+                    icon_html_cache[champ] = get_champion_icon_html(champ, champ_data_local, width=30, height=30)
+                formatted_stats.append({ "Champion": champ, "Games": games, "WinRate": win_rate, "KDA": kda, "icon_html": icon_html_cache[champ] })
+        formatted_stats.sort(key=lambda x: x['Games'], reverse=True)
+        result[player_name] = formatted_stats
+    return result
 
-    formatted_stats.sort(key=lambda x: x['Games'], reverse=True)
-    # log_message(f"Aggregation complete for {player_name}. Found stats for {len(formatted_stats)} champions.") # Скрыл лог
-    return formatted_stats
+
+def aggregate_soloq_data_from_db(player_name, time_filter="All Time", date_from_str=None, date_to_str=None):
+    """Статистика чемпионов одного игрока (обертка над aggregate_soloq_data_for_players)."""
+    return aggregate_soloq_data_for_players([player_name], time_filter, date_from_str, date_to_str).get(player_name, {})
 
 
 # --- Логика получения данных для графика ---
 def get_soloq_timeline_data(player_name, aggregation_type="Day"):
     """Получает данные для графика игр по времени из БД."""
     log_message(f"Getting timeline data for {player_name}. Aggregate by: {aggregation_type}")
-    conn = get_db_connection()
-    if not conn: return []
-
-    timeline_data = defaultdict(int)
     try:
-        cursor = conn.cursor()
-        # Получаем все временные метки для игрока
-        cursor.execute("SELECT Timestamp FROM soloq_games WHERE Player_Name = ?", (player_name,))
-        rows = cursor.fetchall()
-
-        for row in rows:
-            ts = row['Timestamp']
-            dt_object = datetime.fromtimestamp(ts, timezone.utc)
-
-            if aggregation_type == "Day":
-                date_key = dt_object.strftime("%Y-%m-%d")
-            elif aggregation_type == "Week":
-                 # Начало недели (понедельник)
-                 start_of_week = dt_object - timedelta(days=dt_object.weekday())
-                 date_key = start_of_week.strftime("%Y-%m-%d")
-            elif aggregation_type == "Month":
-                 date_key = dt_object.strftime("%Y-%m-01") # Первый день месяца
-            else: # По умолчанию - день
-                 date_key = dt_object.strftime("%Y-%m-%d")
-
-            timeline_data[date_key] += 1
-
+        buckets = get_soloq_period_buckets(player_name, aggregation_type)
     except sqlite3.Error as e:
         log_message(f"DB Error getting timeline data for {player_name}: {e}")
         return []
-    finally:
-        conn.close()
+    if buckets is None: return []
 
     # Преобразуем в список словарей и сортируем по дате
-    formatted_timeline = [{"date": date_str, "count": count} for date_str, count in timeline_data.items()]
+    formatted_timeline = [{"date": date_str, "count": data['games']} for date_str, data in buckets.items()]
     formatted_timeline.sort(key=lambda x: x['date'])
 
     log_message(f"Timeline data processed for {player_name}. Found {len(formatted_timeline)} points.")
@@ -0,0 +1,30 @@
+# soloq_scheduler.py
+# Отдельный процесс фонового обновления SoloQ для запуска рядом с WSGI-сервером (gunicorn и т.п.):
+# воркеры сервера импортируют app.py и планировщик не запускают, а один этот процесс обходит пул аккаунтов.
+#
+#   SOLOQ_REFRESH_INTERVAL_SECONDS=300 python soloq_scheduler.py
+
+import os
+import sys
+
+from dotenv import load_dotenv
+
+_basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(_basedir, '.env')
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# Ключи и интервал читаются при импорте, поэтому импорт - после загрузки .env
+from database import init_db  # noqa: E402
+from log_utils import log_message  # noqa: E402
+from soloq_logic import RIOT_API_KEY, SOLOQ_REFRESH_INTERVAL_SECONDS, run_soloq_refresh_loop, seed_soloq_rosters  # noqa: E402
+
+
+if __name__ == '__main__':
+    if SOLOQ_REFRESH_INTERVAL_SECONDS <= 0 or not RIOT_API_KEY:
+        log_message("[SoloQ] Scheduler not started: set SOLOQ_REFRESH_INTERVAL_SECONDS > 0 and RIOT_API_KEY.")
+        sys.exit(1)
+    init_db()
+    seed_soloq_rosters()
+    log_message(f"[SoloQ] Refresh loop started (interval {SOLOQ_REFRESH_INTERVAL_SECONDS}s).")
+    run_soloq_refresh_loop()
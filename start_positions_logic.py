@@ -4,10 +4,13 @@ import sqlite3
 import json
 from collections import defaultdict
 # <<< ИЗМЕНЕНИЯ: Добавлены импорты для генерации иконок
-from scrims_logic import log_message, get_champion_data, get_champion_icon_html
+from log_utils import log_message
+from scrims_logic import get_champion_data, get_champion_icon_html
 from database import get_db_connection
+from perf_tracing import traced
 from tournament_logic import TEAM_TAG_TO_FULL_NAME, UNKNOWN_BLUE_TAG, UNKNOWN_RED_TAG
 
+@traced()
 def get_start_positions_data(selected_team_full_name, selected_champion, games_filter):
     """
     Извлекает данные о стартовых позициях и таймлайны для выбранной команды и фильтров.
@@ -103,7 +106,7 @@ def get_start_positions_data(selected_team_full_name, selected_champion, games_f
             placeholders = ','.join(['?'] * len(game_ids_to_query))
             pos_query = f"""
                 SELECT game_id, timestamp_ms, player_puuid, pos_x, pos_z
-                FROM player_positions_timeline
+                FROM player_positions_all
                 WHERE game_id IN ({placeholders}) AND timestamp_ms <= 100000
                 ORDER BY timestamp_ms
             """
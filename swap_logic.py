@@ -11,7 +11,8 @@ except ImportError:
     Point, Polygon = None, None
 
 from database import get_db_connection
-from scrims_logic import log_message
+from perf_tracing import traced
+from log_utils import log_message
 from tournament_logic import TEAM_TAG_TO_FULL_NAME, UNKNOWN_BLUE_TAG, UNKNOWN_RED_TAG, rift_zones, rift_zone_polygons_list
 
 ZONE_POLYGONS = {}
@@ -70,6 +71,7 @@ def _get_zone_name_and_simplify(x, y):
     # Если точка не попала ни в один полигон, она также игнорируется
     return None
 
+@traced()
 def get_swap_data(selected_team_full_name, selected_champion, games_filter):
     conn = get_db_connection()
     if not conn:
@@ -163,7 +165,7 @@ def get_swap_data(selected_team_full_name, selected_champion, games_filter):
             placeholders = ','.join(['?'] * len(game_ids_to_query))
             pos_query = f"""
                 SELECT timestamp_ms, player_puuid, pos_x, pos_z
-                FROM player_positions_timeline
+                FROM player_positions_all
                 WHERE game_id IN ({placeholders}) AND timestamp_ms BETWEEN 180000 AND 420000
             """
             cursor.execute(pos_query, game_ids_to_query)
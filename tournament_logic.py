@@ -5,9 +5,10 @@ import os
 import time
 import sqlite3
 from datetime import datetime, timezone
-from collections import defaultdict, deque
+from collections import defaultdict
 import math
 import json
+import struct
 import traceback
 
 # Attempt to import Shapely for zone detection
@@ -18,14 +19,15 @@ except ImportError:
     SHAPELY_AVAILABLE = False
     Point, Polygon = None, None
 
+from log_utils import log_message
 from scrims_logic import (
-    log_message,
     post_graphql_request,
     get_rest_request,
-    get_series_state,
+    get_series_states_batch,
     download_riot_summary_data,
     download_riot_livestats_data,
     API_REQUEST_DELAY,
+    GRID_INGEST_DEADLINE_SECONDS,
     ROLE_ORDER_FOR_SHEET,
     get_latest_patch_version,
     normalize_champion_name_for_ddragon,
@@ -33,6 +35,8 @@ from scrims_logic import (
     get_champion_icon_html
 )
 from database import get_db_connection, TOURNAMENT_GAMES_HEADER
+from retry_policy import deadline_exceeded, with_ingest_deadline
+from perf_tracing import traced
 
 # --- Constants ---
 TARGET_TOURNAMENT_ID = "828727"
@@ -51,6 +55,20 @@ GANK_PRESENCE_THRESHOLD = 2.0
 TARGET_POSITION_TIMESTAMPS_SEC = [40, 60, 80]
 TIMESTAMP_TOLERANCE_SEC = 5.0
 PROXIMITY_DISTANCE_THRESHOLD = 2000 # Новая константа для Proximity
+# Полный путь лесника за всю игру (все кэмпы, ганки и объекты), хранится отдельно в jungle_pathing_full.
+# По умолчанию выключен: обычная загрузка останавливает чтение livestats после первой зачистки,
+# а 2-я/3-я зачистки догружаются по запросу через /backfill_jungle_paths (backfill_full_jungle_paths).
+JUNGLE_FULL_PATH_ENABLED = os.getenv("JUNGLE_FULL_PATH_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Порядок драфта (номер действия 1..20 -> сторона и фаза)
+BLUE_DRAFT_SEQS = [1, 3, 5, 7, 10, 11, 14, 16, 18, 19]
+RED_DRAFT_SEQS = [2, 4, 6, 8, 9, 12, 13, 15, 17, 20]
+BLUE_PICK_SEQ_TO_PHASE = {7: 'B1', 10: 'B2-3', 11: 'B2-3', 18: 'B4-5', 19: 'B4-5'}
+RED_PICK_SEQ_TO_PHASE = {8: 'R1-2', 9: 'R1-2', 12: 'R3', 17: 'R4', 20: 'R5'}
+PICK_PHASE_TO_PATTERN_KEY = {'B1': 'B1', 'B2-3': 'B2_B3', 'B4-5': 'B4_B5',
+                             'R1-2': 'R1_R2', 'R3': 'R3', 'R4': 'R4', 'R5': 'R5'}
+FIRST_PICK_ROTATION_LAST_SEQ = 12  # пики 7..12 - первая ротация, 17..20 - вторая
+DUO_ROLES_CONFIG = {("TOP", "JUNGLE"): "TOP-JUNGLE", ("JUNGLE", "MIDDLE"): "JUNGLE-MID", ("BOTTOM", "UTILITY"): "ADC-SUPPORT"}
 
 # Ward specific constants
 WARD_VISION_RADIUS_GAME_UNITS = 900
@@ -617,8 +635,33 @@ MONSTER_NAME_MAP_V3 = {
     "SRU_Dragon_Hextech": "Hextech Drake", "SRU_Dragon_Chemtech": "Chemtech Drake",
     "SRU_Dragon_Elder": "Elder Dragon", "SRU_RiftHerald": "Rift Herald",
     "SRU_Baron": "Baron Nashor", "SRU_KrugMini": "Mini Krug",
-    "SRU_KrugMiniMini": "Tiny Krug", "VoidGrub": "VoidGrub"
+    "SRU_KrugMiniMini": "Tiny Krug", "VoidGrub": "VoidGrub",
+    # Livestats отдаёт объекты без префикса SRU_ (драконы - через dragonType)
+    "baron": "Baron Nashor", "riftHerald": "Rift Herald",
+    "atakhan": "Atakhan", "ThornboundAtakhan": "Atakhan",
 }
+LIVESTATS_DRAGON_NAME_MAP = {
+    "water": "Ocean Drake", "fire": "Infernal Drake", "earth": "Mountain Drake",
+    "air": "Cloud Drake", "hextech": "Hextech Drake", "chemtech": "Chemtech Drake",
+    "elder": "Elder Dragon", "thornboundatakhan": "Atakhan",
+}
+
+# Коды действий для компактного полного пути лесника (1 байт на действие).
+# Список только дополняется в конец: индексы уже записаны в jungle_pathing_full.
+JUNGLE_ACTION_CODES = [
+    "Other", "Recall", "Gank/Save Top", "Gank/Save Mid", "Gank/Save Bot", "Gank/Save Unknown",
+    "Red Buff", "Red Buff (Enemy)", "Blue Buff", "Blue Buff (Enemy)", "Krugs", "Krugs (Enemy)",
+    "Gromp", "Gromp (Enemy)", "Wolves", "Wolves (Enemy)", "Raptors", "Raptors (Enemy)", "Scuttle",
+    "Ocean Drake", "Infernal Drake", "Mountain Drake", "Cloud Drake", "Hextech Drake", "Chemtech Drake",
+    "Elder Dragon", "Elder Dragon (Enemy)", "Rift Herald", "Baron Nashor",
+    "Mini Krug", "Mini Krug (Enemy)", "Tiny Krug", "Tiny Krug (Enemy)", "VoidGrub",
+    "Atakhan", "Dragon",
+]
+JUNGLE_ACTION_TO_CODE = {action: code for code, action in enumerate(JUNGLE_ACTION_CODES)}
+# Лесные кэмпы (без ганков, возвратов и объектов) - из них складываются зачистки на странице JNG Clear
+JUNGLE_CAMP_BASE_NAMES = ("Red Buff", "Blue Buff", "Krugs", "Gromp", "Wolves", "Raptors", "Mini Krug", "Tiny Krug")
+JUNGLE_CAMP_ACTIONS = frozenset(JUNGLE_CAMP_BASE_NAMES + tuple(f"{name} (Enemy)" for name in JUNGLE_CAMP_BASE_NAMES) + ("Scuttle",))
+JUNGLE_PATH_RECORD = struct.Struct('<BH')  # ID действия, секунды игры
 
 OBJECTIVE_TYPE_MAP = {
     'SRU_Dragon_Air': ('DRAGON', 'CLOUD'), 'SRU_Dragon_Chemtech': ('DRAGON', 'CHEMTECH'),
@@ -803,9 +846,12 @@ def get_zone_for_position(x, z):
     elif x > 7400: return "Red Side Unknown"
     else: return "Mid Unknown"
 
-def get_monster_details(monster_type, pos_x, pos_z, jungler_team_side):
+def get_monster_details(monster_type, pos_x, pos_z, jungler_team_side, dragon_type=None):
+    if monster_type == "dragon":
+        # Объекты не зависят от стороны - без суффикса (Enemy)
+        return LIVESTATS_DRAGON_NAME_MAP.get(str(dragon_type or "").lower(), "Dragon")
     camp_name = MONSTER_NAME_MAP_V3.get(monster_type, monster_type)
-    epics = ["Drake", "Herald", "Baron", "VoidGrub"]
+    epics = ["Drake", "Herald", "Baron", "VoidGrub", "Atakhan"]
     if camp_name == "Scuttle" or any(epic in camp_name for epic in epics):
         return camp_name
 
@@ -973,116 +1019,148 @@ def save_player_positions_timeline(conn, game_id, positions_timeline):
         if cursor: cursor.close()
 
 
-def process_livestats_content(conn, livestats_content_str, jungler_puuid, game_id):
-    """
-    Обрабатывает содержимое livestats для извлечения пути лесника.
-    Принимает существующее соединение с БД 'conn', чтобы избежать блокировки.
-    """
-    if not livestats_content_str or not jungler_puuid: return None
-    path_sequence = deque()
-    jungler_participant_id = None
-    jungler_team_side = None
-    first_camp_cleared = False
-    first_recall_after_camp_detected = False
+# Схемы событий livestats, нужные для пути лесника. Остальные строки не декодируются вовсе.
+JUNGLE_PATH_SCHEMA_MARKERS = ('"stats_update"', '"epic_monster_kill"', '"channeling_started"')
 
-    cursor = conn.cursor()
-    try:
-        cursor.execute('SELECT Blue_JGL_PUUID, Red_JGL_PUUID FROM tournament_games WHERE "Game_ID" = ?', (str(game_id),))
-        row = cursor.fetchone()
-        if row:
-            if row["Blue_JGL_PUUID"] == jungler_puuid: jungler_team_side = "Blue"
-            elif row["Red_JGL_PUUID"] == jungler_puuid: jungler_team_side = "Red"
-    except sqlite3.Error as e:
-        log_message(f"Error getting team side for G:{game_id}, P:{jungler_puuid[:8]}: {e}")
-    finally:
-        if cursor: cursor.close()
 
-    try: lines = livestats_content_str.strip().split('\n')
-    except Exception as split_err: log_message(f"Error splitting lines G:{game_id}: {split_err}"); return None
+def _iter_livestats_lines(livestats_content_str):
+    """Лениво отдает строки livestats без построения списка всех строк файла."""
+    start = 0
+    content_len = len(livestats_content_str)
+    while start < content_len:
+        end = livestats_content_str.find('\n', start)
+        if end == -1: end = content_len
+        line = livestats_content_str[start:end]
+        start = end + 1
+        if line.strip(): yield line
 
-    for line in lines:
-        if not line.strip(): continue
-        try:
-            if '"rfc461Schema":"stats_update"' in line and f'"puuid":"{jungler_puuid}"' in line:
-                 snapshot = json.loads(line)
-                 for p_data in snapshot.get("participants", []):
-                     if p_data.get("puuid") == jungler_puuid:
-                         jungler_participant_id = p_data.get("participantID"); break
-                 if jungler_participant_id: break
-        except json.JSONDecodeError: continue
-        except Exception as e: log_message(f"Error in jungler ID pass G:{game_id}: {e}"); continue
-    if jungler_participant_id is None: return None
 
-    last_action = None
-    last_kill_event_time = -1.0
-    last_recall_event_time = -1.0
-    last_known_zone = "Unknown"
-    time_entered_zone = 0.0
+def _new_jungle_path_state(puuid, participant_id, team_side):
+    return {
+        "puuid": puuid, "participant_id": participant_id, "team_side": team_side,
+        "path": [], "last_action": None, "last_kill_event_time": -1.0, "last_recall_event_time": -1.0,
+        "last_known_zone": "Unknown", "time_entered_zone": 0.0,
+        "first_camp_cleared": False, "first_clear_len": None, "done": False,
+    }
 
-    for line in lines:
-        if first_recall_after_camp_detected: break
-        if not line.strip(): continue
-        try: snapshot = json.loads(line)
-        except json.JSONDecodeError: continue
 
-        game_time_ms = snapshot.get("gameTime")
-        if game_time_ms is None: continue
-        game_time_sec = game_time_ms / 1000.0
-        schema = snapshot.get("rfc461Schema")
-        current_action = None
-        if schema == "stats_update":
-            for p_data in snapshot.get("participants", []):
-                if p_data.get("participantID") == jungler_participant_id:
+def _append_jungle_action(state, action_obj):
+    last_action = state["last_action"]
+    last_action_name = last_action.get("action") if isinstance(last_action, dict) else last_action
+    if not state["path"] or action_obj.get("action") != last_action_name:
+        state["path"].append(action_obj)
+        state["last_action"] = action_obj
+
+
+def _update_jungler_zone(state, pos, game_time_sec):
+    """Фиксирует присутствие в линии (Gank/Save) при смене зоны."""
+    current_zone = get_zone_for_position(pos['x'], pos['z'])
+    last_known_zone = state["last_known_zone"]
+    if current_zone == last_known_zone: return
+    if LANE_ZONE_NAMES and last_known_zone in LANE_ZONE_NAMES:
+        time_spent = game_time_sec - state["time_entered_zone"]
+        if time_spent >= GANK_PRESENCE_THRESHOLD:
+            lane_name = "Unknown"
+            if "Top" in last_known_zone: lane_name = "Top"
+            elif "Mid" in last_known_zone: lane_name = "Mid"
+            elif "Bot" in last_known_zone: lane_name = "Bot"
+            action_gank = f"Gank/Save {lane_name}"
+            if not state["path"] or state["path"][-1].get("action") != action_gank:
+                gank_action_obj = {"action": action_gank, "time": game_time_sec}
+                state["path"].append(gank_action_obj)
+                state["last_action"] = gank_action_obj
+    state["last_known_zone"] = current_zone
+    state["time_entered_zone"] = game_time_sec
+
+
+def extract_jungle_paths(livestats_content_str, game_id, participants_summary, full_game=False):
+    """
+    Путь обоих лесников до первого возврата на базу после первого кэмпа за один проход по livestats.
+    ID участников и стороны берутся из summary (participants[1] - синий лесник, participants[6] - красный).
+    Чтение останавливается, как только оба лесника сделали первый recall после кэмпа.
+    Возвращает {puuid: [{"action": ..., "time": ...}, ...]}.
+
+    С full_game=True файл читается до конца и возвращается пара
+    ({puuid: путь первой зачистки}, {puuid: путь за всю игру}).
+    """
+    if not livestats_content_str or not participants_summary: return ({}, {}) if full_game else {}
+
+    states_by_pid = {}
+    unresolved_by_puuid = {}
+    for summary_idx, team_side in ((1, "Blue"), (6, "Red")):
+        if len(participants_summary) <= summary_idx: continue
+        p_summary = participants_summary[summary_idx]
+        puuid = p_summary.get("puuid")
+        if not puuid: continue
+        participant_id = p_summary.get("participantId")
+        state = _new_jungle_path_state(puuid, participant_id, team_side)
+        if participant_id is not None: states_by_pid[participant_id] = state
+        else: unresolved_by_puuid[puuid] = state  # ID найдем по puuid в первом stats_update
+    if not states_by_pid and not unresolved_by_puuid: return ({}, {}) if full_game else {}
+
+    all_states = list(states_by_pid.values()) + list(unresolved_by_puuid.values())
+    track_zones = SHAPELY_AVAILABLE and ZONE_POLYGONS and LANE_ZONE_NAMES
+    pending_count = len(all_states)
+
+    try:
+        for line in _iter_livestats_lines(livestats_content_str):
+            if pending_count == 0: break
+            if not any(marker in line for marker in JUNGLE_PATH_SCHEMA_MARKERS): continue
+            try: snapshot = json.loads(line)
+            except json.JSONDecodeError: continue
+
+            game_time_ms = snapshot.get("gameTime")
+            if game_time_ms is None: continue
+            game_time_sec = game_time_ms / 1000.0
+            schema = snapshot.get("rfc461Schema")
+
+            if schema == "stats_update":
+                if unresolved_by_puuid:
+                    for p_data in snapshot.get("participants", []):
+                        state = unresolved_by_puuid.get(p_data.get("puuid"))
+                        if state and p_data.get("participantID") is not None:
+                            state["participant_id"] = p_data.get("participantID")
+                            states_by_pid[state["participant_id"]] = state
+                            del unresolved_by_puuid[state["puuid"]]
+                if not track_zones: continue
+                for p_data in snapshot.get("participants", []):
+                    state = states_by_pid.get(p_data.get("participantID"))
+                    if not state or state["done"]: continue
                     pos = p_data.get("position")
-                    if pos and 'x' in pos and 'z' in pos and SHAPELY_AVAILABLE and ZONE_POLYGONS and LANE_ZONE_NAMES:
-                        current_zone = get_zone_for_position(pos['x'], pos['z'])
-                        if current_zone != last_known_zone:
-                            if LANE_ZONE_NAMES and last_known_zone in LANE_ZONE_NAMES:
-                                time_spent = game_time_sec - time_entered_zone
-                                if time_spent >= GANK_PRESENCE_THRESHOLD:
-                                    lane_name = "Unknown"
-                                    if "Top" in last_known_zone: lane_name = "Top"
-                                    elif "Mid" in last_known_zone: lane_name = "Mid"
-                                    elif "Bot" in last_known_zone: lane_name = "Bot"
-                                    action_gank = f"Gank/Save {lane_name}"
-                                    # ИЗМЕНЕНИЕ: Сохраняем как объект
-                                    gank_action_obj = {"action": action_gank, "time": game_time_sec}
-                                    if not path_sequence or path_sequence[-1].get("action") != action_gank:
-                                        path_sequence.append(gank_action_obj)
-                                        last_action = gank_action_obj
-                            last_known_zone = current_zone
-                            time_entered_zone = game_time_sec
-                    break
-        elif schema == "epic_monster_kill":
-            killer_id = snapshot.get("killer")
-            if killer_id == jungler_participant_id:
+                    if pos and 'x' in pos and 'z' in pos:
+                        _update_jungler_zone(state, pos, game_time_sec)
+            elif schema == "epic_monster_kill":
+                state = states_by_pid.get(snapshot.get("killer"))
+                if not state or state["done"]: continue
                 monster_type = snapshot.get("monsterType")
                 pos = snapshot.get("position")
                 if monster_type and pos and 'x' in pos and 'z' in pos:
-                     action_camp = get_monster_details(monster_type, pos['x'], pos['z'], jungler_team_side)
-                     # ИЗМЕНЕНИЕ: Сохраняем как объект с действием и временем
-                     current_action = {"action": action_camp, "time": game_time_sec}
-                     if game_time_sec <= last_kill_event_time + 0.5: current_action = None
-                     else:
-                         last_kill_event_time = game_time_sec
-                         if not first_camp_cleared: first_camp_cleared = True
-        elif schema == "channeling_started" and snapshot.get("channelingType") == "recall":
-             p_id = snapshot.get("participantID")
-             if p_id == jungler_participant_id:
-                 # ИЗМЕНЕНИЕ: Сохраняем как объект
-                 current_action = {"action": "Recall", "time": game_time_sec}
-                 if game_time_sec <= last_recall_event_time + 1.0: current_action = None
-                 else:
-                     last_recall_event_time = game_time_sec
-                     if first_camp_cleared: first_recall_after_camp_detected = True
-
-        if current_action:
-            # ИЗМЕНЕНИЕ: Сравниваем по ключу 'action' в словаре
-            last_action_name = last_action.get("action") if isinstance(last_action, dict) else last_action
-            if not path_sequence or current_action.get("action") != last_action_name:
-                path_sequence.append(current_action)
-                last_action = current_action
-    return list(path_sequence)
+                    if game_time_sec <= state["last_kill_event_time"] + 0.5: continue
+                    state["last_kill_event_time"] = game_time_sec
+                    state["first_camp_cleared"] = True
+                    action_camp = get_monster_details(monster_type, pos['x'], pos['z'], state["team_side"],
+                                                      snapshot.get("dragonType"))
+                    _append_jungle_action(state, {"action": action_camp, "time": game_time_sec})
+            elif schema == "channeling_started" and snapshot.get("channelingType") == "recall":
+                state = states_by_pid.get(snapshot.get("participantID"))
+                if not state or state["done"]: continue
+                if game_time_sec <= state["last_recall_event_time"] + 1.0: continue
+                state["last_recall_event_time"] = game_time_sec
+                _append_jungle_action(state, {"action": "Recall", "time": game_time_sec})
+                if state["first_camp_cleared"] and state["first_clear_len"] is None:
+                    state["first_clear_len"] = len(state["path"])
+                    if not full_game:
+                        state["done"] = True
+                        pending_count -= 1
+    except Exception as e:
+        log_message(f"Error extracting jungle paths G:{game_id}: {e}")
+        log_message(traceback.format_exc())
+
+    resolved_states = [state for state in all_states if state["participant_id"] is not None]
+    first_clear_paths = {state["puuid"]: state["path"][:state["first_clear_len"]] for state in resolved_states}
+    if full_game:
+        return first_clear_paths, {state["puuid"]: state["path"] for state in resolved_states}
+    return first_clear_paths
 
 def save_jungle_path(conn, game_id, player_puuid, path_sequence):
     if not conn or not game_id or not player_puuid or path_sequence is None: return False
@@ -1103,6 +1181,37 @@ def save_jungle_path(conn, game_id, player_puuid, path_sequence):
     finally:
         if cursor: cursor.close()
 
+def encode_jungle_path(path_sequence):
+    """Кодирует путь [{"action", "time"}] в байты: на действие 1 байт кода + uint16 секунд."""
+    encoded = bytearray()
+    for action_obj in path_sequence:
+        code = JUNGLE_ACTION_TO_CODE.get(action_obj.get("action"), 0)
+        seconds = min(max(int(round(action_obj.get("time", 0))), 0), 0xFFFF)
+        encoded += JUNGLE_PATH_RECORD.pack(code, seconds)
+    return bytes(encoded)
+
+def decode_jungle_path(path_blob):
+    """Обратное к encode_jungle_path: возвращает [{"action": ..., "time": ...}]."""
+    if not path_blob: return []
+    return [{"action": JUNGLE_ACTION_CODES[code] if code < len(JUNGLE_ACTION_CODES) else "Other", "time": seconds}
+            for code, seconds in JUNGLE_PATH_RECORD.iter_unpack(bytes(path_blob))]
+
+def save_full_jungle_path(conn, game_id, player_puuid, path_sequence):
+    if not conn or not game_id or not player_puuid or path_sequence is None: return False
+    last_updated = datetime.now(timezone.utc).isoformat()
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR REPLACE INTO jungle_pathing_full
+            (game_id, player_puuid, path_blob, last_updated)
+            VALUES (?, ?, ?, ?)
+        """, (str(game_id), str(player_puuid), sqlite3.Binary(encode_jungle_path(path_sequence)), last_updated))
+        return True
+    except sqlite3.Error as e: log_message(f"DB Error saving full path for G:{game_id}, P:{player_puuid[:8]}: {e}"); return False
+    finally:
+        if cursor: cursor.close()
+
 def extract_first_ward_data(livestats_content_str, game_id, game_participants_summary):
     if not livestats_content_str or not game_participants_summary: return []
     pid_to_details = {}
@@ -1295,6 +1404,167 @@ def download_grid_end_state_data(series_id):
     end_state_data = get_rest_request(endpoint, expected_type='json')
     return end_state_data
 
+def get_draft_action_phase(seq, action_type):
+    """Фаза действия драфта по его номеру: 'Ban1'/'Ban2' для банов, 'B1', 'R1-2', ... для пиков."""
+    if action_type == 'ban':
+        return 'Ban1' if seq <= 6 else 'Ban2'
+    return BLUE_PICK_SEQ_TO_PHASE.get(seq) or RED_PICK_SEQ_TO_PHASE.get(seq)
+
+
+def build_draft_action_rows(game_id, game_row):
+    """
+    Раскладывает колонки Draft_Action_* строки tournament_games на строки таблицы draft_actions.
+    Роль пика определяется по чемпиону в колонках {Side}_{Role}_Champ той же стороны.
+    """
+    role_to_abbr = {"TOP": "TOP", "JUNGLE": "JGL", "MIDDLE": "MID", "BOTTOM": "BOT", "UTILITY": "SUP"}
+    champ_to_role = {'Blue': {}, 'Red': {}}
+    for side in ('Blue', 'Red'):
+        for role in ROLE_ORDER_FOR_SHEET:
+            champ = game_row.get(f"{side}_{role_to_abbr[role]}_Champ")
+            if champ and champ != "N/A": champ_to_role[side][champ] = role
+
+    rows = []
+    for seq in range(1, 21):
+        action_type = game_row.get(f"Draft_Action_{seq}_Type")
+        team_id = game_row.get(f"Draft_Action_{seq}_TeamID")
+        if not action_type or action_type == "N/A" or not team_id or team_id == "N/A": continue
+        action_type = str(action_type).lower()
+        side = 'Blue' if seq in BLUE_DRAFT_SEQS else 'Red'
+        champ_name = game_row.get(f"Draft_Action_{seq}_ChampName")
+        role = champ_to_role[side].get(champ_name) if action_type == 'pick' else None
+        rows.append((game_id, seq, side, action_type, str(team_id),
+                     game_row.get(f"Draft_Action_{seq}_ChampID"), champ_name,
+                     get_draft_action_phase(seq, action_type), role))
+    return rows
+
+
+def save_draft_actions(cursor, game_id, draft_rows):
+    """Перезаписывает действия драфта игры (используется тот же курсор/транзакция, что и для tournament_games)."""
+    cursor.execute("DELETE FROM draft_actions WHERE game_id = ?", (game_id,))
+    if draft_rows:
+        cursor.executemany("""
+            INSERT INTO draft_actions (game_id, seq, side, type, team_id, champion_id, champion_name, phase, role)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, draft_rows)
+
+
+def backfill_draft_actions():
+    """Заполняет draft_actions для уже сохраненных игр, у которых еще нет разложенного драфта."""
+    conn = get_db_connection()
+    if not conn: return 0
+    filled = 0
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT * FROM tournament_games
+            WHERE Game_ID NOT IN (SELECT DISTINCT game_id FROM draft_actions)
+        """)
+        for game_row in cursor.fetchall():
+            game = dict(game_row)
+            game_id = game.get("Game_ID")
+            if not game_id: continue
+            draft_rows = build_draft_action_rows(game_id, game)
+            if draft_rows:
+                save_draft_actions(cursor, game_id, draft_rows)
+                filled += 1
+        conn.commit()
+        if filled: log_message(f"[Draft] Backfilled draft_actions for {filled} games.")
+    except sqlite3.Error as e:
+        log_message(f"[Draft] Error backfilling draft_actions: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+    return filled
+
+
+def get_tournament_aggregate_rows(game_row):
+    """
+    Вклад одной игры в агрегаты общего обзора турнира.
+    Игры без победителя (Winner_Side не Blue/Red) в агрегаты не входят.
+    """
+    contributions = {'champions': [], 'bans': [], 'duos': [], 'sides': []}
+    winner_side = game_row.get("Winner_Side")
+    if winner_side not in ("Blue", "Red"): return contributions
+
+    role_to_abbr = {"TOP": "TOP", "JUNGLE": "JGL", "MIDDLE": "MID", "BOTTOM": "BOT", "UTILITY": "SUP"}
+    for side in ("Blue", "Red"):
+        win = 1 if side == winner_side else 0
+        contributions['sides'].append((side, 1, win))
+        side_picks = {}
+        for role in ROLE_ORDER_FOR_SHEET:
+            champ = game_row.get(f"{side}_{role_to_abbr[role]}_Champ")
+            if champ and champ != "N/A":
+                side_picks[role] = champ
+                contributions['champions'].append((champ, role, side, 1, win))
+        for i in range(1, 6):
+            ban_id = game_row.get(f"{side}_Ban_{i}_ID")
+            if ban_id and ban_id != "N/A":
+                contributions['bans'].append((str(ban_id), side, 1))
+        for (r1_cfg, r2_cfg), duo_title in DUO_ROLES_CONFIG.items():
+            champ1 = side_picks.get(r1_cfg); champ2 = side_picks.get(r2_cfg)
+            if champ1 and champ2:
+                contributions['duos'].append((duo_title, side, champ1, champ2, 1, win))
+    return contributions
+
+
+def apply_tournament_aggregates(cursor, game_row, sign=1):
+    """Добавляет (sign=1) или вычитает (sign=-1) вклад игры в таблицы tournament_agg_*."""
+    contributions = get_tournament_aggregate_rows(game_row)
+    cursor.executemany("""
+        INSERT INTO tournament_agg_champions (champion, role, side, picks, wins) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(champion, role, side) DO UPDATE SET picks = picks + excluded.picks, wins = wins + excluded.wins
+    """, [(c, r, s, p * sign, w * sign) for c, r, s, p, w in contributions['champions']])
+    cursor.executemany("""
+        INSERT INTO tournament_agg_bans (champion_id, side, bans) VALUES (?, ?, ?)
+        ON CONFLICT(champion_id, side) DO UPDATE SET bans = bans + excluded.bans
+    """, [(c, s, b * sign) for c, s, b in contributions['bans']])
+    cursor.executemany("""
+        INSERT INTO tournament_agg_duos (duo_title, side, champ1, champ2, games, wins) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(duo_title, side, champ1, champ2) DO UPDATE SET games = games + excluded.games, wins = wins + excluded.wins
+    """, [(t, s, c1, c2, g * sign, w * sign) for t, s, c1, c2, g, w in contributions['duos']])
+    cursor.executemany("""
+        INSERT INTO tournament_agg_sides (side, games, wins) VALUES (?, ?, ?)
+        ON CONFLICT(side) DO UPDATE SET games = games + excluded.games, wins = wins + excluded.wins
+    """, [(s, g * sign, w * sign) for s, g, w in contributions['sides']])
+    if sign < 0:
+        # Убираем обнулившиеся строки, чтобы чемпионы без игр не попадали в обзор
+        cursor.execute("DELETE FROM tournament_agg_champions WHERE picks <= 0")
+        cursor.execute("DELETE FROM tournament_agg_bans WHERE bans <= 0")
+        cursor.execute("DELETE FROM tournament_agg_duos WHERE games <= 0")
+
+
+def rebuild_tournament_aggregates(force=False):
+    """
+    Пересчитывает таблицы tournament_agg_* по всем играм tournament_games.
+    Без force пересчет выполняется, только если агрегаты пусты, а игры уже есть (старая БД).
+    """
+    conn = get_db_connection()
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        if not force:
+            cursor.execute("SELECT 1 FROM tournament_agg_sides LIMIT 1")
+            if cursor.fetchone(): return False
+            cursor.execute("SELECT 1 FROM tournament_games LIMIT 1")
+            if not cursor.fetchone(): return False
+        for table_name in ("tournament_agg_champions", "tournament_agg_bans", "tournament_agg_duos", "tournament_agg_sides"):
+            cursor.execute(f"DELETE FROM {table_name}")
+        cursor.execute("SELECT * FROM tournament_games")
+        games_count = 0
+        for game_row in cursor.fetchall():
+            apply_tournament_aggregates(conn.cursor(), dict(game_row), sign=1)
+            games_count += 1
+        conn.commit()
+        log_message(f"[Aggregates] Rebuilt tournament aggregates from {games_count} games.")
+        return True
+    except sqlite3.Error as e:
+        log_message(f"[Aggregates] Error rebuilding tournament aggregates: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+
 def parse_and_store_tournament_game(cursor, summary_data, series_info, draft_actions, tournament_name="HLL"):
     game_id = None
     try:
@@ -1411,11 +1681,25 @@ def parse_and_store_tournament_game(cursor, summary_data, series_info, draft_act
                  data_tuple_list.append(str(value) if value is not None else None)
         data_tuple = tuple(data_tuple_list)
 
+        # Игра, драфт и агрегаты пишутся атомарно: при замене игры сначала вычитаем ее старый вклад
         try:
+            cursor.execute("SAVEPOINT store_tournament_game")
+            cursor.execute("SELECT * FROM tournament_games WHERE Game_ID = ?", (game_id,))
+            previous_row = cursor.fetchone()
+            if previous_row:
+                apply_tournament_aggregates(cursor, dict(previous_row), sign=-1)
             cursor.execute(insert_sql, data_tuple)
+            save_draft_actions(cursor, game_id, build_draft_action_rows(game_id, row_dict))
+            apply_tournament_aggregates(cursor, row_dict, sign=1)
+            cursor.execute("RELEASE SAVEPOINT store_tournament_game")
             return game_id
         except sqlite3.Error as e:
             log_message(f"DB Insert/Replace Error T_G:{game_id}: {e}")
+            try:
+                cursor.execute("ROLLBACK TO SAVEPOINT store_tournament_game")
+                cursor.execute("RELEASE SAVEPOINT store_tournament_game")
+            except sqlite3.Error:
+                pass
             return None
 
     except Exception as e:
@@ -1426,6 +1710,7 @@ def parse_and_store_tournament_game(cursor, summary_data, series_info, draft_act
 
 # lol_app_LTA_1.4v/tournament_logic.py
 
+@with_ingest_deadline(GRID_INGEST_DEADLINE_SECONDS)
 def fetch_and_store_tournament_data():
     """
     Главная функция для сбора и сохранения всех данных по турниру, включая
@@ -1455,7 +1740,13 @@ def fetch_and_store_tournament_data():
     processed_matches_count = 0
     total_matches = len(matches)
 
+    # Игры всех серий одним пакетом GraphQL-запросов вместо запроса на каждую серию
+    series_games = get_series_states_batch([series_info.get("id") for series_info in matches])
+
     for series_info in matches:
+        if deadline_exceeded():
+            log_message(f"Ingest deadline reached after {processed_matches_count}/{total_matches} matches. Remaining matches will be picked up next update.")
+            break
         processed_matches_count += 1
         series_id = series_info.get("id")
         if not series_id:
@@ -1464,9 +1755,8 @@ def fetch_and_store_tournament_data():
 
         series_end_state_data = download_grid_end_state_data(series_id)
         time.sleep(API_REQUEST_DELAY / 2)
-        games_in_series = get_series_state(series_id)
+        games_in_series = series_games.get(series_id)
         if not games_in_series:
-            time.sleep(API_REQUEST_DELAY / 2)
             continue
 
         for game_info in games_in_series:
@@ -1519,17 +1809,15 @@ def fetch_and_store_tournament_data():
                 if timeline_positions and save_player_positions_timeline(conn, game_id, timeline_positions):
                     processed_timeline_count += len(timeline_positions)
 
-                blue_jungler_puuid = game_participants_summary[1].get("puuid") if len(game_participants_summary) > 1 else None
-                red_jungler_puuid = game_participants_summary[6].get("puuid") if len(game_participants_summary) > 6 else None
-
                 paths_saved_this_game = 0
-                if blue_jungler_puuid:
-                    blue_path = process_livestats_content(conn, livestats_content, blue_jungler_puuid, game_id)
-                    if blue_path and save_jungle_path(conn, game_id, blue_jungler_puuid, blue_path):
-                        paths_saved_this_game += 1
-                if red_jungler_puuid:
-                    red_path = process_livestats_content(conn, livestats_content, red_jungler_puuid, game_id)
-                    if red_path and save_jungle_path(conn, game_id, red_jungler_puuid, red_path):
+                if JUNGLE_FULL_PATH_ENABLED:
+                    jungle_paths, full_jungle_paths = extract_jungle_paths(livestats_content, game_id, game_participants_summary, full_game=True)
+                    for jungler_puuid, full_path in full_jungle_paths.items():
+                        if full_path: save_full_jungle_path(conn, game_id, jungler_puuid, full_path)
+                else:
+                    jungle_paths = extract_jungle_paths(livestats_content, game_id, game_participants_summary)
+                for jungler_puuid, jungler_path in jungle_paths.items():
+                    if jungler_path and save_jungle_path(conn, game_id, jungler_puuid, jungler_path):
                         paths_saved_this_game += 1
                 processed_paths_count += paths_saved_this_game
 
@@ -1560,6 +1848,7 @@ def fetch_and_store_tournament_data():
     log_message(f"Tournament data update finished. Games: {added_or_updated_games_count}, Objectives: {processed_objectives_count}, Paths: {processed_paths_count}, PosSnapshots: {processed_position_snapshots_count}, FirstWards: {processed_first_wards_count}, AllWards: {processed_all_wards_count}, TimelinePoints: {processed_timeline_count}.")
     conn.close()
     return added_or_updated_games_count
+@with_ingest_deadline(GRID_INGEST_DEADLINE_SECONDS)
 def fetch_and_store_ward_data():
     """
     Проходит по всем существующим играм в БД, скачивает для них livestats
@@ -1585,6 +1874,9 @@ def fetch_and_store_ward_data():
     total_wards_saved = 0
 
     for game_row in games_to_process:
+        if deadline_exceeded():
+            log_message(f"Ward Update: ingest deadline reached after {processed_games_count}/{len(games_to_process)} games.")
+            break
         game_id = game_row["Game_ID"]
         series_id = game_row["Series_ID"]
         sequence_number = game_row["Sequence_Number"]
@@ -1620,7 +1912,83 @@ def fetch_and_store_ward_data():
     conn.close()
     log_message(f"Ward data update finished. Processed {processed_games_count} games, saved/updated a total of {total_wards_saved} ward entries.")
     return processed_games_count
+
+@with_ingest_deadline(GRID_INGEST_DEADLINE_SECONDS)
+def backfill_full_jungle_paths():
+    """
+    Догружает полный путь лесников (jungle_pathing_full) для уже сохраненных игр, у которых его нет:
+    скачивает livestats заново и разбирает их с full_game=True. Summary не скачивается -
+    PUUID и ID участников лесников берутся из tournament_games.
+    """
+    log_message("Starting full jungle path backfill...")
+    conn = get_db_connection()
+    if not conn:
+        log_message("Jungle Path Backfill: DB Connection failed."); return -1
+
+    games_to_process = []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT "Game_ID", "Series_ID", "Sequence_Number",
+                   "Blue_JGL_PUUID", "Blue_JGL_PartID", "Red_JGL_PUUID", "Red_JGL_PartID"
+            FROM tournament_games
+            WHERE Game_ID NOT IN (SELECT DISTINCT game_id FROM jungle_pathing_full)
+        """)
+        games_to_process = cursor.fetchall()
+        log_message(f"Found {len(games_to_process)} games without full jungle paths.")
+    except sqlite3.Error as e:
+        log_message(f"Jungle Path Backfill: Error fetching games from DB: {e}")
+        conn.close()
+        return -1
+
+    processed_games_count = 0
+    total_paths_saved = 0
+
+    for game_row in games_to_process:
+        if deadline_exceeded():
+            log_message(f"Jungle Path Backfill: ingest deadline reached after {processed_games_count}/{len(games_to_process)} games.")
+            break
+        game_id = game_row["Game_ID"]
+        series_id = game_row["Series_ID"]
+        sequence_number = game_row["Sequence_Number"]
+        if not all([game_id, series_id, sequence_number is not None]):
+            continue
+
+        # extract_jungle_paths берет лесников из participants[1] (синий) и participants[6] (красный)
+        participants_summary = [{} for _ in range(10)]
+        for summary_idx, prefix in ((1, "Blue"), (6, "Red")):
+            puuid = game_row[f"{prefix}_JGL_PUUID"]
+            if not puuid or puuid == "N/A": continue
+            part_id = game_row[f"{prefix}_JGL_PartID"]
+            try: part_id = int(part_id) if part_id not in (None, "", "N/A") else None
+            except (TypeError, ValueError): part_id = None
+            participants_summary[summary_idx] = {"puuid": puuid, "participantId": part_id}
+        if not any(participants_summary):
+            continue
+
+        livestats_content = download_riot_livestats_data(series_id, sequence_number)
+        time.sleep(API_REQUEST_DELAY)
+        if not livestats_content:
+            continue
+
+        _, full_jungle_paths = extract_jungle_paths(livestats_content, game_id, participants_summary, full_game=True)
+        for jungler_puuid, full_path in full_jungle_paths.items():
+            if full_path and save_full_jungle_path(conn, game_id, jungler_puuid, full_path):
+                total_paths_saved += 1
+        try:
+            conn.commit()
+            processed_games_count += 1
+            if processed_games_count % 10 == 0:
+                log_message(f"Jungle Path Backfill: Processed {processed_games_count}/{len(games_to_process)} games...")
+        except sqlite3.Error as e_commit:
+            log_message(f"Jungle Path Backfill G:{game_id}: DB Commit Error: {e_commit}")
+            conn.rollback()
+
+    conn.close()
+    log_message(f"Full jungle path backfill finished. Processed {processed_games_count} games, saved {total_paths_saved} paths.")
+    return processed_games_count
     
+@traced()
 def aggregate_tournament_data(selected_team_full_name=None, side_filter="all"):
     is_overall_view = not selected_team_full_name
     view_type_log = "Overall Tournament" if is_overall_view else f"Team: {selected_team_full_name}"
@@ -1634,7 +2002,7 @@ def aggregate_tournament_data(selected_team_full_name=None, side_filter="all"):
     all_game_details_list = []
     selected_team_tag = None
 
-    duo_roles_config = { ("TOP", "JUNGLE"): "TOP-JUNGLE", ("JUNGLE", "MIDDLE"): "JUNGLE-MID", ("BOTTOM", "UTILITY"): "ADC-SUPPORT" }
+    duo_roles_config = DUO_ROLES_CONFIG
     role_to_abbr = {"TOP": "TOP", "JUNGLE": "JGL", "MIDDLE": "MID", "BOTTOM": "BOT", "UTILITY": "SUP"}
     role_map_display = {"TOP": "Top", "JUNGLE": "Jungle", "MIDDLE": "Mid", "BOTTOM": "ADC", "UTILITY": "Support"}
     roles_for_pattern = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
@@ -1665,7 +2033,8 @@ def aggregate_tournament_data(selected_team_full_name=None, side_filter="all"):
             if not selected_team_tag:
                 stats["error"] = "Team tag not found."; conn.close(); return all_teams_display, stats, {}, []
 
-        sql_query_games = "SELECT * FROM tournament_games ORDER BY \"Date\" DESC, \"Series_ID\" ASC, \"Sequence_Number\" ASC"
+        # В общем обзоре сами строки игр не нужны (данные берутся из агрегатов), проверяем лишь их наличие
+        sql_query_games = "SELECT 1 FROM tournament_games LIMIT 1"
         params_games = []
         if not is_overall_view:
              sql_query_games = "SELECT * FROM tournament_games WHERE Blue_Team_Name = ? OR Red_Team_Name = ? ORDER BY \"Date\" DESC, \"Series_ID\" ASC, \"Sequence_Number\" ASC"
@@ -1681,7 +2050,7 @@ def aggregate_tournament_data(selected_team_full_name=None, side_filter="all"):
              stats["error"] = "Failed to load champion data for icons."
         
         if is_overall_view:
-            # Логика для общего обзора турнира (без изменений)
+            # Логика для общего обзора турнира
             stats.update({
                 "overall_total_games": 0, "overall_blue_wins": 0, "overall_red_wins": 0,
                 "overall_champ_stats": defaultdict(lambda: {'picks': 0, 'bans': 0, 'wins_when_picked': 0}),
@@ -1692,43 +2061,36 @@ def aggregate_tournament_data(selected_team_full_name=None, side_filter="all"):
                 "overall_picks_by_role_formatted": defaultdict(list),
                 "overall_duo_picks": defaultdict(lambda: {"title": "", "stats": []})
             })
-            valid_games_count_overall = 0
-            for game_row in games_rows:
-                 game = dict(game_row); winner_side = game.get("Winner_Side");
-                 if winner_side not in ["Blue", "Red"]: continue
-                 valid_games_count_overall +=1
-                 if winner_side == "Blue": stats["overall_blue_wins"] += 1
-
-                 game_picks_by_role = {"Blue": {}, "Red": {}}
-                 for side in ["Blue", "Red"]:
-                     is_win_for_side = (side == winner_side)
-                     for role in ROLE_ORDER_FOR_SHEET:
-                         role_abbr = role_to_abbr.get(role)
-                         if not role_abbr: continue
-                         champ = game.get(f"{side}_{role_abbr}_Champ")
-                         if champ and champ != "N/A":
-                              stats["overall_champ_stats"][champ]['picks'] += 1
-                              if is_win_for_side: stats["overall_champ_stats"][champ]['wins_when_picked'] += 1
-                              stats["overall_picks_by_role"][role][champ]['picks'] +=1
-                              if is_win_for_side: stats["overall_picks_by_role"][role][champ]['wins'] +=1
-                              game_picks_by_role[side][role] = champ
-                 for side in ["Blue", "Red"]:
-                     for i in range(1, 6):
-                         ban_id = game.get(f"{side}_Ban_{i}_ID")
-                         if ban_id and ban_id != "N/A":
-                             stats["overall_bans_ids"][ban_id] += 1
-                             ban_champ_name = champion_data.get('id_map', {}).get(str(ban_id))
-                             if ban_champ_name: stats["overall_champ_stats"][ban_champ_name]['bans'] += 1
-                 for side in ["Blue", "Red"]:
-                     is_win_for_side = (side == winner_side)
-                     side_picks = game_picks_by_role[side]
-                     for (r1_cfg, r2_cfg), duo_title in duo_roles_config.items():
-                         champ1 = side_picks.get(r1_cfg); champ2 = side_picks.get(r2_cfg)
-                         if champ1 and champ2:
-                             duo_key = tuple(sorted([(r1_cfg, champ1), (r2_cfg, champ2)]))
-                             stats["temp_overall_duo_stats"][duo_key]['games'] +=1
-                             if is_win_for_side: stats["temp_overall_duo_stats"][duo_key]['wins'] +=1
-                             if stats["temp_overall_duo_stats"][duo_key]['roles'] is None: stats["temp_overall_duo_stats"][duo_key]['roles'] = (r1_cfg, r2_cfg)
+            # Общий обзор читается из накопительных таблиц tournament_agg_* (обновляются при сохранении игр)
+            cursor.execute("SELECT side, games, wins FROM tournament_agg_sides")
+            side_totals = {row['side']: (row['games'], row['wins']) for row in cursor.fetchall()}
+            valid_games_count_overall = side_totals.get("Blue", (0, 0))[0]
+            stats["overall_blue_wins"] = side_totals.get("Blue", (0, 0))[1]
+
+            cursor.execute("SELECT champion, role, SUM(picks) AS picks, SUM(wins) AS wins FROM tournament_agg_champions GROUP BY champion, role")
+            for row in cursor.fetchall():
+                champ, role = row['champion'], row['role']
+                stats["overall_champ_stats"][champ]['picks'] += row['picks']
+                stats["overall_champ_stats"][champ]['wins_when_picked'] += row['wins']
+                stats["overall_picks_by_role"][role][champ]['picks'] += row['picks']
+                stats["overall_picks_by_role"][role][champ]['wins'] += row['wins']
+
+            cursor.execute("SELECT champion_id, SUM(bans) AS bans FROM tournament_agg_bans GROUP BY champion_id")
+            for row in cursor.fetchall():
+                ban_id = row['champion_id']
+                stats["overall_bans_ids"][ban_id] += row['bans']
+                ban_champ_name = champion_data.get('id_map', {}).get(str(ban_id))
+                if ban_champ_name: stats["overall_champ_stats"][ban_champ_name]['bans'] += row['bans']
+
+            duo_title_to_roles = {duo_title: roles for roles, duo_title in duo_roles_config.items()}
+            cursor.execute("SELECT duo_title, champ1, champ2, SUM(games) AS games, SUM(wins) AS wins FROM tournament_agg_duos GROUP BY duo_title, champ1, champ2")
+            for row in cursor.fetchall():
+                r1_cfg, r2_cfg = duo_title_to_roles.get(row['duo_title'], (None, None))
+                if not r1_cfg: continue
+                duo_key = tuple(sorted([(r1_cfg, row['champ1']), (r2_cfg, row['champ2'])]))
+                stats["temp_overall_duo_stats"][duo_key]['games'] += row['games']
+                stats["temp_overall_duo_stats"][duo_key]['wins'] += row['wins']
+                stats["temp_overall_duo_stats"][duo_key]['roles'] = (r1_cfg, r2_cfg)
 
             stats["overall_total_games"] = valid_games_count_overall
             stats["overall_red_wins"] = valid_games_count_overall - stats["overall_blue_wins"]
@@ -1819,8 +2181,54 @@ def aggregate_tournament_data(selected_team_full_name=None, side_filter="all"):
             games_played_on_red_by_team = 0
             game_ids_for_team_view = []
 
-            blue_pick_seq_to_phase = { 7: 'B1', 10: 'B2-3', 11: 'B2-3', 18: 'B4-5', 19: 'B4-5' }
-            red_pick_seq_to_phase = { 8: 'R1-2', 9: 'R1-2', 12: 'R3', 17: 'R4', 20: 'R5' }
+            # Драфт читается из draft_actions (раскладывается при загрузке игры).
+            # Действия нашей команды - те, что на ее стороне в данной игре.
+            our_side_join_sql = """
+                FROM draft_actions d
+                JOIN tournament_games g ON g.Game_ID = d.game_id
+                WHERE (g.Blue_Team_Name = ? OR g.Red_Team_Name = ?)
+                  AND d.side = CASE WHEN g.Blue_Team_Name = ? THEN 'Blue' ELSE 'Red' END
+            """
+            our_side_params = (selected_team_tag, selected_team_tag, selected_team_tag)
+
+            rotation_sql = f"""
+                SELECT d.side, CASE WHEN d.seq <= {FIRST_PICK_ROTATION_LAST_SEQ} THEN 'rot1' ELSE 'rot2' END AS rotation,
+                       d.champion_name, COUNT(*) AS games,
+                       SUM(CASE WHEN g.Winner_Side = d.side THEN 1 ELSE 0 END) AS wins
+                {our_side_join_sql}
+                  AND d.type = 'pick' AND d.champion_name IS NOT NULL AND d.champion_name != 'N/A'
+            """
+            rotation_params = our_side_params
+            if filter_side_norm != 'all':
+                rotation_sql += " AND d.side = ?"
+                rotation_params = our_side_params + (filter_side_norm.capitalize(),)
+            rotation_sql += " GROUP BY d.side, rotation, d.champion_name"
+            cursor.execute(rotation_sql, rotation_params)
+            for row in cursor.fetchall():
+                target_pick_dict = temp_detailed_picks[f"{row['side'].lower()}_{row['rotation']}"]
+                target_pick_dict[row['champion_name']]['games'] += row['games']
+                target_pick_dict[row['champion_name']]['wins'] += row['wins']
+
+            cursor.execute(f"""
+                SELECT d.side, d.phase, d.champion_name, COUNT(*) AS picks
+                {our_side_join_sql}
+                  AND d.type = 'pick' AND d.phase IS NOT NULL
+                  AND d.champion_name IS NOT NULL AND d.champion_name != 'N/A'
+                GROUP BY d.side, d.phase, d.champion_name
+            """, our_side_params)
+            for row in cursor.fetchall():
+                temp_priority_picks[row['side']][row['champion_name']][row['phase']] += row['picks']
+
+            cursor.execute(f"""
+                SELECT d.side, d.phase, d.role, COUNT(*) AS picks
+                {our_side_join_sql}
+                  AND d.type = 'pick' AND d.phase IS NOT NULL AND d.role IS NOT NULL
+                GROUP BY d.side, d.phase, d.role
+            """, our_side_params)
+            for row in cursor.fetchall():
+                pattern_slot_key = PICK_PHASE_TO_PATTERN_KEY.get(row['phase'])
+                if pattern_slot_key in draft_patterns_counters[row['side']]:
+                    draft_patterns_counters[row['side']][pattern_slot_key][row['role']] += row['picks']
 
             for game_row in games_rows:
                 game = dict(game_row); game_db_id = game.get("Game_ID")
@@ -1889,93 +2297,6 @@ def aggregate_tournament_data(selected_team_full_name=None, side_filter="all"):
                             if is_win: temp_duo_stats_team[duo_key]['wins'] +=1
                             if temp_duo_stats_team[duo_key]['roles'] is None: temp_duo_stats_team[duo_key]['roles'] = (r1_cfg, r2_cfg)
 
-                reconstructed_draft = {}
-                action_found_in_game = False
-                draft_blue_id, draft_red_id = None, None
-                for i in range(1,21):
-                    action_type = game.get(f"Draft_Action_{i}_Type")
-                    team_id_draft = game.get(f"Draft_Action_{i}_TeamID")
-                    if action_type and action_type != "N/A" and team_id_draft and team_id_draft != "N/A":
-                        reconstructed_draft[i] = {
-                            "Action_Type": str(action_type).lower(), "Drafter_Team_ID": str(team_id_draft),
-                            "Champion_Name": game.get(f"Draft_Action_{i}_ChampName", "N/A"),
-                        }
-                        action_found_in_game = True
-                        if not draft_blue_id and i in [1,3,5,7,10,11,14,16,18,19]: draft_blue_id = str(team_id_draft)
-                        if not draft_red_id and i in [2,4,6,8,9,12,13,15,17,20] and str(team_id_draft) != draft_blue_id: draft_red_id = str(team_id_draft)
-
-                if action_found_in_game:
-                    blue_picks_seq = {s: reconstructed_draft[s] for s in [7, 10, 11, 18, 19] if s in reconstructed_draft}
-                    red_picks_seq = {s: reconstructed_draft[s] for s in [8, 9, 12, 17, 20] if s in reconstructed_draft}
-                    
-                    our_team_picks_seq = blue_picks_seq if is_blue else red_picks_seq
-                    
-                    if should_process_this_game_picks:
-                        rot1_keys = [7, 10, 11] if is_blue else [8, 9, 12]
-                        rot2_keys = [18, 19] if is_blue else [17, 20]
-                        target_pick_dict_rot1 = temp_detailed_picks['blue_rot1'] if is_blue else temp_detailed_picks['red_rot1']
-                        target_pick_dict_rot2 = temp_detailed_picks['blue_rot2'] if is_blue else temp_detailed_picks['red_rot2']
-                        
-                        for seq, pick_data in our_team_picks_seq.items():
-                            champ_name = pick_data.get("Champion_Name")
-                            if champ_name and champ_name != "N/A":
-                                if seq in rot1_keys:
-                                    target_pick_dict_rot1[champ_name]['games'] += 1
-                                    if is_win: target_pick_dict_rot1[champ_name]['wins'] += 1
-                                elif seq in rot2_keys:
-                                    target_pick_dict_rot2[champ_name]['games'] += 1
-                                    if is_win: target_pick_dict_rot2[champ_name]['wins'] += 1
-
-                    if is_blue:
-                        for seq, pick_data in blue_picks_seq.items():
-                            champ = pick_data.get("Champion_Name")
-                            phase = blue_pick_seq_to_phase.get(seq)
-                            if champ and champ != "N/A" and phase:
-                                temp_priority_picks['Blue'][champ][phase] += 1
-                    elif is_red:
-                        for seq, pick_data in red_picks_seq.items():
-                            champ = pick_data.get("Champion_Name")
-                            phase = red_pick_seq_to_phase.get(seq)
-                            if champ and champ != "N/A" and phase:
-                                temp_priority_picks['Red'][champ][phase] += 1
-
-
-                    roles_played_game = {'Blue': {}, 'Red': {}}
-                    for r in ROLE_ORDER_FOR_SHEET:
-                        r_abbr = role_to_abbr.get(r)
-                        if not r_abbr: continue
-                        b_c = game.get(f"Blue_{r_abbr}_Champ"); r_c = game.get(f"Red_{r_abbr}_Champ")
-                        if b_c and b_c != "N/A": roles_played_game['Blue'][r] = b_c
-                        if r_c and r_c != "N/A": roles_played_game['Red'][r] = r_c
-
-                    our_team_draft_side = None
-                    our_team_draft_actual_id = None
-
-                    if is_blue and draft_blue_id: our_team_draft_side = 'Blue'; our_team_draft_actual_id = draft_blue_id
-                    elif is_red and draft_red_id: our_team_draft_side = 'Red'; our_team_draft_actual_id = draft_red_id
-
-                    if our_team_draft_side and our_team_draft_actual_id:
-                        for seq, action_data in reconstructed_draft.items():
-                            if action_data['Action_Type'] == 'pick' and action_data['Drafter_Team_ID'] == our_team_draft_actual_id:
-                                picked_champ_name = action_data['Champion_Name']
-                                actual_role_for_pick = None
-                                for role_key, champ_in_role in roles_played_game.get(our_team_draft_side, {}).items():
-                                    if champ_in_role == picked_champ_name: actual_role_for_pick = role_key; break
-
-                                if actual_role_for_pick:
-                                    pattern_slot_key = None
-                                    if our_team_draft_side == 'Blue':
-                                        if seq == 7: pattern_slot_key = 'B1'
-                                        elif seq in [10,11]: pattern_slot_key = 'B2_B3'
-                                        elif seq in [18,19]: pattern_slot_key = 'B4_B5'
-                                    elif our_team_draft_side == 'Red':
-                                        if seq in [8,9]: pattern_slot_key = 'R1_R2'
-                                        elif seq == 12: pattern_slot_key = 'R3'
-                                        elif seq == 17: pattern_slot_key = 'R4'
-                                        elif seq == 20: pattern_slot_key = 'R5'
-                                    if pattern_slot_key:
-                                        draft_patterns_counters[our_team_draft_side][pattern_slot_key][actual_role_for_pick] +=1
-
                 opponent_tag_game = red_team_tag if is_blue else blue_team_tag
                 current_team_role_puuids = {}
                 for role_cfg_key in ROLE_ORDER_FOR_SHEET:
@@ -1988,8 +2309,8 @@ def aggregate_tournament_data(selected_team_full_name=None, side_filter="all"):
                     "sequence_number": game.get("Sequence_Number", 0),
                     "blue_team_tag": blue_team_tag, "red_team_tag": red_team_tag,
                     "winner_side": winner_side, "is_win_for_selected": is_win,
-                    "draft_actions_dict": reconstructed_draft if action_found_in_game else {},
-                    "blue_team_draft_id": draft_blue_id, "red_team_draft_id": draft_red_id,
+                    "draft_actions_dict": {},
+                    "blue_team_draft_id": None, "red_team_draft_id": None,
                     "our_jungler_champ": game.get(f"{current_team_prefix}_JGL_Champ", "N/A"),
                     "enemy_jungler_champ": game.get(f"{opponent_prefix}_JGL_Champ", "N/A"),
                     "opponent_name": TEAM_TAG_TO_FULL_NAME.get(opponent_tag_game, opponent_tag_game),
@@ -2003,6 +2324,26 @@ def aggregate_tournament_data(selected_team_full_name=None, side_filter="all"):
                 }
                 all_game_details_list.append(game_detail_entry)
 
+            drafts_db = defaultdict(dict)
+            draft_team_ids_db = {}
+            if game_ids_for_team_view:
+                placeholders_da = ','.join(['?'] * len(game_ids_for_team_view))
+                draft_cursor = conn.cursor()
+                draft_cursor.execute(f"""SELECT game_id, seq, side, type, team_id, champion_name
+                                         FROM draft_actions WHERE game_id IN ({placeholders_da})
+                                         ORDER BY game_id, seq""", tuple(game_ids_for_team_view))
+                for row in draft_cursor.fetchall():
+                    gid = row['game_id']
+                    drafts_db[gid][row['seq']] = {
+                        "Action_Type": row['type'], "Drafter_Team_ID": row['team_id'],
+                        "Champion_Name": row['champion_name'] or "N/A",
+                    }
+                    draft_blue_id, draft_red_id = draft_team_ids_db.get(gid, (None, None))
+                    if not draft_blue_id and row['side'] == 'Blue': draft_blue_id = row['team_id']
+                    if not draft_red_id and row['side'] == 'Red' and row['team_id'] != draft_blue_id: draft_red_id = row['team_id']
+                    draft_team_ids_db[gid] = (draft_blue_id, draft_red_id)
+                draft_cursor.close()
+
             jungle_paths_db = {}
             if game_ids_for_team_view:
                 placeholders_jp = ','.join(['?'] * len(game_ids_for_team_view))
@@ -2059,6 +2400,9 @@ def aggregate_tournament_data(selected_team_full_name=None, side_filter="all"):
 
             for detail_entry in all_game_details_list:
                 gid = detail_entry['game_id']
+                if gid in drafts_db:
+                    detail_entry['draft_actions_dict'] = drafts_db[gid]
+                    detail_entry['blue_team_draft_id'], detail_entry['red_team_draft_id'] = draft_team_ids_db[gid]
                 jungler_puid = detail_entry.get('jungler_puuid_for_path_lookup')
                 if jungler_puid and gid in jungle_paths_db and jungler_puid in jungle_paths_db[gid]:
                     detail_entry['jungle_path'] = jungle_paths_db[gid][jungler_puid]
@@ -2147,8 +2491,8 @@ def aggregate_tournament_data(selected_team_full_name=None, side_filter="all"):
                 "red": red_prio_list,
                 "blue_max_picks": blue_max_val,
                 "red_max_picks": red_max_val,
-                "blue_phases": sorted(list(set(blue_pick_seq_to_phase.values())), key=lambda x: int(x.split('-')[0][1:])),
-                "red_phases": sorted(list(set(red_pick_seq_to_phase.values())), key=lambda x: int(x.split('-')[0][1:])),
+                "blue_phases": sorted(list(set(BLUE_PICK_SEQ_TO_PHASE.values())), key=lambda x: int(x.split('-')[0][1:])),
+                "red_phases": sorted(list(set(RED_PICK_SEQ_TO_PHASE.values())), key=lambda x: int(x.split('-')[0][1:])),
             }
 
             for (r1_cfg, r2_cfg), duo_title_cfg in duo_roles_config.items():
@@ -2218,6 +2562,7 @@ def aggregate_tournament_data(selected_team_full_name=None, side_filter="all"):
 
     return all_teams_display, stats, grouped_matches, all_game_details_list
 
+@traced()
 def get_all_wards_data(selected_team_full_name, selected_role, games_filter, selected_champion):
     """
     Извлекает и агрегирует данные о всех вардах на основе фильтров для новой страницы.
@@ -2344,6 +2689,7 @@ def get_all_wards_data(selected_team_full_name, selected_role, games_filter, sel
     return all_teams_display, wards_by_interval, stats_or_error, available_champions
 
 # --- НОВАЯ ФУНКЦИЯ ДЛЯ СТРАНИЦЫ PROXIMITY ---
+@traced()
 def get_proximity_data(selected_team_full_name, selected_role, games_filter):
     """
     Извлекает и агрегирует данные о близости игроков для страницы Proximity.
@@ -2438,7 +2784,7 @@ def get_proximity_data(selected_team_full_name, selected_role, games_filter):
         # 5. Извлекаем все данные о позициях для этих игр
         game_ids_list = list(game_info.keys())
         placeholders = ','.join(['?'] * len(game_ids_list))
-        pos_query = f"SELECT * FROM player_positions_timeline WHERE game_id IN ({placeholders}) ORDER BY timestamp_ms"
+        pos_query = f"SELECT * FROM player_positions_all WHERE game_id IN ({placeholders}) ORDER BY timestamp_ms"
         cursor.execute(pos_query, game_ids_list)
         
         positions_by_game_time = defaultdict(lambda: defaultdict(list))
@@ -0,0 +1,102 @@
+# ttl_cache.py
+# Потокобезопасный TTL-кэш для справочных данных (патч, чемпионы и т.п.)
+
+import threading
+import time
+
+from log_utils import log_message
+
+
+class TTLCache:
+    """
+    TTL-кэш с блокировкой на ключ (single-flight), stale-while-revalidate
+    и откатом на последнее удачное значение.
+
+    - Свежее значение отдается без блокировок.
+    - Если значения нет, загрузку выполняет ровно один поток, остальные ждут его результат.
+    - Если значение устарело, его сразу отдают, а обновление идет в фоне одним потоком.
+    - Если загрузка упала, остается последнее удачное значение (повторная попытка через error_ttl).
+    """
+
+    def __init__(self, error_ttl=60):
+        self.error_ttl = error_ttl
+        self._entries = {}  # key -> {'value': ..., 'expires_at': float}
+        self._locks = {}
+        self._failed_until = {}  # key -> время, до которого не повторяем неудачную первую загрузку
+        self._meta_lock = threading.Lock()
+
+    def _get_key_lock(self, key):
+        with self._meta_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks[key] = lock
+            return lock
+
+    def _load(self, key, loader, ttl):
+        """Вызывает loader и сохраняет результат. Возвращает True при успехе."""
+        try:
+            value = loader()
+        except Exception as e:
+            log_message(f"[TTLCache] Loader for '{key}' failed: {e}")
+            value = None
+        now = time.time()
+        if value is None:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Оставляем последнее удачное значение, но не долбим источник на каждом запросе
+                self._entries[key] = {'value': entry['value'], 'expires_at': now + self.error_ttl}
+            else:
+                self._failed_until[key] = now + self.error_ttl
+            return False
+        self._entries[key] = {'value': value, 'expires_at': now + ttl}
+        self._failed_until.pop(key, None)
+        return True
+
+    def _refresh_in_background(self, key, loader, ttl, lock):
+        def _run():
+            try:
+                self._load(key, loader, ttl)
+            finally:
+                lock.release()
+
+        threading.Thread(target=_run, name=f"ttl-cache-refresh-{key}", daemon=True).start()
+
+    def get_or_load(self, key, loader, ttl, fallback=None):
+        """
+        Возвращает значение по ключу, при необходимости вызывая loader().
+        loader должен вернуть значение или None/исключение при ошибке.
+        fallback возвращается, только если удачного значения еще не было никогда.
+        """
+        entry = self._entries.get(key)
+        now = time.time()
+        if entry is not None and now < entry['expires_at']:
+            return entry['value']
+
+        lock = self._get_key_lock(key)
+
+        if entry is not None:
+            # Stale-while-revalidate: отдаем старое значение, обновляем один раз в фоне
+            if lock.acquire(blocking=False):
+                self._refresh_in_background(key, loader, ttl, lock)
+            return entry['value']
+
+        # Значения нет совсем: грузим синхронно, конкурирующие потоки ждут на блокировке
+        with lock:
+            entry = self._entries.get(key)
+            if entry is None and time.time() < self._failed_until.get(key, 0):
+                return fallback
+            if entry is None or time.time() >= entry['expires_at']:
+                self._load(key, loader, ttl)
+                entry = self._entries.get(key)
+        return entry['value'] if entry is not None else fallback
+
+    def invalidate(self, key=None):
+        """Помечает ключ (или весь кэш) устаревшим, сохраняя значения для отката."""
+        with self._meta_lock:
+            keys = [key] if key is not None else list(set(self._entries) | set(self._failed_until))
+            for k in keys:
+                entry = self._entries.get(k)
+                if entry is not None:
+                    self._entries[k] = {'value': entry['value'], 'expires_at': 0}
+                self._failed_until.pop(k, None)